@@ -183,6 +183,45 @@ MEDIA_ROOT = BASE_DIR /'media/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Background jobs: 'database' queues jobs for the run_jobs worker, 'inline' runs them in-process after commit
+JOB_EXECUTOR = config('JOB_EXECUTOR', default='database')
+
+# Size of the in-memory cache of rendered ticket QR codes (per process)
+QR_CACHE_MAX_BYTES = config('QR_CACHE_MAX_BYTES', default=32 * 1024 * 1024, cast=int)
+
+# Seconds a signed ticket QR image URL stays valid at least (see ticketsystem/qr.py)
+QR_URL_MAX_AGE = config('QR_URL_MAX_AGE', default=3600, cast=int)
+
+# Ticket codes minted per batch by the code pool (see ticketsystem/codes.py)
+TICKET_CODE_BATCH_SIZE = config('TICKET_CODE_BATCH_SIZE', default=500, cast=int)
+
+# Look up ticket codes without a valid check character, issued before the code pool. Turn off once those tickets are gone
+ACCEPT_LEGACY_TICKET_CODES = config('ACCEPT_LEGACY_TICKET_CODES', default=True, cast=bool)
+
+# Master key of the ticket QR signatures, a key per event is derived from it (see ticketsystem/signing.py)
+TICKET_SIGNING_KEY = config('TICKET_SIGNING_KEY', default=SECRET_KEY)
+
+# Seconds a scanner cursor stays usable for deltas, tombstones of deleted tickets are pruned after it
+SCAN_CURSOR_MAX_AGE = config('SCAN_CURSOR_MAX_AGE', default=7 * 24 * 3600, cast=int)
+
+# Broker of the live check-in stream, use ticketsystem.broker.PostgresBroker with more than one worker
+CHECKIN_BROKER = config('CHECKIN_BROKER', default='ticketsystem.broker.InProcessBroker')
+
+# Seconds club statistics stay cached, tickets invalidate them in the worker that changed them
+STATS_CACHE_TIMEOUT = config('STATS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Seconds the friend id sets of a user stay cached, friendship changes invalidate them on save, delete and commit
+FRIEND_GRAPH_CACHE_TIMEOUT = config('FRIEND_GRAPH_CACHE_TIMEOUT', default=300, cast=int)
+
+# Friend suggestions stored per user
+FRIEND_SUGGESTIONS_TOP_K = config('FRIEND_SUGGESTIONS_TOP_K', default=20, cast=int)
+
+# Seconds the user search candidates of a query are cached
+USER_SEARCH_CACHE_TIMEOUT = config('USER_SEARCH_CACHE_TIMEOUT', default=30, cast=int)
+
+# Clubs with more followers than this have their events read into the home feeds instead of copied
+FEED_FANOUT_LIMIT = config('FEED_FANOUT_LIMIT', default=5000, cast=int)
+
 # Stripe settings
 STRIPE_PUBLIC_KEY = config('STRIPE_PUBLIC_KEY')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY')
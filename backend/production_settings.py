@@ -94,6 +94,24 @@ DATABASES = {
     }
 }
 
+# Shared by every worker, so the invalidations of cached values (club stats, friend graphs) reach all of them.
+# Redis when REDIS_URL is set, otherwise a table of the database, created by createcachetable
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -174,6 +192,46 @@ else:
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Background jobs: 'database' queues jobs for the run_jobs worker, 'inline' runs them in-process after commit.
+# The Railway deploy runs no run_jobs worker, set 'database' once a worker service is deployed
+JOB_EXECUTOR = config('JOB_EXECUTOR', default='inline')
+
+# Size of the in-memory cache of rendered ticket QR codes (per process)
+QR_CACHE_MAX_BYTES = config('QR_CACHE_MAX_BYTES', default=32 * 1024 * 1024, cast=int)
+
+# Seconds a signed ticket QR image URL stays valid at least (see ticketsystem/qr.py)
+QR_URL_MAX_AGE = config('QR_URL_MAX_AGE', default=3600, cast=int)
+
+# Ticket codes minted per batch by the code pool (see ticketsystem/codes.py)
+TICKET_CODE_BATCH_SIZE = config('TICKET_CODE_BATCH_SIZE', default=500, cast=int)
+
+# Look up ticket codes without a valid check character, issued before the code pool. Turn off once those tickets are gone
+ACCEPT_LEGACY_TICKET_CODES = config('ACCEPT_LEGACY_TICKET_CODES', default=True, cast=bool)
+
+# Master key of the ticket QR signatures, a key per event is derived from it (see ticketsystem/signing.py)
+TICKET_SIGNING_KEY = config('TICKET_SIGNING_KEY', default=SECRET_KEY)
+
+# Seconds a scanner cursor stays usable for deltas, tombstones of deleted tickets are pruned after it
+SCAN_CURSOR_MAX_AGE = config('SCAN_CURSOR_MAX_AGE', default=7 * 24 * 3600, cast=int)
+
+# Broker of the live check-in stream, LISTEN / NOTIFY so every worker gets the check-ins
+CHECKIN_BROKER = config('CHECKIN_BROKER', default='ticketsystem.broker.PostgresBroker')
+
+# Seconds club statistics stay cached, ticket changes invalidate them for every worker through the shared cache
+STATS_CACHE_TIMEOUT = config('STATS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Seconds the friend id sets of a user stay in the shared cache, friendship changes invalidate them on save, delete and commit
+FRIEND_GRAPH_CACHE_TIMEOUT = config('FRIEND_GRAPH_CACHE_TIMEOUT', default=300, cast=int)
+
+# Friend suggestions stored per user
+FRIEND_SUGGESTIONS_TOP_K = config('FRIEND_SUGGESTIONS_TOP_K', default=20, cast=int)
+
+# Seconds the user search candidates of a query are cached
+USER_SEARCH_CACHE_TIMEOUT = config('USER_SEARCH_CACHE_TIMEOUT', default=30, cast=int)
+
+# Clubs with more followers than this have their events read into the home feeds instead of copied
+FEED_FANOUT_LIMIT = config('FEED_FANOUT_LIMIT', default=5000, cast=int)
+
 # Stripe settings
 STRIPE_PUBLIC_KEY = config('STRIPE_PUBLIC_KEY')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY')
@@ -3,8 +3,7 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
 from ticketsystem.models import Club, Event, Friend, Follow, Ticket
-from ticketsystem.utils import ticketQRCodeGenerator, ticketCodeGenerator
-from django.core.files.base import ContentFile
+from ticketsystem.utils import ticketCodeGenerator
 
 User = get_user_model()
 
@@ -364,16 +363,12 @@ for user in users:
     events = random.sample(list(Event.objects.all()), random.randint(1, 7))
     for event in events:
         if Ticket.objects.filter(event=event).count() < event.capacity:
-            # Create the ticket without the QR code
-            ticket = Ticket.objects.create(
+            # The QR code is rendered on request, nothing to store
+            Ticket.objects.create(
                 title=event.title,
                 code=ticketCodeGenerator(),
                 price=event.price,
                 status='A',
                 user=user,
                 event=event
-            )
-            # Generate the QR code using the ticket ID
-            qr_code_image = ticketQRCodeGenerator(ticket.id)
-            ticket.qr_code.save(f"ticket_{ticket.id}_qr_code.png", ContentFile(qr_code_image.getvalue()))
-            ticket.save()
\ No newline at end of file
+            )
\ No newline at end of file
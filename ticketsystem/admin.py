@@ -26,6 +26,13 @@ class ClubAdminPanel(admin.ModelAdmin):
 class TransferRequestAdminPanel(admin.ModelAdmin):
     list_display = ('sender', 'receiver', 'ticket', 'status')
 
+class JobAdminPanel(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_after', 'created_at', 'finished_at')
+    list_filter = ('name', 'status')
+
+class EventInventoryAdminPanel(admin.ModelAdmin):
+    list_display = ('event', 'sold', 'capacity')
+
 admin.site.register(User, UserAdminPanel)
 admin.site.register(Profile, ProfileAdminPanel)
 admin.site.register(Friend, FriendAdminPanel)
@@ -35,3 +42,5 @@ admin.site.register(Event, EventAdminPanel)
 admin.site.register(Follow, FollowAdminPanel)
 admin.site.register(StripeAccount)
 admin.site.register(TransferRequest, TransferRequestAdminPanel)
+admin.site.register(EventInventory, EventInventoryAdminPanel)
+admin.site.register(Job, JobAdminPanel)
@@ -0,0 +1,13 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+class QueryParamJWTAuthentication(JWTAuthentication):
+    """
+    Reads the access token from the ?token= query parameter, for clients that can not set headers (EventSource).
+    """
+
+    def authenticate(self, request):
+        raw_token = request.query_params.get('token')
+        if not raw_token:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return self.get_user(validated_token), validated_token
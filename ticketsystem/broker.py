@@ -0,0 +1,144 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+import json
+import time
+import select
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# ====================================================================================================
+# Live check-in broker
+# Successful validations are published to a channel per event and pushed to the dashboards
+# subscribed to it (see CheckinStreamView). InProcessBroker serves a single process. With several
+# workers set CHECKIN_BROKER to PostgresBroker, messages then go through LISTEN / NOTIFY and every
+# worker delivers them to its own subscribers.
+# ====================================================================================================
+
+def checkin_channel(event_id):
+    return f'event-{event_id}-checkins'
+
+class Subscription:
+    """ Messages of one channel for one subscriber, read from the event loop that subscribed.
+    A subscriber that falls behind by more than `max_pending` messages loses the oldest ones """
+    def __init__(self, broker, channel, max_pending):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+
+    def put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+def fan_out(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.put(message)
+
+class InProcessBroker:
+    """ Delivers messages to the subscribers of this process. publish can be called from any thread """
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """ Subscribe to a channel, must be called from a running event loop """
+        subscription = Subscription(self, channel, self.max_pending)
+        with self.lock:
+            self.subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[subscription.channel]
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        """ Hand the message to the local subscribers, with one callback per event loop """
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        by_loop = defaultdict(list)
+        for subscription in subscriptions:
+            by_loop[subscription.loop].append(subscription)
+        for loop, loop_subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(fan_out, loop_subscriptions, message)
+            except RuntimeError:
+                # The loop is closed, its subscribers are gone
+                for subscription in loop_subscriptions:
+                    self.unsubscribe(subscription)
+
+class PostgresBroker(InProcessBroker):
+    """ Publishes with NOTIFY so every worker connected to the database receives the message.
+    Each process runs one listener thread with its own connection, started by the first subscriber """
+    notify_channel = 'ticketsystem_broker'
+
+    def __init__(self, max_pending=100):
+        super().__init__(max_pending)
+        self.listener = None
+
+    def publish(self, channel, message):
+        payload = json.dumps({'channel': channel, 'message': message})
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.notify_channel, payload])
+
+    def subscribe(self, channel):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self.listen, name='checkin-broker', daemon=True)
+                self.listener.start()
+        return super().subscribe(channel)
+
+    def listen(self):
+        import psycopg2
+        while True:
+            try:
+                listener = psycopg2.connect(**connection.get_connection_params())
+                listener.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                listener.cursor().execute(f'LISTEN {self.notify_channel}')
+                while True:
+                    if select.select([listener], [], [], 5) == ([], [], []):
+                        continue
+                    listener.poll()
+                    while listener.notifies:
+                        data = json.loads(listener.notifies.pop(0).payload)
+                        self.deliver(data['channel'], data['message'])
+            except Exception:
+                logger.exception('Check-in broker listener failed, reconnecting')
+                time.sleep(1)
+
+brokers = {}
+brokers_lock = threading.Lock()
+
+def get_broker():
+    """ The broker of this process, CHECKIN_BROKER is the dotted path of its class """
+    path = getattr(settings, 'CHECKIN_BROKER', 'ticketsystem.broker.InProcessBroker')
+    with brokers_lock:
+        if path not in brokers:
+            brokers[path] = import_string(path)()
+        return brokers[path]
+
+def publish_checkin(event_id, message):
+    """ Publish a check-in once the current transaction commits, rolled back scans are never sent """
+    transaction.on_commit(lambda: get_broker().publish(checkin_channel(event_id), message))
@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+import secrets
+import threading
+from collections import deque
+
+from .models import TicketCode
+
+# ====================================================================================================
+# Ticket codes
+# Codes are minted in batches from a CSPRNG and inserted into TicketCode before they are handed out,
+# so the unique index has already reserved every code a purchase takes from the in-memory pool.
+# Format: xxxxxx-xxxxxx-xxxxxc, 17 random characters and a check character (Luhn mod 36).
+# ====================================================================================================
+
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+RANDOM_LENGTH = 17
+GROUP_LENGTH = 6
+
+def check_character(payload):
+    """ Luhn mod N check character, catches any single typo and most swapped neighbours """
+    total = 0
+    factor = 2
+    for char in reversed(payload):
+        addend = factor * ALPHABET.index(char)
+        total += addend // len(ALPHABET) + addend % len(ALPHABET)
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[-total % len(ALPHABET)]
+
+def format_code(payload):
+    raw = payload + check_character(payload)
+    return '-'.join(raw[i:i + GROUP_LENGTH] for i in range(0, len(raw), GROUP_LENGTH))
+
+def is_valid_ticket_code(code):
+    """ Check the format and check character of a code, without touching the database """
+    raw = code.replace('-', '').lower()
+    if len(raw) != RANDOM_LENGTH + 1 or any(char not in ALPHABET for char in raw):
+        return False
+    return check_character(raw[:-1]) == raw[-1]
+
+def canonical_code(code):
+    """ The code as stored, from a hand-typed one in any case and grouping. Codes without a valid check
+    character are returned as they are """
+    if not is_valid_ticket_code(code):
+        return code
+    return format_code(code.replace('-', '').lower()[:-1])
+
+def accepts_legacy_codes():
+    """ Codes issued before the pool have no check character and most fail is_valid_ticket_code. They are
+    looked up as they are while ACCEPT_LEGACY_TICKET_CODES is set, once those tickets are gone every code
+    without a valid check character is rejected before the database """
+    return getattr(settings, 'ACCEPT_LEGACY_TICKET_CODES', True)
+
+def random_code():
+    number = secrets.randbelow(len(ALPHABET) ** RANDOM_LENGTH)
+    chars = []
+    for _ in range(RANDOM_LENGTH):
+        number, index = divmod(number, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return format_code(''.join(chars))
+
+class TicketCodePool:
+    """ Per process pool of reserved ticket codes """
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.codes = deque()
+        self.lock = threading.Lock()
+
+    def mint(self, count):
+        """ Insert `count` new codes into TicketCode and return them """
+        for _ in range(3):
+            codes = list({random_code() for _ in range(count)})
+            try:
+                with transaction.atomic():
+                    TicketCode.objects.bulk_create([TicketCode(code=code) for code in codes])
+                return codes
+            except IntegrityError:
+                # One of ~2^88 codes was already taken, mint a fresh batch
+                continue
+        raise IntegrityError('Could not mint unique ticket codes')
+
+    def take_many(self, count):
+        """ Return `count` reserved codes, minting a new batch when the pool runs low """
+        with self.lock:
+            taken = [self.codes.popleft() for _ in range(min(count, len(self.codes)))]
+        missing = count - len(taken)
+        if missing:
+            codes = self.mint(missing + self.batch_size)
+            taken += codes[:missing]
+            # Only pool the spare codes once their reservation is committed
+            transaction.on_commit(lambda: self.refill(codes[missing:]))
+        return taken
+
+    def take(self):
+        return self.take_many(1)[0]
+
+    def refill(self, codes):
+        with self.lock:
+            self.codes.extend(codes)
+
+    def clear(self):
+        with self.lock:
+            self.codes.clear()
+
+code_pool = TicketCodePool(getattr(settings, 'TICKET_CODE_BATCH_SIZE', 500))
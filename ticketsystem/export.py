@@ -0,0 +1,74 @@
+from asgiref.sync import sync_to_async
+
+from .models import Ticket
+
+import io
+import csv
+import json
+from itertools import islice
+
+# ====================================================================================================
+# Attendee export
+# The attendees of an event are read with a server-side cursor (QuerySet.iterator) and rendered
+# batch by batch, so an export only ever holds one batch in memory whatever the size of the event.
+# CSV is one row per attendee. The columnar format is JSON lines: a header naming the columns,
+# then one object per batch holding a list per column, which compresses well and loads straight
+# into a data frame.
+# ====================================================================================================
+
+COLUMNS = ('code', 'status', 'scanned_at', 'first_name', 'last_name', 'student_id', 'year', 'course')
+FIELDS = ('code', 'status', 'scanned_at', 'user__first_name', 'user__last_name', 'user__student_id', 'user__profile__year', 'user__profile__course')
+STATUSES = dict(Ticket.STATUS_CHOICES)
+BATCH_SIZE = 2000
+
+def attendee_batches(event_id):
+    """ Lists of attendee rows in the order of COLUMNS, read through a server-side cursor """
+    rows = Ticket.objects.filter(event_id=event_id).order_by('id').values_list(*FIELDS).iterator(chunk_size=BATCH_SIZE)
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+def csv_chunks(event_id):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for batch in attendee_batches(event_id):
+        writer.writerows(
+            (code, STATUSES.get(status, status), scanned_at.isoformat() if scanned_at else '', *user)
+            for code, status, scanned_at, *user in batch
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Events without attendees still get the header
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def column_chunks(event_id):
+    yield json.dumps({'event_id': event_id, 'columns': COLUMNS, 'statuses': STATUSES}) + '\n'
+    for batch in attendee_batches(event_id):
+        columns = dict(zip(COLUMNS, map(list, zip(*batch))))
+        columns['scanned_at'] = [scanned_at.isoformat() if scanned_at else None for scanned_at in columns['scanned_at']]
+        yield json.dumps({'rows': len(batch), **columns}, separators=(',', ':')) + '\n'
+
+EXPORT_FORMATS = {
+    # format: (chunks, content type, file extension)
+    'csv': (csv_chunks, 'text/csv', 'csv'),
+    'columns': (column_chunks, 'application/x-ndjson', 'jsonl'),
+}
+
+async def iterate_async(chunks):
+    """ Stream a synchronous generator over ASGI, Django would read it whole into a list first.
+    Every batch runs in the thread holding the database connection and its cursor """
+    next_chunk = sync_to_async(next)
+    try:
+        while True:
+            chunk = await next_chunk(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        # Closes the cursor when the client goes away
+        await sync_to_async(chunks.close)()
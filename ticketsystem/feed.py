@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .models import Club, Event, Follow, FeedEntry, FollowerRollup
+
+from itertools import islice
+
+# ====================================================================================================
+# Home feed
+# The events of the clubs a user follows, newest first. Events are copied to the feed of every
+# follower when they are published (fan out on write, after the commit) and the events of a club are copied to the
+# feed of a new follower, so a page of the feed is one range of the (user, date, time, event) index.
+# A club with more than FEED_FANOUT_LIMIT followers is marked fan_out_on_read: publishing to it
+# writes nothing, and its events are read from the events index and merged into the feed of each
+# of its followers. The mark stays set, the rebuild_home_feed command clears it for clubs that
+# have shrunk and rebuilds their entries.
+# ====================================================================================================
+
+FAN_OUT_BATCH = 2000
+
+def fanout_limit():
+    return getattr(settings, 'FEED_FANOUT_LIMIT', 5000)
+
+def follower_count(club_id):
+    return FollowerRollup.objects.filter(club_id=club_id).aggregate(followers=Sum('count'))['followers'] or 0
+
+def fans_out_on_read(club_id):
+    """ Whether the events of the club are read into the feeds, marking the club once it has grown too large """
+    if Club.objects.filter(id=club_id, fan_out_on_read=True).exists():
+        return True
+    if follower_count(club_id) > fanout_limit():
+        Club.objects.filter(id=club_id).update(fan_out_on_read=True)
+        return True
+    return False
+
+def entry(user_id, event):
+    return FeedEntry(user_id=user_id, event_id=event.id, club_id=event.club_id, date=event.date, time=event.time)
+
+def write_entries(entries):
+    """ Insert the entries batch by batch, bulk_create would hold all of them at once. Returns the number written """
+    written = 0
+    while batch := list(islice(entries, FAN_OUT_BATCH)):
+        written += len(FeedEntry.objects.bulk_create(batch, ignore_conflicts=True))
+    return written
+
+def publish_event(event):
+    """ Copy a new event to the feeds of the followers of its club, in batches once the transaction commits.
+    Not through the job queue: the feed is read only from its entries, a deploy without a run_jobs worker
+    would never show the event. The work is bounded, clubs with more than FEED_FANOUT_LIMIT followers write nothing """
+    event_id = event.id
+    transaction.on_commit(lambda: fan_out_event(event_id))
+
+def fan_out_event(event_id):
+    event = Event.objects.filter(id=event_id).first()
+    if event is None or fans_out_on_read(event.club_id):
+        return
+    followers = Follow.objects.filter(club_id=event.club_id).values_list('user_id', flat=True).iterator(chunk_size=FAN_OUT_BATCH)
+    write_entries(entry(user_id, event) for user_id in followers)
+
+def move_event(event):
+    """ Keep the entries of an edited event in place in the feeds, and in the right feeds if its club changed """
+    FeedEntry.objects.filter(event_id=event.id).update(date=event.date, time=event.time)
+    if FeedEntry.objects.filter(event_id=event.id).exclude(club_id=event.club_id).delete()[0]:
+        publish_event(event)
+
+def add_follow(user_id, club_id):
+    """ Copy the events of a newly followed club to the user's feed """
+    if not fans_out_on_read(club_id):
+        write_entries(entry(user_id, event) for event in Event.objects.filter(club_id=club_id).only('id', 'club_id', 'date', 'time').iterator())
+
+def newest_after(queryset, position=None, fields=('date', 'time', 'id')):
+    """ The rows of the queryset newest first by the (date, time, id) fields, after the position of a
+    previous row if given. The date bound starts the index range at the position """
+    date, time, key = fields
+    queryset = queryset.order_by(f'-{date}', f'-{time}', f'-{key}')
+    if position is None:
+        return queryset
+    after_date, after_time, after_key = position
+    return queryset.filter(**{f'{date}__lte': after_date}).filter(
+        Q(**{f'{date}__lt': after_date}) | Q(**{f'{time}__lt': after_time}) | Q(**{time: after_time, f'{key}__lt': after_key})
+    )
+
+def home_feed(user_id, position, size):
+    """ Up to size events of the user's feed after the position, newest first, in two queries: a range of
+    the user's feed entries and the events of the followed clubs that fan out on read """
+    entries = newest_after(FeedEntry.objects.filter(user_id=user_id), position, ('date', 'time', 'event_id'))
+    events = {row.event_id: row.event for row in entries.select_related('event__club')[:size]}
+    large_clubs = Follow.objects.filter(user_id=user_id, club__fan_out_on_read=True).values('club_id')
+    # A club that grew large keeps the entries written before, an event can come from both
+    for event in newest_after(Event.objects.filter(club_id__in=large_clubs), position).select_related('club')[:size]:
+        events.setdefault(event.id, event)
+    return sorted(events.values(), key=lambda event: (event.date, event.time, event.id), reverse=True)[:size]
+
+def rebuild_feeds(club_ids=None):
+    """ Mark the clubs over FEED_FANOUT_LIMIT followers as fan out on read and the others not, then rewrite the
+    feed entries of the others from the follows and events. Returns the number of entries written """
+    clubs = Club.objects.all() if club_ids is None else Club.objects.filter(id__in=club_ids)
+    written = 0
+    for club in clubs.only('id', 'fan_out_on_read'):
+        large = follower_count(club.id) > fanout_limit()
+        if large != club.fan_out_on_read:
+            Club.objects.filter(id=club.id).update(fan_out_on_read=large)
+        FeedEntry.objects.filter(club_id=club.id).delete()
+        if large:
+            continue
+        events = list(Event.objects.filter(club_id=club.id).only('id', 'club_id', 'date', 'time'))
+        followers = Follow.objects.filter(club_id=club.id).values_list('user_id', flat=True).iterator(chunk_size=FAN_OUT_BATCH)
+        written += write_entries(entry(user_id, event) for user_id in followers for event in events)
+    return written
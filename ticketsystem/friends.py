@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Friend, User, Ticket
+
+from collections import namedtuple
+
+# ====================================================================================================
+# Friend graph
+# The friendships of a user as id sets: accepted friends, requests the user sent and requests the
+# user received. A user's sets are read from the Friend table with one query and cached, so a
+# friendship test, the friends in common of two users or a friend count is a cache read. The
+# signals in models.py drop the cached sets of both users of a Friend row when it is saved or
+# deleted, FRIEND_GRAPH_CACHE_TIMEOUT bounds how stale a worker can be when the cache is not shared.
+# ====================================================================================================
+
+FriendGraph = namedtuple('FriendGraph', ['friends', 'sent', 'received'])
+
+def graph_key(user_id):
+    return f'friends:user:{user_id}'
+
+def invalidate_friend_graph(*user_ids):
+    """ Drop the cached sets now and again on commit, a read racing the transaction could have cached
+    the old sets in between """
+    keys = [graph_key(user_id) for user_id in user_ids]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+def load_friend_graphs(user_ids):
+    """ {user id: FriendGraph} read from the Friend table with one query """
+    user_ids = set(user_ids)
+    sets = {user_id: (set(), set(), set()) for user_id in user_ids}
+    rows = Friend.objects.filter(Q(sender_id__in=user_ids) | Q(receiver_id__in=user_ids)).values_list('sender_id', 'receiver_id', 'status')
+    for sender_id, receiver_id, accepted in rows:
+        if sender_id in sets:
+            friends, sent, _ = sets[sender_id]
+            (friends if accepted else sent).add(receiver_id)
+        if receiver_id in sets:
+            friends, _, received = sets[receiver_id]
+            (friends if accepted else received).add(sender_id)
+    return {user_id: FriendGraph(*map(frozenset, user_sets)) for user_id, user_sets in sets.items()}
+
+def friend_graphs(user_ids):
+    """ {user id: FriendGraph} from the cache, the missing ones loaded together """
+    keys = {graph_key(user_id): user_id for user_id in user_ids}
+    graphs = {keys[key]: graph for key, graph in cache.get_many(keys).items()}
+    missing = set(keys.values()) - set(graphs)
+    if missing:
+        loaded = load_friend_graphs(missing)
+        cache.set_many({graph_key(user_id): graph for user_id, graph in loaded.items()}, getattr(settings, 'FRIEND_GRAPH_CACHE_TIMEOUT', 300))
+        graphs.update(loaded)
+    return graphs
+
+def friend_graph(user_id):
+    return friend_graphs([user_id])[user_id]
+
+def friend_ids(user_id):
+    """ Ids of the accepted friends of the user """
+    return friend_graph(user_id).friends
+
+def are_friends(user_id, other_id):
+    return other_id in friend_graph(user_id).friends
+
+def common_friend_ids(user_id, other_id):
+    graphs = friend_graphs([user_id, other_id])
+    return graphs[user_id].friends & graphs[other_id].friends
+
+def graph_status(graph, user_id):
+    if user_id in graph.friends:
+        return 'friends'
+    if user_id in graph.sent:
+        return 'pending'
+    if user_id in graph.received:
+        return 'accept'
+    return 'none'
+
+def friendship_status(viewer_id, user_id):
+    """ friends, pending (the viewer sent a request), accept (the viewer received one) or none """
+    return graph_status(friend_graph(viewer_id), user_id)
+
+def relationships(viewer_id, users):
+    """ {user id: relationship} of the viewer to each user: you, closed, friends, pending, accept or none.
+    Any number of users is resolved with one read of the viewer's friend graph """
+    graph = friend_graph(viewer_id)
+    resolved = {}
+    for user in users:
+        if user.id == viewer_id:
+            resolved[user.id] = 'you'
+        elif user.account_type == User.CLOSED:
+            resolved[user.id] = 'closed'
+        else:
+            resolved[user.id] = graph_status(graph, user.id)
+    return resolved
+
+# Tickets that put their holder at the event
+GOING_STATUSES = ('A', 'U')
+
+def friends_going(viewer_id, event_ids):
+    """ {event id: [User]} of the viewer's friends holding a ticket for each event, by username.
+    One query for any number of events: the accepted Friend edges of the viewer are joined to
+    Ticket(event, status, user), an index-only lookup per event """
+    accepted = Friend.objects.filter(status=True)
+    friends = Q(user_id__in=accepted.filter(sender_id=viewer_id).values('receiver_id')) | Q(user_id__in=accepted.filter(receiver_id=viewer_id).values('sender_id'))
+    tickets = (Ticket.objects.filter(friends, event_id__in=event_ids, status__in=GOING_STATUSES)
+               .select_related('user__profile').order_by('event_id', 'user__username'))
+    going = {event_id: [] for event_id in event_ids}
+    for ticket in tickets:
+        going[ticket.event_id].append(ticket.user)
+    return going
@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, F, Avg, Max
+from django.utils import timezone
+
+from datetime import timedelta
+
+from .models import Job
+from .suggestions import refresh_suggestions, affected_by_friendship
+from .feed import fan_out_event
+
+# ====================================================================================================
+# Background jobs
+# Jobs are rows in the Job table and handlers are registered with @register. The run_jobs management
+# command claims and runs them. With JOB_EXECUTOR = 'inline' (tests, deploys without a worker) they
+# run in-process once the current transaction commits.
+# ====================================================================================================
+
+JOBS = {}
+FAILURE_HANDLERS = {}
+
+# A job left running for longer than this is assumed to belong to a dead worker and is claimed again
+STALE_JOB_TIMEOUT = timedelta(minutes=5)
+
+def register(name, on_failure=None):
+    """ Register a function as the handler for the jobs with this name. `on_failure` is called
+    with the job payload once the job has used up its attempts """
+    def decorator(func):
+        JOBS[name] = func
+        if on_failure:
+            FAILURE_HANDLERS[name] = on_failure
+        return func
+    return decorator
+
+def enqueue(name, **payload):
+    """ Add a job to the queue, returns the Job """
+    job = Job.objects.create(name=name, payload=payload)
+    if getattr(settings, 'JOB_EXECUTOR', 'database') == 'inline':
+        transaction.on_commit(lambda: run_claimed(claim(job_ids=[job.id])))
+    return job
+
+def claim(limit=10, job_ids=None):
+    """ Mark up to `limit` due jobs as running and return them. Rows locked by another worker are skipped """
+    now = timezone.now()
+    due = Q(status='P', run_after__lte=now) | Q(status='R', started_at__lt=now - STALE_JOB_TIMEOUT)
+    with transaction.atomic():
+        jobs = Job.objects.select_for_update(skip_locked=True).filter(due)
+        if job_ids is not None:
+            jobs = jobs.filter(id__in=job_ids)
+        ids = list(jobs.order_by('run_after').values_list('id', flat=True)[:limit])
+        Job.objects.filter(id__in=ids).update(status='R', started_at=now, attempts=F('attempts') + 1)
+    return list(Job.objects.filter(id__in=ids).order_by('run_after'))
+
+def run_claimed(jobs):
+    """ Run claimed jobs. Failed jobs are retried with exponential backoff until max_attempts """
+    for job in jobs:
+        try:
+            JOBS[job.name](**job.payload)
+        except Exception as e:
+            job.last_error = f"{type(e).__name__}: {e}"
+            if job.attempts < job.max_attempts:
+                job.status = 'P'
+                job.run_after = timezone.now() + timedelta(seconds=2 ** job.attempts)
+            else:
+                job.status = 'F'
+                job.finished_at = timezone.now()
+                on_failure = FAILURE_HANDLERS.get(job.name)
+                if on_failure:
+                    on_failure(**job.payload)
+        else:
+            job.status = 'D'
+            job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'run_after', 'last_error', 'finished_at'])
+
+def run_pending(limit=10):
+    """ Claim and run one batch of jobs, returns the number of jobs run """
+    jobs = claim(limit=limit)
+    run_claimed(jobs)
+    return len(jobs)
+
+def queue_stats(name=None, window=timedelta(hours=1)):
+    """ Queue depth and run latency (seconds) of the jobs finished within `window` """
+    jobs = Job.objects.all()
+    if name:
+        jobs = jobs.filter(name=name)
+    now = timezone.now()
+    finished = jobs.filter(status='D', finished_at__gte=now - window)
+    durations = finished.aggregate(avg=Avg(F('finished_at') - F('started_at')), max=Max(F('finished_at') - F('started_at')))
+    oldest = jobs.filter(status='P').order_by('created_at').values_list('created_at', flat=True).first()
+    return {
+        'pending': jobs.filter(status='P').count(),
+        'running': jobs.filter(status='R').count(),
+        'failed': jobs.filter(status='F').count(),
+        'done_in_window': finished.count(),
+        'avg_latency': durations['avg'].total_seconds() if durations['avg'] else None,
+        'max_latency': durations['max'].total_seconds() if durations['max'] else None,
+        'oldest_pending_age': (now - oldest).total_seconds() if oldest else None,
+    }
+
+# JOB HANDLERS =======================================================================================
+@register('refresh_friend_suggestions')
+def refresh_friend_suggestions(sender_id, receiver_id):
+    """ Recompute the suggestions of the users a friendship change affects """
+    refresh_suggestions(affected_by_friendship(sender_id, receiver_id))
+
+@register('fan_out_event')
+def fan_out_event_to_feeds(event_id):
+    """ Copy a published event to the home feeds of the followers of its club. Events are fanned out on
+    commit now, this runs the jobs queued before """
+    fan_out_event(event_id)
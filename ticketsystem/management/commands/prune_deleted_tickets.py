@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ticketsystem.manifest import prune_deleted_tickets
+
+
+class Command(BaseCommand):
+    help = 'Delete the tombstones of deleted tickets older than SCAN_CURSOR_MAX_AGE, run it daily'
+
+    def handle(self, *args, **options):
+        deleted = prune_deleted_tickets()
+        self.stdout.write(f'Deleted {deleted} ticket tombstones')
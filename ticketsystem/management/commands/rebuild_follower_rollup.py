@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from ticketsystem.models import FollowerRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the club follower rollup from the follows, or check it for drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report the cells that drifted, exit with status 1 if any did')
+        parser.add_argument('--club', type=int, action='append', dest='clubs', help='Only this club, can be repeated')
+
+    def handle(self, *args, **options):
+        clubs = options['clubs']
+        if not options['check']:
+            cells = FollowerRollup.objects.rebuild(clubs)
+            self.stdout.write(f'Rebuilt {cells} cells')
+            return
+
+        actual = FollowerRollup.objects.actual(clubs)
+        stored = FollowerRollup.objects.all() if clubs is None else FollowerRollup.objects.filter(club_id__in=clubs)
+        stored = {(club_id, year, course): count for club_id, year, course, count in stored.values_list('club_id', 'year', 'course', 'count')}
+        drift = 0
+        for key in sorted(set(actual) | set(stored), key=str):
+            expected, found = actual.get(key, 0), stored.get(key, 0)
+            if expected != found:
+                drift += 1
+                club_id, year, course = key
+                self.stdout.write(f'club={club_id} year={year} course={course}: stored {found}, actual {expected}')
+        if drift:
+            self.stderr.write(f'{drift} cells drifted, run rebuild_follower_rollup to fix them')
+            raise SystemExit(1)
+        self.stdout.write('No drift')
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ticketsystem.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = 'Mark the clubs whose events are read into the home feeds and rewrite the feed entries of the others'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--club', type=int, action='append', dest='clubs', help='Only this club, can be repeated')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = rebuild_feeds(options['clubs'])
+        self.stdout.write(f'Wrote {written} feed entries in {time.perf_counter() - start:.1f}s')
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ticketsystem.models import User
+from ticketsystem.suggestions import refresh_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recompute the friend suggestions of every user, or of the given users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only this user id, can be repeated')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Users ranked per batch of queries')
+
+    def handle(self, *args, **options):
+        users = options['users']
+        if users is None:
+            users = User.objects.filter(user_type='user').values_list('id', flat=True)
+        start = time.perf_counter()
+        stored = refresh_suggestions(users, chunk_size=options['chunk_size'])
+        self.stdout.write(f'Stored {stored} suggestions in {time.perf_counter() - start:.1f}s')
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ticketsystem.jobs import run_pending, queue_stats
+
+
+class Command(BaseCommand):
+    help = 'Run the background jobs queue (friend suggestion refreshes, ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed per batch')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Run until the queue is empty and exit')
+        parser.add_argument('--stats', action='store_true', help='Print queue depth and run latency and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for key, value in queue_stats().items():
+                self.stdout.write(f'{key}: {value}')
+            return
+
+        self.stdout.write('Running jobs...')
+        while True:
+            ran = run_pending(limit=options['batch_size'])
+            if ran:
+                self.stdout.write(f'Ran {ran} jobs')
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['sleep'])
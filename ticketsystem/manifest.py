@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.utils import timezone
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from .models import Ticket, DeletedTicket
+
+# ====================================================================================================
+# Scanner manifest
+# The valid tickets of an event in columns: ticket ids sorted and delta encoded, one status character
+# per ticket and the attendee fields the scanner shows. Gate devices keep it to validate offline,
+# with a `since` cursor only the tickets changed or removed after the cursor are sent. Tombstones of
+# deleted tickets are kept for SCAN_CURSOR_MAX_AGE seconds (prune_deleted_tickets command), an older
+# cursor could miss pruned deletions and gets the full manifest.
+# ====================================================================================================
+
+VALID_STATUSES = ('A', 'U')
+
+# A transaction that commits late can carry an updated_at just before the cursor it missed, so the
+# returned cursor overlaps the previous manifest by this much. Applying a delta twice is harmless.
+CURSOR_OVERLAP = timedelta(seconds=5)
+
+def cursor_max_age():
+    return timedelta(seconds=getattr(settings, 'SCAN_CURSOR_MAX_AGE', 7 * 24 * 3600))
+
+def cursor_expired(since, now=None):
+    """ Whether deletions after `since` may have been pruned """
+    return since < (now or timezone.now()) - cursor_max_age()
+
+def prune_deleted_tickets(now=None):
+    """ Drop the tombstones no valid cursor can need anymore, returns how many were deleted """
+    return DeletedTicket.objects.filter(deleted_at__lt=(now or timezone.now()) - cursor_max_age()).delete()[0]
+
+def encode_cursor(moment):
+    return int(moment.timestamp() * 1_000_000)
+
+def decode_cursor(cursor):
+    """ Return the datetime of a cursor, raises ValueError on anything else """
+    return datetime.fromtimestamp(int(cursor) / 1_000_000, tz=dt_timezone.utc)
+
+def delta_encode(ids):
+    """ [10, 11, 15] -> [10, 1, 4], sorted ids become small numbers """
+    previous = 0
+    deltas = []
+    for ticket_id in ids:
+        deltas.append(ticket_id - previous)
+        previous = ticket_id
+    return deltas
+
+def build_scan_manifest(event_id, since=None):
+    """ Return the manifest of an event, or the changes after `since` (a datetime), the full manifest
+    if `since` is older than SCAN_CURSOR_MAX_AGE. Runs one query for the tickets and, for deltas, one
+    for the deleted tickets """
+    now = timezone.now()
+    if since is not None and cursor_expired(since, now):
+        since = None
+    tickets = Ticket.objects.filter(event_id=event_id)
+    removed = []
+    if since is None:
+        tickets = tickets.filter(status__in=VALID_STATUSES)
+    else:
+        tickets = tickets.filter(updated_at__gte=since)
+        removed += DeletedTicket.objects.filter(event_id=event_id, deleted_at__gte=since).values_list('ticket_id', flat=True)
+
+    valid = []
+    rows = tickets.order_by('id').values_list('id', 'status', 'user__first_name', 'user__last_name', 'user__student_id')
+    for row in rows:
+        if row[1] in VALID_STATUSES:
+            valid.append(row)
+        else:
+            # Cancelled or refunded since the cursor
+            removed.append(row[0])
+
+    return {
+        'event_id': event_id,
+        'full': since is None,
+        'cursor': encode_cursor(now - CURSOR_OVERLAP),
+        'count': len(valid),
+        'ids': delta_encode(row[0] for row in valid),
+        'status': ''.join(row[1] for row in valid),
+        'first_name': [row[2] for row in valid],
+        'last_name': [row[3] for row in valid],
+        'student_id': [row[4] for row in valid],
+        'removed': sorted(set(removed)),
+    }
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-17 18:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_inventory(apps, schema_editor):
+    Event = apps.get_model('ticketsystem', 'Event')
+    EventInventory = apps.get_model('ticketsystem', 'EventInventory')
+    EventInventory.objects.bulk_create([
+        EventInventory(event_id=event.id, capacity=event.capacity, sold=event.tickets_sold)
+        for event in Event.objects.annotate(tickets_sold=Count('ticket'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0008_remove_profile_id_alter_profile_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventInventory',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='inventory', serialize=False, to='ticketsystem.event')),
+                ('capacity', models.IntegerField(blank=True, null=True)),
+                ('sold', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_inventory, migrations.RunPython.noop),
+    ]
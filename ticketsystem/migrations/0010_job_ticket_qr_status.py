@@ -0,0 +1,50 @@
+# Generated by Django 5.0.1 on 2026-10-17 18:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_existing_qr_codes(apps, schema_editor):
+    """ Tickets that already have a stored QR are ready, the rest get a render job """
+    Ticket = apps.get_model('ticketsystem', 'Ticket')
+    Job = apps.get_model('ticketsystem', 'Job')
+    Ticket.objects.exclude(qr_code__isnull=True).exclude(qr_code='').update(qr_status='R')
+    Job.objects.bulk_create([
+        Job(name='render_ticket_qr', payload={'ticket_id': ticket_id})
+        for ticket_id in Ticket.objects.filter(qr_status='P').values_list('id', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0009_eventinventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='qr_status',
+            field=models.CharField(choices=[('P', 'Pending'), ('R', 'Ready'), ('F', 'Failed')], default='P', max_length=1),
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('P', 'Pending'), ('R', 'Running'), ('D', 'Done'), ('F', 'Failed')], default='P', max_length=1)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=5)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='ticketsyste_status_8a2789_idx')],
+            },
+        ),
+        migrations.RunPython(mark_existing_qr_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-17 18:56
+
+from django.db import migrations
+
+
+def drop_render_jobs(apps, schema_editor):
+    """ QR codes are rendered on request now, the queued renders are not needed """
+    Job = apps.get_model('ticketsystem', 'Job')
+    Job.objects.filter(name='render_ticket_qr').exclude(status='D').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0010_job_ticket_qr_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_render_jobs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='ticket',
+            name='qr_status',
+        ),
+    ]
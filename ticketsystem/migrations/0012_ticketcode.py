@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-17 19:04
+
+from django.db import migrations, models
+
+
+def reserve_existing_codes(apps, schema_editor):
+    Ticket = apps.get_model('ticketsystem', 'Ticket')
+    TicketCode = apps.get_model('ticketsystem', 'TicketCode')
+    TicketCode.objects.bulk_create(
+        [TicketCode(code=code) for code in Ticket.objects.values_list('code', flat=True).iterator()],
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0011_remove_ticket_qr_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketCode',
+            fields=[
+                ('code', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(reserve_existing_codes, migrations.RunPython.noop),
+    ]
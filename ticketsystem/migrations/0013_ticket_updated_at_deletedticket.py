@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-17 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0012_ticketcode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedTicket',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('ticket_id', models.IntegerField()),
+                ('event_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'updated_at'], name='ticketsyste_event_i_e424fc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedticket',
+            index=models.Index(fields=['event_id', 'deleted_at'], name='ticketsyste_event_i_9c629c_idx'),
+        ),
+    ]
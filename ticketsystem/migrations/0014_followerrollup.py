@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-17 19:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_rollup(apps, schema_editor):
+    Follow = apps.get_model('ticketsystem', 'Follow')
+    FollowerRollup = apps.get_model('ticketsystem', 'FollowerRollup')
+    counts = {}
+    for club_id, year, course, count in Follow.objects.values_list('club_id', 'user__profile__year', 'user__profile__course').annotate(count=models.Count('id')).order_by():
+        key = (club_id, year, course) if year is not None else (club_id, 0, 'none')
+        counts[key] = counts.get(key, 0) + count
+    FollowerRollup.objects.bulk_create(
+        [FollowerRollup(club_id=club_id, year=year, course=course, count=count) for (club_id, year, course), count in counts.items()],
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0013_ticket_updated_at_deletedticket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowerRollup',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('year', models.IntegerField()),
+                ('course', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+                ('club', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower_rollup', to='ticketsystem.club')),
+            ],
+            options={
+                'unique_together': {('club', 'year', 'course')},
+            },
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
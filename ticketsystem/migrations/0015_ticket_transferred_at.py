@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-17 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0014_followerrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='transferred_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
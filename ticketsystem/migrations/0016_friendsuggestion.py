@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0015_ticket_transferred_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendSuggestion',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('score', models.FloatField()),
+                ('mutual_friends', models.IntegerField(default=0)),
+                ('shared_clubs', models.IntegerField(default=0)),
+                ('shared_events', models.IntegerField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now_add=True)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friend_suggestions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-score'], name='ticketsyste_user_id_a58d82_idx')],
+                'unique_together': {('user', 'candidate')},
+            },
+        ),
+    ]
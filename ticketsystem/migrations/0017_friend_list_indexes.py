@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0016_friendsuggestion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='friend',
+            index=models.Index(fields=['sender', 'status', 'created_at'], name='ticketsyste_sender__57c223_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friend',
+            index=models.Index(fields=['receiver', 'status', 'created_at'], name='ticketsyste_receive_9fd2f9_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0017_friend_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'status', 'user'], name='ticketsyste_event_i_27c65c_idx'),
+        ),
+    ]
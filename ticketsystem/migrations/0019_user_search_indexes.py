@@ -0,0 +1,64 @@
+from django.db import migrations
+
+SEARCH_COLUMNS = ('username', 'first_name', 'last_name')
+
+# Prefix lookups (istartswith, iexact) compare UPPER(column::text) on PostgreSQL, pattern ops let a
+# btree serve the LIKE 'q%'. The trigram indexes serve LIKE '%q%' (icontains)
+POSTGRES_FORWARDS = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+    f'CREATE INDEX IF NOT EXISTS ticketsystem_user_{column}_prefix ON ticketsystem_user (UPPER({column}::text) text_pattern_ops)'
+    for column in SEARCH_COLUMNS
+] + [
+    f'CREATE INDEX IF NOT EXISTS ticketsystem_user_{column}_trgm ON ticketsystem_user USING gin (UPPER({column}::text) gin_trgm_ops)'
+    for column in SEARCH_COLUMNS
+]
+POSTGRES_BACKWARDS = [f'DROP INDEX IF EXISTS ticketsystem_user_{column}_{kind}' for column in SEARCH_COLUMNS for kind in ('prefix', 'trgm')]
+
+# SQLite runs LIKE 'q%' on an index only when the index is NOCASE. Substrings are looked up in an
+# FTS5 trigram table over the user columns, kept up to date by triggers
+SQLITE_FORWARDS = [
+    f'CREATE INDEX IF NOT EXISTS ticketsystem_user_{column}_prefix ON ticketsystem_user ({column} COLLATE NOCASE)'
+    for column in SEARCH_COLUMNS
+] + [
+    "CREATE VIRTUAL TABLE ticketsystem_user_trigram USING fts5("
+    "username, first_name, last_name, content='ticketsystem_user', content_rowid='id', tokenize='trigram')",
+    "INSERT INTO ticketsystem_user_trigram(ticketsystem_user_trigram) VALUES ('rebuild')",
+    "CREATE TRIGGER ticketsystem_user_trigram_insert AFTER INSERT ON ticketsystem_user BEGIN "
+    "INSERT INTO ticketsystem_user_trigram(rowid, username, first_name, last_name) VALUES (new.id, new.username, new.first_name, new.last_name); END",
+    "CREATE TRIGGER ticketsystem_user_trigram_delete AFTER DELETE ON ticketsystem_user BEGIN "
+    "INSERT INTO ticketsystem_user_trigram(ticketsystem_user_trigram, rowid, username, first_name, last_name) "
+    "VALUES ('delete', old.id, old.username, old.first_name, old.last_name); END",
+    "CREATE TRIGGER ticketsystem_user_trigram_update AFTER UPDATE OF username, first_name, last_name ON ticketsystem_user BEGIN "
+    "INSERT INTO ticketsystem_user_trigram(ticketsystem_user_trigram, rowid, username, first_name, last_name) "
+    "VALUES ('delete', old.id, old.username, old.first_name, old.last_name); "
+    "INSERT INTO ticketsystem_user_trigram(rowid, username, first_name, last_name) VALUES (new.id, new.username, new.first_name, new.last_name); END",
+]
+SQLITE_BACKWARDS = [
+    'DROP TRIGGER IF EXISTS ticketsystem_user_trigram_insert',
+    'DROP TRIGGER IF EXISTS ticketsystem_user_trigram_delete',
+    'DROP TRIGGER IF EXISTS ticketsystem_user_trigram_update',
+    'DROP TABLE IF EXISTS ticketsystem_user_trigram',
+] + [f'DROP INDEX IF EXISTS ticketsystem_user_{column}_prefix' for column in SEARCH_COLUMNS]
+
+STATEMENTS = {
+    'postgresql': (POSTGRES_FORWARDS, POSTGRES_BACKWARDS),
+    'sqlite': (SQLITE_FORWARDS, SQLITE_BACKWARDS),
+}
+
+
+def run(direction):
+    def operation(apps, schema_editor):
+        # Other databases search without the indexes
+        for statement in STATEMENTS.get(schema_editor.connection.vendor, ((), ()))[direction]:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0018_ticket_event_status_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(0), run(1)),
+    ]
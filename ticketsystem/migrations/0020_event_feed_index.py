@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-17 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0019_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date', 'time', 'id'], name='ticketsyste_date_a1434d_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.1 on 2026-10-17 21:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_feeds(apps, schema_editor):
+    Club = apps.get_model('ticketsystem', 'Club')
+    Event = apps.get_model('ticketsystem', 'Event')
+    Follow = apps.get_model('ticketsystem', 'Follow')
+    FeedEntry = apps.get_model('ticketsystem', 'FeedEntry')
+    limit = getattr(settings, 'FEED_FANOUT_LIMIT', 5000)
+    followers = dict(Follow.objects.values_list('club_id').annotate(followers=models.Count('id')).order_by())
+    Club.objects.filter(id__in=[club_id for club_id, count in followers.items() if count > limit]).update(fan_out_on_read=True)
+    for club_id, count in followers.items():
+        if count > limit:
+            continue
+        events = list(Event.objects.filter(club_id=club_id).values_list('id', 'date', 'time'))
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user_id=user_id, event_id=event_id, club_id=club_id, date=date, time=time)
+            for user_id in Follow.objects.filter(club_id=club_id).values_list('user_id', flat=True)
+            for event_id, date, time in events
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketsystem', '0020_event_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='club',
+            name='fan_out_on_read',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('club', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ticketsystem.club')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ticketsystem.event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date', 'time', 'event'], name='ticketsyste_user_id_b3f009_idx'), models.Index(fields=['user', 'club'], name='ticketsyste_user_id_76ff8c_idx')],
+                'unique_together': {('user', 'event')},
+            },
+        ),
+        migrations.RunPython(build_feeds, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import models, transaction, connection
 from django.conf import settings
+from django.utils import timezone
 from django.core.exceptions import ValidationError
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser, Group, Permission
-from django.db.models import Q
+from django.db.models import Q, F, Case, When, Value, Exists, OuterRef, Count
+from django.db.models.functions import Greatest
 
 from backend.storage_backends import PrivateMediaStorage
 
@@ -37,12 +40,8 @@ class User(AbstractUser):
     created_by = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, default=None)
 
     def is_friends_with(self, user):
-        status_friends = Friend.objects.filter(
-            Q(sender=self, receiver=user) | Q(sender=user, receiver=self),
-            status=True
-        ).exists()
-        print("The status: ", status_friends)
-        return status_friends
+        from .friends import are_friends
+        return are_friends(self.id, user.id)
 
     def __str__(self):
         return self.username
@@ -70,6 +69,40 @@ class TransferRequest(models.Model):
     class Meta:
         unique_together = ('sender', 'ticket')
     
+class TicketManager(models.Manager):
+    def mark_used(self, ticket_id, event_id, scanner_id, code=None):
+        """ Mark an active ticket of the event as used with one conditional UPDATE and return the attendee
+        (first_name, last_name, student_id), or None if no active ticket matched. Of two concurrent
+        scans of the same ticket only one can match, so a ticket never lets two people in """
+        ticket_table = connection.ops.quote_name(self.model._meta.db_table)
+        user_table = connection.ops.quote_name(User._meta.db_table)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        conditions = f"{ticket_table}.id = %s AND {ticket_table}.event_id = %s AND {ticket_table}.status = 'A'"
+        params = [now, scanner_id, now, ticket_id, event_id]
+        if code is not None:
+            conditions += f" AND {ticket_table}.code = %s"
+            params.append(code)
+        assignments = (
+            "status = 'U', scanned_at = COALESCE(scanned_at, %s), "
+            "scanned_by_id = CASE WHEN scanned_at IS NULL THEN %s ELSE scanned_by_id END, updated_at = %s"
+        )
+        if connection.vendor == 'postgresql':
+            sql = (
+                f"UPDATE {ticket_table} SET {assignments} FROM {user_table} "
+                f"WHERE {conditions} AND {user_table}.id = {ticket_table}.user_id "
+                f"RETURNING {user_table}.first_name, {user_table}.last_name, {user_table}.student_id"
+            )
+        else:
+            # SQLite can not return the columns of a joined table, read them with subqueries
+            attendee = ', '.join(
+                f"(SELECT {column} FROM {user_table} WHERE {user_table}.id = {ticket_table}.user_id)"
+                for column in ('first_name', 'last_name', 'student_id')
+            )
+            sql = f"UPDATE {ticket_table} SET {assignments} WHERE {conditions} RETURNING {attendee}"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+
 class Ticket(models.Model):
     id = models.AutoField(primary_key=True)
     title = models.CharField(max_length=50)
@@ -85,14 +118,35 @@ class Ticket(models.Model):
     status = models.CharField(max_length=10, 
                                 choices=STATUS_CHOICES,
                                 default='A')
+    # Only set on older tickets, QR codes are now rendered on request (see TicketQRCodeView)
     qr_code = models.ImageField(upload_to='ticket_qr_code/', blank=True, null=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     event = models.ForeignKey('Event', on_delete=models.CASCADE)
     scanned_at = models.DateTimeField(blank=True, null=True)
     scanned_by = models.ForeignKey(User, related_name='scanned_by', on_delete=models.SET_NULL, blank=True, null=True)
+    # Cursor of the scanner manifest delta sync, set it explicitly in queryset updates
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set on the ticket created for the receiver of a transfer, order_date stays the one of the original purchase
+    transferred_at = models.DateTimeField(blank=True, null=True)
+
+    objects = TicketManager()
 
     class Meta:
         unique_together = ('user', 'event')
+        indexes = [
+            models.Index(fields=['event', 'updated_at']),
+            # Covers the friends going lookup, the holders of an event are read from the index alone
+            models.Index(fields=['event', 'status', 'user']),
+        ]
+
+    def save(self, *args, **kwargs):
+        """ New tickets take a seat from the event inventory in the same transaction as the insert,
+        so a failed insert gives the seat back and a sold out event never gets the row """
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            EventInventory.objects.reserve(self.event_id)
+            return super().save(*args, **kwargs)
 
 class StripeAccount(models.Model):
     stripe_id = models.CharField(max_length=1000, blank=True, null=True)
@@ -110,6 +164,9 @@ class Club(models.Model):
     content = models.TextField()
     stripe = models.OneToOneField(StripeAccount, blank=True, null=True, on_delete=models.SET_NULL)
     club_admins = models.ManyToManyField(User, related_name='club_admins')
+    # Set once the club has more than FEED_FANOUT_LIMIT followers, its events are then read into the
+    # home feeds of its followers instead of being copied to them (see feed.py)
+    fan_out_on_read = models.BooleanField(default=False)
 
 class Friend(models.Model):
     id = models.AutoField(primary_key=True)
@@ -121,16 +178,36 @@ class Friend(models.Model):
 
     class Meta:
         unique_together = ('sender', 'receiver')
+        # Friend lists page through the friendships of a user by date
+        indexes = [
+            models.Index(fields=['sender', 'status', 'created_at']),
+            models.Index(fields=['receiver', 'status', 'created_at']),
+        ]
     
     def clean(self):
         if self.sender == self.receiver:
             raise ValidationError("A user cannot be friends with themselves.")
 
+class FollowManager(models.Manager):
+    def common_clubs(self, user_id, other_user_id):
+        """ Clubs followed by both users, one query intersecting their follows """
+        return Club.objects.filter(follow__user_id=other_user_id, id__in=self.filter(user_id=user_id).values('club_id')).order_by('name')
+
+    def common_club_counts(self, user_id, usernames):
+        """ {username: number of clubs followed by both the user and them} for every username, one query """
+        rows = (self.filter(user__username__in=usernames, club_id__in=self.filter(user_id=user_id).values('club_id'))
+                .values_list('user__username').annotate(common=Count('club_id')).order_by())
+        counts = dict.fromkeys(usernames, 0)
+        counts.update(rows)
+        return counts
+
 class Follow(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     club = models.ForeignKey(Club, on_delete=models.CASCADE)
 
+    objects = FollowManager()
+
     class Meta:
         unique_together = ('user', 'club')
 
@@ -171,4 +248,302 @@ class Event(models.Model):
     event_type = models.CharField(max_length=10,
                                   choices=EVENT_CHOICES,    
                                   default='M')
-    club = models.ForeignKey(Club, on_delete=models.CASCADE)
\ No newline at end of file
+    club = models.ForeignKey(Club, on_delete=models.CASCADE)
+
+    class Meta:
+        # Event feeds page through events by (date, time, id), newest first
+        indexes = [models.Index(fields=['date', 'time', 'id'])]
+
+class Job(models.Model):
+    """ Background job stored in the database and run by the run_jobs management command """
+    STATUS_CHOICES = (
+        ('P', 'Pending'),
+        ('R', 'Running'),
+        ('D', 'Done'),
+        ('F', 'Failed'),
+    )
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='P')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+class TicketCode(models.Model):
+    """ Every ticket code ever minted. The primary key reserves a code before any ticket uses it (see codes.py) """
+    code = models.CharField(max_length=100, primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class DeletedTicket(models.Model):
+    """ Tombstone of a deleted ticket, so scanner manifest deltas can drop it (see manifest.py) """
+    id = models.AutoField(primary_key=True)
+    ticket_id = models.IntegerField()
+    # Not a foreign key, tickets deleted along with their event still leave a row
+    event_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['event_id', 'deleted_at'])]
+
+class SoldOut(Exception):
+    """ Raised when an event has no seats left """
+    pass
+
+class EventInventoryManager(models.Manager):
+    def sync(self, event):
+        """ Create the inventory row for an event or refresh its capacity """
+        inventory, created = self.get_or_create(
+            event_id=event.id,
+            defaults={'capacity': event.capacity, 'sold': Ticket.objects.filter(event_id=event.id).count()}
+        )
+        if not created and inventory.capacity != event.capacity:
+            self.filter(event_id=event.id).update(capacity=event.capacity)
+        self.refresh_soldout(event.id)
+
+    def reserve(self, event_id, quantity=1):
+        """ Take seats from the event with a single conditional UPDATE. The row lock taken by the
+        update serialises concurrent purchases, so the event can never be oversold """
+        has_room = Q(capacity__isnull=True) | Q(sold__lte=F('capacity') - quantity)
+        updated = self.filter(has_room, event_id=event_id).update(sold=F('sold') + quantity)
+        if not updated:
+            if self.filter(event_id=event_id).exists():
+                raise SoldOut()
+            # Events created before the inventory existed get their row on first purchase
+            self.sync(Event.objects.get(id=event_id))
+            updated = self.filter(has_room, event_id=event_id).update(sold=F('sold') + quantity)
+            if not updated:
+                raise SoldOut()
+        self.refresh_soldout(event_id)
+
+    def reserve_up_to(self, event_id, quantity):
+        """ Take as many of `quantity` seats as are left and return how many were taken.
+        Must run inside a transaction, the inventory row stays locked until it commits """
+        inventory = self.select_for_update().filter(event_id=event_id).first()
+        if inventory is None:
+            self.sync(Event.objects.get(id=event_id))
+            inventory = self.select_for_update().get(event_id=event_id)
+        if inventory.capacity is not None:
+            quantity = max(0, min(quantity, inventory.capacity - inventory.sold))
+        if quantity:
+            self.reserve(event_id, quantity)
+        return quantity
+
+    def release(self, event_id, quantity=1):
+        """ Give seats back to the event, used when tickets are deleted """
+        self.filter(event_id=event_id).update(sold=Greatest(F('sold') - quantity, 0))
+        self.refresh_soldout(event_id)
+
+    def refresh_soldout(self, event_id):
+        """ Keep Event.soldout in step with the inventory row """
+        full = self.filter(event_id=OuterRef('id'), capacity__isnull=False, sold__gte=F('capacity'))
+        Event.objects.filter(id=event_id).update(
+            soldout=Case(When(Exists(full), then=Value(1)), default=Value(0))
+        )
+
+    def is_sold_out(self, event_id):
+        """ Return if the event has no seats left, without counting its tickets """
+        return self.filter(event_id=event_id, capacity__isnull=False, sold__gte=F('capacity')).exists()
+
+class EventInventory(models.Model):
+    """ Seat counter per event. Purchases take seats with a conditional update instead of counting tickets """
+    event = models.OneToOneField(Event, primary_key=True, related_name='inventory', on_delete=models.CASCADE)
+    capacity = models.IntegerField(blank=True, null=True)
+    sold = models.IntegerField(default=0)
+
+    objects = EventInventoryManager()
+
+class FriendSuggestion(models.Model):
+    """ Precomputed "people you may know" of a user, the top candidates by score (see suggestions.py) """
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, related_name='friend_suggestions', on_delete=models.CASCADE)
+    candidate = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+    mutual_friends = models.IntegerField(default=0)
+    shared_clubs = models.IntegerField(default=0)
+    shared_events = models.IntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'candidate')
+        indexes = [models.Index(fields=['user', '-score'])]
+
+NO_PROFILE = (0, 'none')
+
+class FollowerRollupManager(models.Manager):
+    def shift(self, club_ids, old=None, new=None):
+        """ Move one follower of each club from the `old` (year, course) cell to the `new` one.
+        Either side can be None, for follows being created or deleted """
+        club_ids = list(club_ids)
+        if not club_ids:
+            return
+        if old is not None:
+            self.filter(club_id__in=club_ids, year=old[0], course=old[1]).update(count=F('count') - 1)
+        if new is not None:
+            # Create the missing cells first so the increment is a single UPDATE, also under concurrency
+            self.bulk_create([FollowerRollup(club_id=club_id, year=new[0], course=new[1]) for club_id in club_ids], ignore_conflicts=True)
+            self.filter(club_id__in=club_ids, year=new[0], course=new[1]).update(count=F('count') + 1)
+
+    def actual(self, club_ids=None):
+        """ Follower counts per (club, year, course) computed from the follows, for rebuilds and drift checks """
+        follows = Follow.objects.all()
+        if club_ids is not None:
+            follows = follows.filter(club_id__in=club_ids)
+        counts = follows.values_list('club_id', 'user__profile__year', 'user__profile__course').annotate(count=models.Count('id')).order_by()
+        actual = {}
+        for club_id, year, course, count in counts:
+            # Followers without a profile count with the profile defaults
+            key = (club_id, year, course) if year is not None else (club_id, *NO_PROFILE)
+            actual[key] = actual.get(key, 0) + count
+        return actual
+
+    def rebuild(self, club_ids=None):
+        """ Replace the rollup with the counts computed from the follows """
+        actual = self.actual(club_ids)
+        with transaction.atomic():
+            rows = self.all() if club_ids is None else self.filter(club_id__in=club_ids)
+            rows.delete()
+            self.bulk_create([
+                FollowerRollup(club_id=club_id, year=year, course=course, count=count)
+                for (club_id, year, course), count in actual.items()
+            ], batch_size=1000)
+        return len(actual)
+
+class FollowerRollup(models.Model):
+    """ Followers of a club counted by profile year and course, kept up to date by the Follow and Profile signals
+    below. Rebuild or check it with the rebuild_follower_rollup command """
+    id = models.AutoField(primary_key=True)
+    club = models.ForeignKey(Club, related_name='follower_rollup', on_delete=models.CASCADE)
+    year = models.IntegerField()
+    course = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    objects = FollowerRollupManager()
+
+    class Meta:
+        unique_together = ('club', 'year', 'course')
+
+class FeedEntry(models.Model):
+    """ An event in the home feed of a follower of its club, with the date and time of the event to page the
+    feed from one index. Written when an event is published or a club followed (see feed.py) """
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, related_name='feed', on_delete=models.CASCADE)
+    event = models.ForeignKey(Event, related_name='+', on_delete=models.CASCADE)
+    club = models.ForeignKey(Club, related_name='+', on_delete=models.CASCADE)
+    date = models.DateField()
+    time = models.TimeField()
+
+    class Meta:
+        unique_together = ('user', 'event')
+        indexes = [
+            models.Index(fields=['user', 'date', 'time', 'event']),
+            # Unfollowing removes the entries of the club
+            models.Index(fields=['user', 'club']),
+        ]
+
+@receiver(post_save, sender=Event)
+def sync_event_inventory(sender, instance, raw=False, **kwargs):
+    if not raw:
+        EventInventory.objects.sync(instance)
+
+@receiver(post_save, sender=Friend)
+@receiver(post_delete, sender=Friend)
+def invalidate_friends(sender, instance, **kwargs):
+    from .friends import invalidate_friend_graph
+    invalidate_friend_graph(instance.sender_id, instance.receiver_id)
+
+@receiver(post_save, sender=Friend)
+@receiver(post_delete, sender=Friend)
+def refresh_friend_suggestions(sender, instance, raw=False, **kwargs):
+    from .jobs import enqueue
+    # Only accepting or removing a friendship changes the ranking, the suggestions view drops the
+    # users of pending requests when it reads
+    if not raw and instance.status:
+        enqueue('refresh_friend_suggestions', sender_id=instance.sender_id, receiver_id=instance.receiver_id)
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_stats(sender, instance, **kwargs):
+    from .stats import invalidate_club_stats
+    invalidate_club_stats(instance.club_id)
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def invalidate_ticket_stats(sender, instance, **kwargs):
+    from .stats import invalidate_club_stats
+    # The event is usually loaded already when a ticket is bought
+    if Ticket.event.is_cached(instance):
+        invalidate_club_stats(instance.event.club_id)
+    else:
+        invalidate_club_stats(*Event.objects.filter(id=instance.event_id).values_list('club_id', flat=True))
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile_stats(sender, instance, raw=False, **kwargs):
+    from .stats import invalidate_club_stats
+    # The year of the profile counts in the stats of every club the user holds a ticket for
+    if not raw:
+        invalidate_club_stats(*Event.objects.filter(ticket__user_id=instance.user_id).values_list('club_id', flat=True).distinct())
+
+@receiver(post_delete, sender=Ticket)
+def release_ticket_seat(sender, instance, **kwargs):
+    EventInventory.objects.release(instance.event_id)
+    DeletedTicket.objects.create(ticket_id=instance.id, event_id=instance.event_id)
+
+def profile_cell(user_id):
+    return Profile.objects.filter(user_id=user_id).values_list('year', 'course').first() or NO_PROFILE
+
+@receiver(post_save, sender=Follow)
+def add_follower_to_rollup(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        FollowerRollup.objects.shift([instance.club_id], new=profile_cell(instance.user_id))
+
+@receiver(post_delete, sender=Follow)
+def remove_follower_from_rollup(sender, instance, **kwargs):
+    FollowerRollup.objects.shift([instance.club_id], old=profile_cell(instance.user_id))
+
+@receiver(pre_save, sender=Profile)
+@receiver(pre_delete, sender=Profile)
+def remember_profile_cell(sender, instance, update_fields=None, **kwargs):
+    # The stored values, the instance may be stale or have year and course deferred
+    if update_fields is None or {'year', 'course'} & set(update_fields):
+        instance._rollup_cell = profile_cell(instance.pk)
+
+@receiver(post_save, sender=Profile)
+def move_profile_in_rollup(sender, instance, raw=False, **kwargs):
+    old = instance.__dict__.pop('_rollup_cell', None)
+    new = (instance.year, instance.course)
+    if old is not None and old != new and not raw:
+        FollowerRollup.objects.shift(Follow.objects.filter(user_id=instance.user_id).values_list('club_id', flat=True), old, new)
+
+@receiver(post_delete, sender=Profile)
+def reset_profile_in_rollup(sender, instance, **kwargs):
+    old = instance.__dict__.pop('_rollup_cell', NO_PROFILE)
+    if old != NO_PROFILE:
+        FollowerRollup.objects.shift(Follow.objects.filter(user_id=instance.user_id).values_list('club_id', flat=True), old, NO_PROFILE)
+
+@receiver(post_save, sender=Event)
+def publish_event_to_feeds(sender, instance, created, raw=False, **kwargs):
+    from .feed import publish_event, move_event
+    if raw:
+        return
+    if created:
+        publish_event(instance)
+    else:
+        move_event(instance)
+
+@receiver(post_save, sender=Follow)
+def add_club_to_feed(sender, instance, created, raw=False, **kwargs):
+    from .feed import add_follow
+    if created and not raw:
+        add_follow(instance.user_id, instance.club_id)
+
+@receiver(post_delete, sender=Follow)
+def remove_club_from_feed(sender, instance, **kwargs):
+    FeedEntry.objects.filter(user_id=instance.user_id, club_id=instance.club_id).delete()
@@ -6,4 +6,7 @@ class IsTicketScannerUser(BasePermission):
     """
 
     def has_permission(self, request, view):
-        return request.user.user_type == 'ticket_scanner'
\ No newline at end of file
+        return request.user.user_type == 'ticket_scanner'
+def can_scan_event(user, event_id):
+    """ Ticket scanners can only validate tickets for the event they are assigned to """
+    return user.user_type == 'ticket_scanner' and user.event_id is not None and user.event_id == event_id
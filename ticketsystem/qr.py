@@ -0,0 +1,125 @@
+from django.conf import settings
+from django.core.signing import Signer
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils.http import urlencode
+
+import io
+import time
+import hashlib
+import threading
+import qrcode
+import qrcode.image.svg
+from collections import OrderedDict
+from importlib.metadata import version
+
+from .signing import sign_ticket
+
+# ====================================================================================================
+# Ticket QR codes
+# QR codes are rendered on request instead of being stored. The image only depends on the payload,
+# so rendered images are kept in a size bounded LRU cache and served with a strong ETag. An <img>
+# can not send the access token, the image URLs given to clients carry an expiring signature instead.
+# ====================================================================================================
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+# Part of the ETag, a new qrcode release may render different bytes for the same payload
+RENDERER_VERSION = version('qrcode')
+
+def ticket_qr_payload(ticket):
+    """ The data encoded in the ticket QR code, a signed payload scanners can verify offline.
+    QR codes stored on older tickets encode the validate-ticket URL, scanners keep accepting those """
+    return sign_ticket(ticket.id, ticket.event_id, ticket.code)
+
+def qr_etag(data, image_format):
+    """ Strong ETag of the image, computed from its inputs so a 304 never needs a render """
+    digest = hashlib.sha256(f"{RENDERER_VERSION}:{image_format}:{data}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def render_qr(data, image_format):
+    """ Render the QR code as PNG or SVG bytes, with the same look as ticketQRCodeGenerator """
+    if image_format == 'svg':
+        qr = qrcode.QRCode(version=1, box_size=10, border=5, image_factory=qrcode.image.svg.SvgPathImage)
+    else:
+        qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    img_io = io.BytesIO()
+    if image_format == 'svg':
+        qr.make_image().save(img_io)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(img_io, format='PNG')
+    return img_io.getvalue()
+
+class QRCodeCache:
+    """ Thread safe LRU cache of rendered images, bounded by the total size of the images """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            image = self.entries.get(key)
+            if image is not None:
+                self.entries.move_to_end(key)
+            return image
+
+    def set(self, key, image):
+        if len(image) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = image
+            self.size += len(image)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+qr_cache = QRCodeCache(getattr(settings, 'QR_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+def cached_render_qr(data, image_format):
+    """ Return the rendered QR code from the cache, rendering it on a miss """
+    key = (data, image_format)
+    image = qr_cache.get(key)
+    if image is None:
+        image = render_qr(data, image_format)
+        qr_cache.set(key, image)
+    return image
+
+def qr_url_max_age():
+    return getattr(settings, 'QR_URL_MAX_AGE', 3600)
+
+def qr_url_signature(ticket_id, image_format, expires):
+    return Signer(salt='ticketsystem.qr-url').signature(f'{ticket_id}:{image_format}:{expires}')
+
+def signed_qr_url(ticket_id, image_format='png'):
+    """ Path of the QR image with an expiring signature, it can be fetched without the access token.
+    The expiry is rounded up to a QR_URL_MAX_AGE window, so the URL, and the image cached for it, stay
+    the same within the window and are valid for at least QR_URL_MAX_AGE seconds """
+    max_age = qr_url_max_age()
+    expires = (int(time.time()) // max_age + 2) * max_age
+    path = reverse('ticket-qr-code', kwargs={'ticket_id': ticket_id, 'image_format': image_format})
+    return f"{path}?{urlencode({'expires': expires, 'signature': qr_url_signature(ticket_id, image_format, expires)})}"
+
+def signed_url_remaining(ticket_id, image_format, expires, signature):
+    """ Seconds the signed URL is still valid for, None if the signature does not match or has expired """
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return None
+    remaining = expires - int(time.time())
+    if remaining <= 0 or not constant_time_compare(signature, qr_url_signature(ticket_id, image_format, expires)):
+        return None
+    return remaining
@@ -0,0 +1,53 @@
+""" Bulk ticket issuance benchmark.
+
+Issues tickets to a guest list through BulkIssueTicketsView and, for comparison, through one
+POST /api/tickets/ per user, and reports tickets per second for both.
+
+Run with: python manage.py runscript bench_bulk_issue --script-args <tickets>
+"""
+import time
+
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ticketsystem.models import User, Club, Event
+
+
+def make_event(club, capacity):
+    return Event.objects.create(title='Bench Event', description='Benchmark', price=0, date='2030-01-01',
+                                time='20:00:00', capacity=capacity, location='Bench', club=club)
+
+
+def run(*args):
+    tickets = int(args[0]) if args else 500
+
+    admin = User.objects.create(username='bench_bulk_admin', email='bench_bulk_admin@example.com')
+    club = Club.objects.create(name='Bench Club', description='Benchmark', email='bench-bulk@example.com')
+    club.club_admins.add(admin)
+    User.objects.bulk_create([
+        User(username=f'bench_bulk_{n}', email=f'bench_bulk_{n}@example.com', student_id=f'bench_bulk_{n}')
+        for n in range(tickets)
+    ])
+    usernames = [f'bench_bulk_{n}' for n in range(tickets)]
+    client = APIClient()
+    client.force_authenticate(user=admin)
+
+    try:
+        event = make_event(club, tickets)
+        start = time.perf_counter()
+        response = client.post(reverse('bulk-issue-tickets', kwargs={'event_id': event.id}), {'users': usernames}, format='json')
+        elapsed = time.perf_counter() - start
+        issued = len(response.data['issued'])
+        print(f'bulk endpoint      tickets={issued} elapsed={elapsed:.3f}s rate={issued / elapsed:,.0f} tickets/s')
+
+        event = make_event(club, tickets)
+        start = time.perf_counter()
+        issued = 0
+        for username in usernames:
+            response = client.post(reverse('ticket-list'), {'user': username, 'event': event.id, 'title': event.title}, format='json')
+            issued += response.status_code == 201
+        elapsed = time.perf_counter() - start
+        print(f'one POST per user  tickets={issued} elapsed={elapsed:.3f}s rate={issued / elapsed:,.0f} tickets/s')
+    finally:
+        club.delete()
+        User.objects.filter(username__startswith='bench_bulk_').delete()
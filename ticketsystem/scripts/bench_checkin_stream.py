@@ -0,0 +1,62 @@
+""" Fan-out benchmark for the live check-in broker.
+
+Subscribes a number of dashboards to one event and publishes check-ins from a request thread, as
+ValidateTicketView does. Reports the time until every subscriber has a message and the deliveries
+per second.
+
+Run with: python manage.py runscript bench_checkin_stream --script-args <subscribers> <messages>
+"""
+import time
+import asyncio
+import threading
+import statistics
+
+from ticketsystem.broker import InProcessBroker, checkin_channel
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def bench(subscribers, messages):
+    broker = InProcessBroker(max_pending=messages)
+    channel = checkin_channel(1)
+    subscriptions = [broker.subscribe(channel) for _ in range(subscribers)]
+    received = [[] for _ in range(messages)]
+
+    async def dashboard(subscription):
+        for _ in range(messages):
+            message = await subscription.get()
+            received[message['n']].append(time.perf_counter() - message['sent'])
+        subscription.close()
+
+    readers = [asyncio.ensure_future(dashboard(subscription)) for subscription in subscriptions]
+
+    def scanner():
+        for n in range(messages):
+            broker.publish(channel, {'n': n, 'sent': time.perf_counter()})
+            # Doors open, a scan every millisecond
+            time.sleep(0.001)
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=scanner)
+    thread.start()
+    await asyncio.gather(*readers)
+    elapsed = time.perf_counter() - start
+    thread.join()
+
+    # Time until the last subscriber got each message
+    fan_out = [max(latencies) * 1000 for latencies in received]
+    every = [latency * 1000 for latencies in received for latency in latencies]
+    print(f'subscribers={subscribers} messages={messages} deliveries={len(every)} elapsed={elapsed:.2f}s '
+          f'rate={len(every) / elapsed:,.0f} deliveries/s')
+    print(f'delivery ms p50={statistics.median(every):.3f} p99={percentile(every, 99):.3f}')
+    print(f'fan-out to all ms p50={statistics.median(fan_out):.3f} p99={percentile(fan_out, 99):.3f}')
+    print(f'dropped={sum(subscription.dropped for subscription in subscriptions)}')
+
+
+def run(*args):
+    subscribers = int(args[0]) if len(args) > 0 else 500
+    messages = int(args[1]) if len(args) > 1 else 200
+    asyncio.run(bench(subscribers, messages))
@@ -0,0 +1,69 @@
+""" Benchmark for the club event year breakdown (StatEventsYearView).
+
+Creates a club with a number of events and tickets per event, every holder with a profile, then
+requests the breakdown for growing numbers of events. Reports the queries and time of a cold and a
+cached request, the query count must not depend on the number of events or tickets.
+
+Run with: python manage.py runscript bench_club_stats --script-args <events> <tickets per event>
+"""
+import time
+
+from django.db import connection
+from django.urls import reverse
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ticketsystem.models import User, Club, Event, Ticket, Profile
+
+
+def measure(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.data
+    return len(queries), elapsed * 1000, response.data
+
+
+def run(*args):
+    events = int(args[0]) if len(args) > 0 else 100
+    tickets = int(args[1]) if len(args) > 1 else 1000
+
+    admin = User.objects.create_user(username='bench_stats_admin', email='bench_stats_admin@example.com', password='bench')
+    club = Club.objects.create(name='Bench Club', description='Benchmark', email='bench-stats@example.com')
+    club.club_admins.add(admin)
+    users = User.objects.bulk_create([
+        User(username=f'bench_stats_{n}', email=f'bench_stats_{n}@example.com') for n in range(tickets)
+    ])
+    Profile.objects.bulk_create([Profile(user=user, year=n % 6 + 1) for n, user in enumerate(users)])
+    client = APIClient()
+    client.force_authenticate(user=admin)
+    url = reverse('stats-event-user-year', kwargs={'club_id': club.id})
+
+    try:
+        created = 0
+        steps = sorted({max(1, events // 10), max(1, events // 2), events})
+        for step in steps:
+            batch = Event.objects.bulk_create([
+                Event(title=f'Bench Event {n}', description='Benchmark', price=0, date='2030-01-01',
+                      time='20:00:00', location='Bench', club=club)
+                for n in range(created, step)
+            ])
+            Ticket.objects.bulk_create([
+                Ticket(title=event.title, code=f'bench-stats-{event.id}-{n}', price=0, user=user, event=event)
+                for event in batch for n, user in enumerate(users)
+            ], batch_size=5000)
+            created = step
+
+            cache.clear()
+            cold_queries, cold_ms, data = measure(client, url)
+            warm_queries, warm_ms, _ = measure(client, url)
+            counted = sum(sum(event['year_data'].values()) for event in data)
+            print(f'events={step} tickets={step * tickets} counted={counted} '
+                  f'cold queries={cold_queries} {cold_ms:.1f}ms cached queries={warm_queries} {warm_ms:.1f}ms')
+        # Per ticket lookups before: club, events, then tickets, user and profile for every ticket
+        print(f'queries of the per ticket loop at events={events}: {2 + events + 2 * events * tickets}')
+    finally:
+        club.delete()
+        User.objects.filter(username__startswith='bench_stats_').delete()
@@ -0,0 +1,89 @@
+""" Benchmark for the friends going lookup (FriendsGoingView, EventFriendsGoingSerializer friends_going).
+
+Creates users, events with their tickets and a viewer with a number of friends, then reads the
+friends going to a page of events with the per friend loop it replaces and with friends_going, the
+join of the accepted Friend edges of the viewer to Ticket(event, status, user). Everything is
+rolled back at the end.
+
+Run with: python manage.py runscript bench_friends_going --script-args <users> <tickets> <friends>
+"""
+import time
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from ticketsystem.models import User, Club, Event, Ticket, Friend
+from ticketsystem.friends import friends_going, friend_ids
+
+PAGE_SIZE = 20
+TICKETS_PER_EVENT = 1000
+
+
+def measure(function):
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+    return result, len(queries), elapsed * 1000
+
+
+def per_friend(viewer_id, event_ids):
+    """ The friends, then the tickets of every friend """
+    going = {event_id: [] for event_id in event_ids}
+    for friend_id in friend_ids(viewer_id):
+        for ticket in Ticket.objects.filter(user_id=friend_id, event_id__in=event_ids, status__in=('A', 'U')).select_related('user'):
+            going[ticket.event_id].append(ticket.user)
+    return going
+
+
+def run(*args):
+    users = int(args[0]) if len(args) > 0 else 50000
+    tickets = int(args[1]) if len(args) > 1 else 500000
+    friends = int(args[2]) if len(args) > 2 else 300
+
+    with transaction.atomic():
+        start = time.perf_counter()
+        people = User.objects.bulk_create([
+            User(username=f'bench_going_{n}', email=f'bench_going_{n}@example.com') for n in range(users)
+        ], batch_size=5000)
+        viewer = people[0]
+        club = Club.objects.create(name='Bench Club', description='Benchmark', email='bench-going@example.com')
+        events = Event.objects.bulk_create([
+            Event(title=f'Bench Event {n}', description='Benchmark', price=0, date='2030-01-01',
+                  time='20:00:00', location='Bench', club=club)
+            for n in range(tickets // TICKETS_PER_EVENT)
+        ])
+        # A different run of users per event, every user holds tickets for several events
+        Ticket.objects.bulk_create([
+            Ticket(title=event.title, code=f'bench-going-{event.id}-{n}', price=0, event=event,
+                   user=people[(e * 997 + n) % users], status='C' if n % 10 == 0 else 'A')
+            for e, event in enumerate(events) for n in range(TICKETS_PER_EVENT)
+        ], batch_size=5000)
+        # The friends of the viewer spread over the users, requests in both directions, and a
+        # friendship between every pair of neighbouring users
+        spread = max(1, (users - 1) // friends)
+        viewer_friends = [people[1 + n * spread] for n in range(friends)]
+        Friend.objects.bulk_create(
+            [Friend(sender=viewer, receiver=friend, status=True) for friend in viewer_friends[::2]] +
+            [Friend(sender=friend, receiver=viewer, status=True) for friend in viewer_friends[1::2]] +
+            [Friend(sender=people[n], receiver=people[n + 1], status=True) for n in range(1, users - 1)],
+            batch_size=5000)
+        print(f'users={users} tickets={len(events) * TICKETS_PER_EVENT} events={len(events)} '
+              f'friends={friends} setup {time.perf_counter() - start:.1f}s')
+
+        page = [event.id for event in events[:PAGE_SIZE]]
+        joined, queries, ms = measure(lambda: friends_going(viewer.id, page))
+        looped, loop_queries, loop_ms = measure(lambda: per_friend(viewer.id, page))
+        assert {event_id: sorted(user.id for user in going) for event_id, going in joined.items()} == \
+               {event_id: sorted(user.id for user in going) for event_id, going in looped.items()}
+        found = sum(map(len, joined.values()))
+        print(f'page of {PAGE_SIZE} events, {found} friends going')
+        print(f'per friend loop: queries={loop_queries} {loop_ms:.1f}ms')
+        print(f'friends_going:   queries={queries} {ms:.1f}ms')
+        _, _, single_ms = measure(lambda: friends_going(viewer.id, page[:1]))
+        print(f'friends_going of one event: {single_ms:.1f}ms')
+
+        accepted = Friend.objects.filter(status=True)
+        plan = Ticket.objects.filter(event_id__in=page, status__in=('A', 'U'), user_id__in=accepted.filter(sender_id=viewer.id).values('receiver_id')).values('user_id').explain()
+        print('plan:', plan.replace('\n', ' | '))
+        transaction.set_rollback(True)
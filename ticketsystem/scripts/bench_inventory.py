@@ -0,0 +1,79 @@
+""" Concurrency benchmark for the event inventory.
+
+Fires parallel purchases at a single event and checks that it is never oversold and that
+the time per purchase does not grow as the event fills up.
+
+Run with: python manage.py runscript bench_inventory --script-args <purchases> <capacity> <workers>
+Use Postgres for meaningful numbers, SQLite serialises every writer on a file lock.
+"""
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, OperationalError
+
+from ticketsystem.models import User, Club, Event, Ticket, EventInventory, SoldOut
+from ticketsystem.utils import ticketCodeGenerator
+
+
+def purchase(event_id, user_id):
+    """ One purchase, the same insert path TicketViewSet.create uses """
+    start = time.perf_counter()
+    try:
+        Ticket.objects.create(title='Bench Ticket', code=ticketCodeGenerator(), price=0, user_id=user_id, event_id=event_id)
+        outcome = 'sold'
+    except SoldOut:
+        outcome = 'soldout'
+    except OperationalError:
+        outcome = 'error'
+    finally:
+        connection.close()
+    return outcome, time.perf_counter() - start
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(*args):
+    purchases = int(args[0]) if len(args) > 0 else 500
+    capacity = int(args[1]) if len(args) > 1 else 300
+    workers = int(args[2]) if len(args) > 2 else 32
+
+    club = Club.objects.create(name='Bench Club', description='Benchmark', email='bench-inventory@example.com')
+    event = Event.objects.create(title='Bench Event', description='Benchmark', price=0, date='2030-01-01',
+                                 time='20:00:00', capacity=capacity, location='Bench', club=club)
+    User.objects.bulk_create([
+        User(username=f'bench_inventory_{n}', email=f'bench_inventory_{n}@example.com') for n in range(purchases)
+    ])
+    user_ids = list(User.objects.filter(username__startswith='bench_inventory_').values_list('id', flat=True))
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda user_id: purchase(event.id, user_id), user_ids))
+        elapsed = time.perf_counter() - start
+
+        outcomes = [outcome for outcome, _ in results]
+        latencies = [latency * 1000 for _, latency in results]
+        sold = Ticket.objects.filter(event=event).count()
+        inventory = EventInventory.objects.get(event=event)
+
+        # Latency of the first and last quarter of purchases, these should be about the same
+        quarter = max(1, len(latencies) // 4)
+        print(f'purchases={purchases} capacity={capacity} workers={workers} elapsed={elapsed:.2f}s')
+        print(f'sold={outcomes.count("sold")} soldout={outcomes.count("soldout")} errors={outcomes.count("error")}')
+        print(f'tickets in db={sold} inventory sold={inventory.sold}')
+        print(f'latency ms p50={statistics.median(latencies):.2f} p99={percentile(latencies, 99):.2f}')
+        print(f'latency ms first quarter p50={statistics.median(latencies[:quarter]):.2f} '
+              f'last quarter p50={statistics.median(latencies[-quarter:]):.2f}')
+
+        if sold > capacity or inventory.sold != sold:
+            print('FAIL: event was oversold or the inventory drifted')
+        else:
+            print('OK: no oversell')
+    finally:
+        event.delete()
+        club.delete()
+        User.objects.filter(username__startswith='bench_inventory_').delete()
@@ -0,0 +1,61 @@
+""" QR rendering benchmark.
+
+Compares the old ticketQRCodeGenerator (render + save to storage, as the purchase used to do)
+with the on-demand renderer behind TicketQRCodeView, cold (cache miss) and warm (cache hit), and
+times signing and verifying the signed QR payloads.
+
+Run with: python manage.py runscript bench_qr --script-args <tickets>
+"""
+import time
+import statistics
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from ticketsystem.models import Ticket
+from ticketsystem.utils import ticketQRCodeGenerator
+from ticketsystem.qr import ticket_qr_payload, cached_render_qr, qr_cache
+from ticketsystem.signing import event_key, verify_ticket_payload
+
+
+def timed(func, ticket_ids):
+    latencies = []
+    for ticket_id in ticket_ids:
+        start = time.perf_counter()
+        func(ticket_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name, latencies):
+    print(f'{name:<28} p50={statistics.median(latencies):8.3f}ms  '
+          f'mean={statistics.mean(latencies):8.3f}ms  max={max(latencies):8.3f}ms')
+
+
+def stored_png(ticket_id):
+    """ What every purchase used to do """
+    qr_code_image = ticketQRCodeGenerator(ticket_id)
+    name = default_storage.save(f"bench_qr/ticket_{ticket_id}_qr_code.png", ContentFile(qr_code_image.getvalue()))
+    default_storage.delete(name)
+
+
+def run(*args):
+    tickets = int(args[0]) if args else 200
+    # Ids far away from real tickets
+    ticket_ids = range(10_000_000, 10_000_000 + tickets)
+    qr_cache.clear()
+
+    report('ticketQRCodeGenerator', timed(ticketQRCodeGenerator, ticket_ids))
+    report('ticketQRCodeGenerator+store', timed(stored_png, ticket_ids))
+    # Unsaved tickets, only id, event and code go into the payload
+    payloads = {ticket_id: ticket_qr_payload(Ticket(id=ticket_id, event_id=1, code=f'bench-{ticket_id}')) for ticket_id in ticket_ids}
+    for image_format in ('png', 'svg'):
+        render = lambda ticket_id: cached_render_qr(payloads[ticket_id], image_format)
+        report(f'on demand {image_format} cold', timed(render, ticket_ids))
+        report(f'on demand {image_format} warm', timed(render, ticket_ids))
+    print(f'cache entries={len(qr_cache.entries)} bytes={qr_cache.size}')
+    qr_cache.clear()
+
+    key = event_key(1)
+    report('sign payload', timed(lambda ticket_id: ticket_qr_payload(Ticket(id=ticket_id, event_id=1, code='bench')), ticket_ids))
+    report('verify payload (scanner)', timed(lambda ticket_id: verify_ticket_payload(payloads[ticket_id], key), ticket_ids))
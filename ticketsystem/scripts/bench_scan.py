@@ -0,0 +1,83 @@
+""" Load test for ticket validation.
+
+Many scanner clients validate the tickets of one event in parallel, every ticket is scanned by
+two gates at about the same time. Reports p50 and p99 scan latency and checks that no ticket
+let two people in.
+
+Run with: python manage.py runscript bench_scan --script-args <tickets> <scanners>
+Use Postgres for meaningful numbers, SQLite serialises every writer on a file lock.
+"""
+import time
+import random
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ticketsystem.models import User, Club, Event, Ticket
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(*args):
+    tickets = int(args[0]) if len(args) > 0 else 1000
+    scanners = int(args[1]) if len(args) > 1 else 16
+
+    club = Club.objects.create(name='Bench Club', description='Benchmark', email='bench-scan@example.com')
+    event = Event.objects.create(title='Bench Event', description='Benchmark', price=0, date='2030-01-01',
+                                 time='20:00:00', capacity=None, location='Bench', club=club)
+    scanner_users = User.objects.bulk_create([
+        User(username=f'bench_scan_scanner_{n}', email=f'bench_scan_scanner_{n}@example.com',
+             user_type='ticket_scanner', event=event)
+        for n in range(scanners)
+    ])
+    users = User.objects.bulk_create([
+        User(username=f'bench_scan_{n}', email=f'bench_scan_{n}@example.com', student_id=f'bench_scan_{n}')
+        for n in range(tickets)
+    ])
+    ticket_ids = [ticket.id for ticket in Ticket.objects.bulk_create([
+        Ticket(title='Bench Ticket', code=f'bench-scan-{n}', price=0, user=user, event=event)
+        for n, user in enumerate(users)
+    ])]
+
+    # Every ticket twice, the two scans of a ticket are next to each other in the queue
+    scans = [ticket_id for ticket_id in ticket_ids for _ in range(2)]
+    clients = threading.local()
+
+    def scan(ticket_id):
+        if not hasattr(clients, 'client'):
+            clients.client = APIClient()
+            clients.client.force_authenticate(user=random.choice(scanner_users))
+        start = time.perf_counter()
+        response = clients.client.post(reverse('validate-ticket', kwargs={'ticket_id': ticket_id}))
+        latency = time.perf_counter() - start
+        connection.close()
+        return ticket_id, response.data.get('scanned_ago') == 'just now', latency
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=scanners) as pool:
+            results = list(pool.map(scan, scans))
+        elapsed = time.perf_counter() - start
+
+        latencies = [latency * 1000 for _, _, latency in results]
+        admitted = {}
+        for ticket_id, let_in, _ in results:
+            admitted[ticket_id] = admitted.get(ticket_id, 0) + let_in
+        double = sum(1 for count in admitted.values() if count > 1)
+        used = Ticket.objects.filter(event=event, status='U').count()
+
+        print(f'tickets={tickets} scans={len(scans)} scanners={scanners} elapsed={elapsed:.2f}s '
+              f'rate={len(scans) / elapsed:,.0f} scans/s')
+        print(f'latency ms p50={statistics.median(latencies):.2f} p99={percentile(latencies, 99):.2f}')
+        print(f'used in db={used} admitted once={sum(1 for count in admitted.values() if count == 1)} admitted twice={double}')
+        print('OK: no double entry' if double == 0 and used == tickets else 'FAIL: double entry or missed scans')
+    finally:
+        club.delete()
+        User.objects.filter(username__startswith='bench_scan_').delete()
@@ -0,0 +1,67 @@
+""" Scanner manifest benchmark.
+
+Builds the full scan manifest of an event, and a delta after some scans, and compares the payload
+size and generation time with RetrieveEventTicketsView.
+
+Run with: python manage.py runscript bench_scan_manifest --script-args <tickets>
+"""
+import gzip
+import json
+import time
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ticketsystem.models import User, Club, Event, Ticket
+from ticketsystem.manifest import build_scan_manifest, decode_cursor
+
+
+def report(name, elapsed, payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    print(f'{name:<24} elapsed={elapsed * 1000:9.1f}ms  json={len(raw) / 1024:9.1f}KiB  '
+          f'gzip={len(gzip.compress(raw)) / 1024:8.1f}KiB')
+
+
+def run(*args):
+    tickets = int(args[0]) if args else 20000
+
+    club = Club.objects.create(name='Bench Club', description='Benchmark', email='bench-manifest@example.com')
+    event = Event.objects.create(title='Bench Event', description='Benchmark', price=0, date='2030-01-01',
+                                 time='20:00:00', capacity=None, location='Bench', club=club)
+    scanner = User.objects.create(username='bench_manifest_scanner', email='bench_manifest_scanner@example.com',
+                                  user_type='ticket_scanner', event=event)
+    users = User.objects.bulk_create([
+        User(username=f'bench_manifest_{n}', email=f'bench_manifest_{n}@example.com', first_name=f'First{n}',
+             last_name=f'Last{n}', student_id=f'bench{n:08d}')
+        for n in range(tickets)
+    ])
+    Ticket.objects.bulk_create([
+        Ticket(title='Bench Ticket', code=f'bench-manifest-{n}', price=0, user=user, event=event)
+        for n, user in enumerate(users)
+    ], batch_size=2000)
+    # Sold well before the doors open
+    Ticket.objects.filter(event=event).update(updated_at=timezone.now() - timedelta(days=1))
+
+    try:
+        start = time.perf_counter()
+        manifest = build_scan_manifest(event.id)
+        report('manifest full', time.perf_counter() - start, manifest)
+
+        # 1% of the tickets get scanned after the cursor
+        since = decode_cursor(manifest['cursor'])
+        scanned = Ticket.objects.filter(event=event).order_by('?').values_list('id', flat=True)[:tickets // 100]
+        Ticket.objects.filter(id__in=list(scanned)).update(status='U', scanned_at=timezone.now(), updated_at=timezone.now())
+        start = time.perf_counter()
+        delta = build_scan_manifest(event.id, since)
+        report(f'manifest delta ({delta["count"]})', time.perf_counter() - start, delta)
+
+        client = APIClient()
+        client.force_authenticate(user=scanner)
+        start = time.perf_counter()
+        response = client.get(reverse('scanner-event-tickets'))
+        report('event-tickets (page)', time.perf_counter() - start, response.data)
+    finally:
+        club.delete()
+        User.objects.filter(username__startswith='bench_manifest_').delete()
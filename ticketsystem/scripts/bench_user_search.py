@@ -0,0 +1,81 @@
+""" Benchmark for the user search autocomplete (UserNameView).
+
+Creates users with generated names, a viewer with friends and followed clubs, then times
+search_users for the prefixes typed while looking up random users, from one to six characters,
+and for substrings. Cold runs clear the cached candidates first. Reports the p50 and p99 latencies.
+Everything is rolled back at the end.
+
+Run with: python manage.py runscript bench_user_search --script-args <users> <searches>
+"""
+import time
+import random
+from itertools import product
+
+from django.db import connection, transaction
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
+
+from ticketsystem.models import User, Club, Follow, Friend
+from ticketsystem.search import search_users
+
+SYLLABLES = ['an', 'be', 'ca', 'do', 'el', 'fi', 'ga', 'ho', 'is', 'ja', 'ki', 'lu', 'ma', 'ne', 'ol', 'pa', 'ri', 'sa', 'to', 'vi']
+
+
+def percentile(timings, share):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+def time_searches(viewer_id, queries, cold):
+    timings = []
+    executed = 0
+    if not cold:
+        for query in queries:
+            search_users(viewer_id, query)
+    for query in queries:
+        if cold:
+            cache.clear()
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            search_users(viewer_id, query)
+            timings.append((time.perf_counter() - start) * 1000)
+        executed += len(captured)
+    return timings, executed / len(queries)
+
+
+def run(*args):
+    users = int(args[0]) if len(args) > 0 else 1000000
+    searches = int(args[1]) if len(args) > 1 else 500
+    rng = random.Random(1)
+    first_names = [a + b + c for a, b, c in product(SYLLABLES, repeat=3)][:2000]
+    last_names = [a + b for a, b in product(SYLLABLES, repeat=2)]
+
+    with transaction.atomic():
+        start = time.perf_counter()
+        names = [(rng.choice(first_names), rng.choice(last_names)) for _ in range(users)]
+        people = User.objects.bulk_create([
+            User(username=f'{first}.{last}{n}', email=f'bench_search_{n}@example.com', first_name=first.title(), last_name=last.title())
+            for n, (first, last) in enumerate(names)
+        ], batch_size=5000)
+        viewer = people[0]
+        Friend.objects.bulk_create([Friend(sender=viewer, receiver=friend, status=True) for friend in rng.sample(people[1:], 200)])
+        clubs = Club.objects.bulk_create([Club(name=f'Bench Club {n}', email=f'bench-search-{n}@example.com') for n in range(20)])
+        Follow.objects.bulk_create([Follow(user=user, club=club) for club in clubs for user in rng.sample(people, 2000)], ignore_conflicts=True)
+        print(f'users={users} setup {time.perf_counter() - start:.1f}s')
+
+        typed = []
+        for user in rng.sample(people, searches):
+            target = rng.choice([user.username, user.first_name, user.last_name])
+            typed.extend(target[:length] for length in range(1, 7))
+        substrings = []
+        for user in rng.sample(people, searches):
+            offset = rng.randrange(1, 4)
+            substrings.append(user.username[offset:offset + 4])
+
+        for label, queries in (('prefixes', typed), ('substrings', substrings)):
+            for cold in (True, False):
+                timings, queries_per_search = time_searches(viewer.id, queries, cold)
+                print(f'{label} {"cold" if cold else "warm"}: searches={len(queries)} queries/search={queries_per_search:.1f} '
+                      f'p50={percentile(timings, 0.5):.2f}ms p99={percentile(timings, 0.99):.2f}ms max={max(timings):.2f}ms')
+        transaction.set_rollback(True)
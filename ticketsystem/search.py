@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Collate
+
+from .models import User, Follow
+from .friends import friend_graph
+
+import hashlib
+
+# ====================================================================================================
+# User search
+# Autocomplete over usernames and names. Candidates are read in stages, each an indexed lookup
+# capped at CANDIDATES rows: the exact username, username prefixes, name prefixes, then substrings
+# of at least MIN_SUBSTRING characters. Prefixes use the pattern (PostgreSQL) or NOCASE (SQLite)
+# indexes, substrings the pg_trgm indexes or the FTS5 trigram table of SQLite (migration 0019).
+# The candidates of a query are the same for everyone and are cached for USER_SEARCH_CACHE_TIMEOUT
+# seconds, enough to absorb the popular prefixes typed by many users at once. The viewer's friends
+# matching the query are added to them, and the top RESULT_LIMIT are ranked by how well they match,
+# friendship and the clubs followed by both.
+# ====================================================================================================
+
+RESULT_LIMIT = 10
+CANDIDATES = 50
+MIN_SUBSTRING = 3
+MAX_QUERY_LENGTH = 50
+FIELDS = ('id', 'username', 'first_name', 'last_name', 'account_type')
+TRIGRAM_TABLE = 'ticketsystem_user_trigram'
+
+def search_key(query):
+    return f'usersearch:{hashlib.md5(query.encode()).hexdigest()}'
+
+def exact_filter(users, query):
+    if connection.vendor == 'sqlite':
+        # LIKE without a wildcard scans every username of the prefix, NOCASE equality is one index probe
+        return users.alias(username_nocase=Collate('username', 'NOCASE')).filter(username_nocase=query)
+    return users.filter(username__iexact=query)
+
+def substring_filter(query):
+    if connection.vendor == 'sqlite':
+        # A quoted FTS5 phrase matches the substring in any of the columns, whatever the case. The limit keeps
+        # a common substring from reading all its matches, the prefix matches among them are left out after
+        phrase = '"' + query.replace('"', '""') + '"'
+        return Q(id__in=RawSQL(f'SELECT rowid FROM {TRIGRAM_TABLE} WHERE {TRIGRAM_TABLE} MATCH %s LIMIT %s', [phrase, 2 * CANDIDATES]))
+    return Q(username__icontains=query) | Q(first_name__icontains=query) | Q(last_name__icontains=query)
+
+def load_candidates(query):
+    """ Up to CANDIDATES users matching the query, the best matches first, with a few indexed queries """
+    users = User.objects.filter(user_type='user').only(*FIELDS)
+    if not query:
+        return list(users.order_by('username')[:CANDIDATES])
+    stages = [
+        exact_filter(users, query),
+        users.filter(username__istartswith=query),
+        users.filter(Q(first_name__istartswith=query) | Q(last_name__istartswith=query)),
+    ]
+    if len(query) >= MIN_SUBSTRING:
+        stages.append(users.filter(substring_filter(query)))
+    candidates = {}
+    for stage in stages:
+        for user in stage.exclude(id__in=list(candidates))[:CANDIDATES - len(candidates)]:
+            candidates[user.id] = user
+        if len(candidates) >= CANDIDATES:
+            break
+    return list(candidates.values())
+
+def candidates_for(query):
+    key = search_key(query)
+    candidates = cache.get(key)
+    if candidates is None:
+        candidates = load_candidates(query)
+        cache.set(key, candidates, getattr(settings, 'USER_SEARCH_CACHE_TIMEOUT', 30))
+    return candidates
+
+def match_rank(user, query):
+    """ 0 the username, 1 a username prefix, 2 a name prefix, 3 a substring """
+    username = user.username.lower()
+    if username == query:
+        return 0
+    if username.startswith(query):
+        return 1
+    if user.first_name.lower().startswith(query) or user.last_name.lower().startswith(query):
+        return 2
+    return 3
+
+def search_users(viewer_id, query):
+    """ The RESULT_LIMIT users best matching the query for the viewer: by match, friends first, then by
+    clubs followed by both. Two queries once the candidates and the friend graph are cached """
+    query = query.strip().lower()[:MAX_QUERY_LENGTH]
+    candidates = {user.id: user for user in candidates_for(query)}
+    friends = friend_graph(viewer_id).friends
+    if friends:
+        # Friends are few, any of them matching the query is a candidate
+        matching = Q(username__icontains=query) | Q(first_name__icontains=query) | Q(last_name__icontains=query)
+        for user in User.objects.filter(matching, id__in=friends, user_type='user').only(*FIELDS)[:CANDIDATES]:
+            candidates.setdefault(user.id, user)
+    if not candidates:
+        return []
+    shared_clubs = Follow.objects.common_club_counts(viewer_id, [user.username for user in candidates.values()])
+    ranked = sorted(candidates.values(), key=lambda user: (
+        match_rank(user, query), user.id not in friends, -shared_clubs[user.username], user.username.lower()
+    ))
+    return ranked[:RESULT_LIMIT]
@@ -2,8 +2,9 @@ from ..models import *
 from rest_framework import serializers
 from django.conf import settings
 from django.utils.timezone import localdate
+from .planner import QueryPlannerMixin
 
-class ClubSerializer(serializers.ModelSerializer):
+class ClubSerializer(QueryPlannerMixin, serializers.ModelSerializer):
     """ Serializer for the Club model """
     club_logo = serializers.SerializerMethodField()
     club_cover = serializers.SerializerMethodField()
@@ -11,6 +12,7 @@ class ClubSerializer(serializers.ModelSerializer):
     class Meta:
         model = Club
         fields = '__all__'
+        reads = {'club_logo': ('club_logo',), 'club_cover': ('club_cover',)}
 
     def get_club_logo(self, obj):
         """ Return the club logo if it exists, otherwise return None """
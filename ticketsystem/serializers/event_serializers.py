@@ -1,9 +1,11 @@
 from ..models import *
 from rest_framework import serializers
 from django.conf import settings
+from .friend_serializers import FriendsGoingField
+from .planner import QueryPlannerMixin
 
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(QueryPlannerMixin, serializers.ModelSerializer):
     """ Serializer for the Event model """
     event_cover = serializers.SerializerMethodField()
     club_name = serializers.SerializerMethodField()
@@ -12,6 +14,7 @@ class EventSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = '__all__'
+        reads = {'event_cover': ('event_cover',), 'club_name': ('club.name',), 'club_logo': ('club.club_logo',)}
 
     def get_club_name(self, obj):
         return obj.club.name
@@ -34,4 +37,8 @@ class EventSerializer(serializers.ModelSerializer):
             if request:
                 return request.build_absolute_uri(club_logo.url)
             return club_logo.url
-        return None
\ No newline at end of file
+        return None
+
+class EventFriendsGoingSerializer(EventSerializer):
+    """ An event with the friends of the authenticated user going to it, one more query per list of events """
+    friends_going = FriendsGoingField()
\ No newline at end of file
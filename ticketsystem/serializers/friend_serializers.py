@@ -1,5 +1,52 @@
 from rest_framework import serializers
-from ..models import User, Profile, Friend
+from ..models import User, Profile, Friend, FriendSuggestion
+from ..friends import relationships, friends_going
+from .planner import QueryPlannerMixin
+
+def listed_objects(field, obj):
+    """ The objects of the list the field's serializer is serializing, or the object alone. A list nested
+    in another serializer gets its objects from its parent's attribute and keeps no instance """
+    listing = getattr(field.parent, 'parent', None)
+    if isinstance(listing, serializers.ListSerializer) and listing.instance is not None:
+        return listing.instance
+    return [obj]
+
+class FriendshipStatusField(serializers.ReadOnlyField):
+    """ Relationship of the authenticated user to the serialized user: you, closed, friends, pending, accept or none,
+    None without an authenticated user. The users of a list are all resolved together on the first one, with one
+    read of the viewer's friend graph """
+    reads = ('id', 'account_type')
+
+    def __init__(self, **kwargs):
+        super().__init__(source='*', **kwargs)
+
+    def to_representation(self, user):
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return None
+        resolved = self.context.setdefault('relationships', {})
+        if user.id not in resolved:
+            resolved.update(relationships(request.user.id, listed_objects(self, user)))
+        return resolved[user.id]
+
+class FriendsGoingField(serializers.ReadOnlyField):
+    """ Friends of the authenticated user going to the serialized event: their count and the first few.
+    The events of a list are all resolved together on the first one, with one query """
+    PREVIEW = 3
+    reads = ('id',)
+
+    def __init__(self, **kwargs):
+        super().__init__(source='*', **kwargs)
+
+    def to_representation(self, event):
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return {'count': 0, 'friends': []}
+        going = self.context.setdefault('friends_going', {})
+        if event.id not in going:
+            going.update(friends_going(request.user.id, [event.id for event in listed_objects(self, event)]))
+        friends = going[event.id]
+        return {'count': len(friends), 'friends': FriendGoingSerializer(friends[:self.PREVIEW], many=True, context=self.context).data}
 
 class FriendSerializer(serializers.ModelSerializer):
     """ Serializer for the Friend model """
@@ -12,10 +59,11 @@ class CommonFriendsSerializer(serializers.ModelSerializer):
     Optimised: True
     Sending profile picture of users and username """
     profile_picture = serializers.SerializerMethodField()
+    friendship_status = FriendshipStatusField()
 
     class Meta:
         model = User
-        fields = ('username', 'profile_picture')
+        fields = ('username', 'profile_picture', 'friendship_status')
 
     def get_profile_picture(self, obj):
         """ Return the profile picture if it exists, otherwise return None """
@@ -27,14 +75,16 @@ class CommonFriendsSerializer(serializers.ModelSerializer):
             return profile_picture.url
         return None
 
-class FriendStatusSerializer(serializers.ModelSerializer):
+class FriendStatusSerializer(QueryPlannerMixin, serializers.ModelSerializer):
     """ Serializer for the User model with the profile picture main profile fields """
     profile_picture = serializers.SerializerMethodField()
     verified = serializers.BooleanField(source='profile.verified')
+    friendship_status = FriendshipStatusField()
 
     class Meta:
         model = User
-        fields = ('username', 'first_name', 'last_name', 'profile_picture', 'verified')
+        fields = ('username', 'first_name', 'last_name', 'profile_picture', 'verified', 'friendship_status')
+        reads = {'profile_picture': ('profile.profile_picture',)}
 
     def get_profile_picture(self, obj):
         """ Return the profile picture if it exists, otherwise return None """
@@ -44,4 +94,43 @@ class FriendStatusSerializer(serializers.ModelSerializer):
             if request:
                 return request.build_absolute_uri(profile_picture.url)
             return profile_picture.url
-        return None
\ No newline at end of file
+        return None
+
+class FriendSuggestionSerializer(serializers.ModelSerializer):
+    """ A suggested user with what they have in common with the authenticated user """
+    username = serializers.CharField(source='candidate.username')
+    first_name = serializers.CharField(source='candidate.first_name')
+    last_name = serializers.CharField(source='candidate.last_name')
+    profile_picture = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FriendSuggestion
+        fields = ('username', 'first_name', 'last_name', 'profile_picture', 'mutual_friends', 'shared_clubs', 'shared_events')
+
+    def get_profile_picture(self, obj):
+        """ Return the profile picture if it exists, otherwise return None """
+        profile = getattr(obj.candidate, 'profile', None)
+        if profile is not None and profile.profile_picture:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(profile.profile_picture.url)
+            return profile.profile_picture.url
+        return None
+
+class FriendGoingSerializer(serializers.ModelSerializer):
+    """ A friend holding a ticket for an event """
+    profile_picture = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ('username', 'first_name', 'last_name', 'profile_picture')
+
+    def get_profile_picture(self, obj):
+        """ Return the profile picture if it exists, otherwise return None """
+        profile = getattr(obj, 'profile', None)
+        if profile is not None and profile.profile_picture:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(profile.profile_picture.url)
+            return profile.profile_picture.url
+        return None
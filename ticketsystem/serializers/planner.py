@@ -0,0 +1,185 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+# ====================================================================================================
+# Query planner
+# A serializer with QueryPlannerMixin plans the queryset it is given from the fields it declares:
+# the dotted sources of its fields and nested serializers are walked through the model, single
+# valued relations are joined with select_related, many valued ones are prefetched and only the
+# columns read are loaded. Method fields and fields with source='*' cannot be read, they declare
+# the sources they read, in Meta.reads for method fields ({'club_name': ('club.name',)}) and in a
+# reads attribute for fields. A source the planner cannot place, a property or an undeclared method
+# field, loads every column of its model, a relation read as a whole loads every column of the
+# related model. Prefetched models are always read whole.
+# ====================================================================================================
+
+def concrete_fields(model):
+    return [field.name for field in model._meta.concrete_fields]
+
+class QueryPlan:
+    """ The relations to join and prefetch and the columns to load for a serializer """
+    def __init__(self):
+        self.select = set()
+        self.prefetch = set()
+        self.only = set()
+
+    def read_whole(self, model, path):
+        self.only.update(join(path, name) for name in concrete_fields(model))
+
+    def read(self, model, path, attrs, prefetched=False):
+        """ Place the source attrs read from a model reached by path """
+        if prefetched:
+            # Past a many valued relation, every relation is prefetched from the related objects
+            self.read_prefetched(model, path, attrs)
+            return
+        if not attrs:
+            self.read_whole(model, path)
+            return
+        try:
+            field = model._meta.get_field(attrs[0])
+        except FieldDoesNotExist:
+            # A property or method of the model, it may read any column
+            self.read_whole(model, path)
+            return
+        if not field.is_relation:
+            self.only.add(join(path, field.name))
+            return
+        related_path = join(path, field.name)
+        if field.many_to_many or field.one_to_many:
+            self.prefetch.add(related_path)
+            self.read_prefetched(field.related_model, related_path, attrs[1:])
+            return
+        if field.concrete:
+            # The foreign key column itself, a reverse one to one has none
+            self.only.add(related_path)
+        self.select.add(related_path)
+        self.read(field.related_model, related_path, attrs[1:])
+
+    def read_key(self, model, path, attrs):
+        """ Place the primary key of the related object at the source attrs, the foreign key column if there is one """
+        model, path, prefetched = follow(self, model, path, attrs[:-1], False)
+        if model is None or prefetched:
+            return
+        try:
+            field = model._meta.get_field(attrs[-1])
+        except FieldDoesNotExist:
+            self.read_whole(model, path)
+            return
+        if field.concrete:
+            self.only.add(join(path, field.name))
+        else:
+            self.read(model, path, attrs[-1:])
+
+    def read_prefetched(self, model, path, attrs):
+        for name in attrs:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return
+            if not field.is_relation:
+                return
+            path = join(path, field.name)
+            self.prefetch.add(path)
+            model = field.related_model
+
+    def apply(self, queryset):
+        if self.select:
+            queryset = queryset.select_related(*sorted(self.select))
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*sorted(self.prefetch))
+        return queryset.only(*sorted(self.only))
+
+def join(path, name):
+    return f'{path}__{name}' if path else name
+
+def read_serializer(plan, serializer, model, path, prefetched=False):
+    """ Add the sources read by the fields of the serializer to the plan """
+    declared = getattr(getattr(serializer, 'Meta', None), 'reads', {})
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*' and isinstance(field, serializers.BaseSerializer):
+            read_serializer(plan, field, model, path, prefetched)
+            continue
+        if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            sources = declared.get(name) if isinstance(field, serializers.SerializerMethodField) else getattr(field, 'reads', None)
+            if sources is None:
+                # Nothing says what it reads
+                if not prefetched:
+                    plan.read_whole(model, path)
+                continue
+            for source in sources:
+                plan.read(model, path, source.split('.'), prefetched)
+            continue
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(nested, serializers.BaseSerializer):
+            related_model, related_path, related_prefetched = follow(plan, model, path, field.source_attrs, prefetched)
+            if related_model is not None:
+                read_serializer(plan, nested, related_model, related_path, related_prefetched)
+            continue
+        if isinstance(field, serializers.ManyRelatedField) and isinstance(field.child_relation, serializers.PrimaryKeyRelatedField):
+            # The primary keys are read from the prefetched relation
+            plan.read(model, path, field.source_attrs[:1], prefetched)
+            continue
+        if isinstance(field, serializers.RelatedField) and not isinstance(field, serializers.PrimaryKeyRelatedField):
+            # Slug and string related fields read the related object
+            follow(plan, model, path, field.source_attrs, prefetched)
+            continue
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            if not prefetched:
+                plan.read_key(model, path, field.source_attrs)
+            continue
+        plan.read(model, path, field.source_attrs, prefetched)
+
+def follow(plan, model, path, attrs, prefetched):
+    """ Walk a nested serializer's source to its model, returns the model, its path and whether it is prefetched """
+    for name in attrs:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            if not prefetched:
+                plan.read_whole(model, path)
+            return None, None, None
+        if not field.is_relation:
+            plan.read(model, path, [name], prefetched)
+            return None, None, None
+        related_path = join(path, field.name)
+        if prefetched or field.many_to_many or field.one_to_many:
+            prefetched = True
+            plan.prefetch.add(related_path)
+        else:
+            if field.concrete:
+                plan.only.add(related_path)
+            plan.select.add(related_path)
+        model, path = field.related_model, related_path
+    return model, path, prefetched
+
+class QueryPlannerMixin:
+    """ Plans the queryset of a serializer from its declared fields, see plan """
+
+    @classmethod
+    def query_plan(cls, model, prefixes=()):
+        cache = cls.__dict__.get('_query_plans')
+        if cache is None:
+            cache = {}
+            cls._query_plans = cache
+        key = (model, prefixes)
+        if key not in cache:
+            plan = QueryPlan()
+            serializer = cls()
+            if not prefixes:
+                read_serializer(plan, serializer, model, '')
+            else:
+                # The serialized objects are relations of the queryset's model, which is read whole
+                plan.read_whole(model, '')
+                for prefix in prefixes:
+                    related_model, related_path, prefetched = follow(plan, model, '', prefix.split('__'), False)
+                    read_serializer(plan, serializer, related_model, related_path, prefetched)
+            cache[key] = plan
+        return cache[key]
+
+    @classmethod
+    def plan(cls, queryset, *prefixes):
+        """ The queryset with the joins, prefetches and columns the serializer reads. With prefixes, the
+        serialized objects are the relations at these paths of the queryset's objects """
+        return cls.query_plan(queryset.model, prefixes).apply(queryset)
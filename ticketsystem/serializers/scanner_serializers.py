@@ -2,6 +2,7 @@ from ..models import *
 from rest_framework import serializers
 from django.utils.timezone import localdate
 from .user_serializers import UserSerializer
+from .planner import QueryPlannerMixin
 
 class TicketScannerCreateSerializer(serializers.ModelSerializer):
     event_id = serializers.IntegerField(write_only=True)
@@ -41,7 +42,7 @@ class TicketScannerUserPasswordResetSerializer(serializers.Serializer):
         instance.save()
         return instance
 
-class TicketWithUserSerializer(serializers.ModelSerializer):
+class TicketWithUserSerializer(QueryPlannerMixin, serializers.ModelSerializer):
     """ Sending User data along with the ticket - used for the scanner """
     user = UserSerializer(read_only=True)
     scanned_at = serializers.SerializerMethodField()
@@ -50,11 +51,15 @@ class TicketWithUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = ['id', 'status', 'scanned_at', 'scanned_by', 'user']
+        reads = {'scanned_at': ('scanned_at',), 'scanned_by': ('scanned_by.username',)}
     
     def get_scanned_at(self, obj):
         if obj.scanned_at is None:
             return None
-        if obj.scanned_at.date() == localdate():
+        # localdate is the same for every ticket of the list, only look it up once
+        if 'today' not in self.context:
+            self.context['today'] = localdate()
+        if obj.scanned_at.date() == self.context['today']:
             # If the date is today, return just the time
             return obj.scanned_at.strftime("%H:%M")
         else:
@@ -65,4 +70,11 @@ class TicketWithUserSerializer(serializers.ModelSerializer):
         if obj.scanned_by is None:
             return None
         else:
-            return obj.scanned_by.username
\ No newline at end of file
+            return obj.scanned_by.username
+
+class ScanSerializer(serializers.Serializer):
+    """ One scan recorded by a scanner while it was offline """
+    ticket_id = serializers.IntegerField()
+    scanned_at = serializers.DateTimeField()
+    # Defaults to the user uploading the scans
+    scanner = serializers.IntegerField(required=False)
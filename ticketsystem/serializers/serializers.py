@@ -2,6 +2,7 @@ from ..models import *
 from rest_framework import serializers
 from django.conf import settings
 from django.utils.timezone import localdate
+from ..qr import signed_qr_url
 
 
 class StripeAccountSerializer(serializers.ModelSerializer):
@@ -10,6 +11,20 @@ class StripeAccountSerializer(serializers.ModelSerializer):
         fields = ('__all__')
 
 class TicketSerializer(serializers.ModelSerializer):
+    qr_code = serializers.SerializerMethodField()
+
     class Meta:
         model = Ticket
-        fields = ('__all__')
\ No newline at end of file
+        fields = ('__all__')
+
+    def get_qr_code(self, obj):
+        """ Return the signed url of the QR code, it is rendered on request and can be used as an image source """
+        qr_code_url = signed_qr_url(obj.id)
+        request = self.context.get('request')
+        if request:
+            return request.build_absolute_uri(qr_code_url)
+        return qr_code_url
+
+class BulkIssuePriceSerializer(serializers.Serializer):
+    """ Price of tickets issued in bulk, the event price when not given """
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
\ No newline at end of file
@@ -15,4 +15,20 @@ class EventYearDataSerializer(serializers.Serializer):
 class ClubFollowersDataSerializer(serializers.Serializer):
     club_name = serializers.CharField()
     year_data = serializers.DictField(child=serializers.IntegerField())
-    course_data = serializers.DictField(child=serializers.IntegerField())
\ No newline at end of file
+    course_data = serializers.DictField(child=serializers.IntegerField())
+
+class SalesBucketSerializer(serializers.Serializer):
+    start = serializers.DateTimeField()
+    sold = serializers.IntegerField()
+    transferred = serializers.IntegerField()
+    cumulative = serializers.IntegerField()
+    fill = serializers.FloatField(allow_null=True)
+
+class EventSalesDataSerializer(serializers.Serializer):
+    event_id = serializers.IntegerField()
+    granularity = serializers.CharField()
+    capacity = serializers.IntegerField(allow_null=True)
+    sold = serializers.IntegerField()
+    transferred = serializers.IntegerField()
+    transfer_rate = serializers.FloatField()
+    buckets = SalesBucketSerializer(many=True)
@@ -1,6 +1,7 @@
 from ..models import *
 from rest_framework import serializers
 from django.conf import settings
+from .planner import QueryPlannerMixin
 
 class TransferTicketSerializer(serializers.ModelSerializer):
     """ To not send sensible ticket data (QR) when transferring a ticket """
@@ -8,7 +9,7 @@ class TransferTicketSerializer(serializers.ModelSerializer):
         model = Ticket
         fields = ['title', 'price']
 
-class TransferRequestSerializer(serializers.ModelSerializer):
+class TransferRequestSerializer(QueryPlannerMixin, serializers.ModelSerializer):
     sender = serializers.SerializerMethodField()
     receiver = serializers.SerializerMethodField()
     ticket = TransferTicketSerializer()
@@ -20,6 +21,14 @@ class TransferRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = TransferRequest
         fields = ['id', 'sender', 'receiver', 'ticket', 'status', 'created_at', 'sender_profile_picture', 'club_name', 'event_cover']
+        reads = {
+            'sender': ('sender.username',),
+            'receiver': ('receiver.username',),
+            'created_at': ('created_at',),
+            'sender_profile_picture': ('sender.profile.profile_picture',),
+            'club_name': ('ticket.event.club.name',),
+            'event_cover': ('ticket.event.event_cover',),
+        }
 
     def get_sender(self, obj):
         return obj.sender.username
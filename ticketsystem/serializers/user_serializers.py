@@ -1,8 +1,9 @@
 from rest_framework import serializers
-from ..models import User, Profile, Friend
+from ..models import User, Profile
+from .friend_serializers import FriendshipStatusField
+from ..friends import friend_graphs
 from django.conf import settings
 from datetime import datetime, timedelta, date
-from django.db.models import Q
 
 class UserSerializer(serializers.ModelSerializer):
     """ Serializer for the User model """
@@ -34,6 +35,13 @@ class UserNameSerializer(serializers.ModelSerializer):
         model = User
         fields = ('username', 'first_name', 'last_name')
 
+class UserSearchResultSerializer(UserNameSerializer):
+    """ A user search result with the relationship of the authenticated user to it """
+    friendship_status = FriendshipStatusField()
+
+    class Meta(UserNameSerializer.Meta):
+        fields = UserNameSerializer.Meta.fields + ('friendship_status',)
+
 class BasicUserInfoSerializer(serializers.ModelSerializer):
     """ Serializer for the User model with the profile picture and fields """
     profile_picture = serializers.SerializerMethodField()
@@ -122,7 +130,7 @@ class ProfilePageSerializer(serializers.ModelSerializer):
     year = serializers.SerializerMethodField()
     description = serializers.SerializerMethodField()
     verified = serializers.SerializerMethodField()
-    friendship_status = serializers.SerializerMethodField()
+    friendship_status = FriendshipStatusField()
     first_name = serializers.SerializerMethodField()
     last_name = serializers.SerializerMethodField()
     show_details = serializers.SerializerMethodField()
@@ -131,40 +139,18 @@ class ProfilePageSerializer(serializers.ModelSerializer):
         model = User
         fields = ('username', 'first_name', 'last_name', 'profile_picture', 'course', 'year', 'description', 'verified', 'friendship_status', 'show_details')
 
-    def get_friendship_status(self, obj):
-        # Check if the friendship status is already in the context
-        if 'friendship_status' in self.context:
-            return self.context['friendship_status']
-
-        request = self.context.get('request')
-        if request.user == obj:
-            status = 'you'
-        elif obj.account_type == User.CLOSED:
-            status = 'closed'
-        else:
-            friend_requests = Friend.objects.filter(
-                Q(sender=request.user, receiver=obj) | 
-                Q(sender=obj, receiver=request.user)
-            )
-            if friend_requests.filter(status=True).exists():
-                status = 'friends'
-            elif friend_requests.filter(status=False).exists():
-                if friend_requests.first().sender == request.user:
-                    status = 'pending'
-                else:
-                    status = 'accept'
-            else:
-                status = 'none'
-
-        self.context['friendship_status'] = status
-        return status
+    def can_see_details(self, obj):
+        """ Public profiles and the user's own, private ones to the friends in the viewer's cached friend graph,
+        which every Friend save and delete invalidates """
+        viewer_id = self.context['request'].user.id
+        if obj.account_type == User.PUBLIC or obj.id == viewer_id:
+            return True
+        if obj.account_type == User.PRIVATE:
+            return obj.id in friend_graphs([viewer_id])[viewer_id].friends
+        return False
 
     def get_field_value(self, obj, field):
-        request = self.context.get('request')
-        if request.user == obj:
-            return getattr(obj.profile, field)
-        friendship_status = self.get_friendship_status(obj)
-        if obj.account_type == User.CLOSED or (obj.account_type == User.PRIVATE and (friendship_status == 'none' or friendship_status == 'pending' or friendship_status == 'accept')):
+        if not self.can_see_details(obj):
             return None
         return getattr(obj.profile, field)
 
@@ -203,11 +189,4 @@ class ProfilePageSerializer(serializers.ModelSerializer):
     
     def get_show_details(self, obj):
         """ Can the user see the details of the profile? """
-        # If the account is public, return True
-        if obj.account_type == User.PUBLIC or obj == self.context['request'].user:
-            return True
-        # If the account is private, check if the user is friends with the profile
-        elif obj.account_type == User.PRIVATE:
-            return obj.is_friends_with(self.context['request'].user)
-        else:
-            return False
\ No newline at end of file
+        return self.can_see_details(obj)
\ No newline at end of file
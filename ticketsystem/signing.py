@@ -0,0 +1,73 @@
+from django.conf import settings
+
+import re
+import hmac
+import base64
+import hashlib
+from collections import namedtuple
+
+# ====================================================================================================
+# Signed ticket QR payloads
+# T1:<ticket id>:<event id>:<code>:<signature>, ids in base 36 and everything upper case so the QR
+# can use alphanumeric mode. The signature is a truncated HMAC-SHA256 with a key derived per event,
+# a scanner only holds the key of its own event and can verify tickets offline.
+# ====================================================================================================
+
+PAYLOAD_VERSION = 'T1'
+SIGNATURE_BYTES = 10
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# QR codes issued before payloads were signed
+LEGACY_PAYLOAD = re.compile(r'/validate-ticket/(\d+)/?$')
+
+TicketClaims = namedtuple('TicketClaims', ['ticket_id', 'event_id', 'code'])
+
+class InvalidTicketPayload(Exception):
+    """ Raised when a QR payload is malformed or its signature does not match """
+    pass
+
+def event_key(event_id):
+    """ Signing key of an event, derived from TICKET_SIGNING_KEY so no key is stored """
+    master = getattr(settings, 'TICKET_SIGNING_KEY', settings.SECRET_KEY)
+    return hmac.new(master.encode(), f'ticket-qr:{event_id}'.encode(), hashlib.sha256).digest()
+
+def to_base36(number):
+    digits = ''
+    while True:
+        number, index = divmod(number, 36)
+        digits = DIGITS[index] + digits
+        if not number:
+            return digits
+
+def signature(key, message):
+    digest = hmac.new(key, message.encode(), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return base64.b32encode(digest).decode()
+
+def sign_ticket(ticket_id, event_id, code):
+    """ Return the signed QR payload of a ticket """
+    message = f'{PAYLOAD_VERSION}:{to_base36(ticket_id)}:{to_base36(event_id)}:{code.upper()}'
+    return f'{message}:{signature(event_key(event_id), message)}'
+
+def verify_ticket_payload(payload, key=None):
+    """ Check the signature of a payload and return its TicketClaims, without touching the database.
+    Pass the event key to verify with it instead of deriving the key from the payload """
+    parts = payload.strip().upper().split(':')
+    if len(parts) != 5 or parts[0] != PAYLOAD_VERSION:
+        raise InvalidTicketPayload('Unknown ticket payload')
+    try:
+        ticket_id, event_id = int(parts[1], 36), int(parts[2], 36)
+    except ValueError:
+        raise InvalidTicketPayload('Unknown ticket payload')
+    message = ':'.join(parts[:4])
+    if key is None:
+        key = event_key(event_id)
+    if not hmac.compare_digest(signature(key, message), parts[4]):
+        raise InvalidTicketPayload('Invalid signature')
+    return TicketClaims(ticket_id, event_id, parts[3].lower())
+
+def parse_ticket_qr(data):
+    """ Return (claims, None) for a signed payload or (None, ticket_id) for an old URL style QR code """
+    legacy = LEGACY_PAYLOAD.search(data.strip())
+    if legacy:
+        return None, int(legacy.group(1))
+    return verify_ticket_payload(data), None
@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMinute, TruncHour, TruncDay
+from django.utils import timezone
+
+from .models import Event, Ticket
+
+from datetime import timedelta
+
+# ====================================================================================================
+# Club statistics
+# Every statistic is computed with one grouped query and cached per club. The signals in models.py
+# drop the cached values of a club when its tickets change, STATS_CACHE_TIMEOUT bounds how stale a
+# worker can be when the cache backend is not shared between processes.
+# ====================================================================================================
+
+YEARS = range(1, 7)
+
+def event_year_key(club_id):
+    return f'stats:club:{club_id}:event-year'
+
+def invalidate_club_stats(*club_ids):
+    """ Drop the cached stats now and again on commit, a read racing the transaction could have cached
+    the old values in between """
+    keys = [event_year_key(club_id) for club_id in club_ids if club_id is not None]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+def event_year_breakdown(club_id):
+    """ Ticket holders of every event of the club counted by profile year, in one grouped query.
+    Holders without a profile or with a year outside 1 to 6 are not counted """
+    counts = {
+        f'year{year}': Count('ticket', filter=Q(ticket__user__profile__year=year))
+        for year in YEARS
+    }
+    rows = Event.objects.filter(club_id=club_id).order_by('id').values('id', 'title').annotate(**counts)
+    return [
+        {'event_title': row['title'], 'year_data': {f'year{year}': row[f'year{year}'] for year in YEARS}}
+        for row in rows
+    ]
+
+def club_event_year_breakdown(club_id):
+    """ event_year_breakdown from the cache, computed on a miss """
+    key = event_year_key(club_id)
+    data = cache.get(key)
+    if data is None:
+        data = event_year_breakdown(club_id)
+        cache.set(key, data, getattr(settings, 'STATS_CACHE_TIMEOUT', 300))
+    return data
+
+# ====================================================================================================
+# Sales velocity
+# Tickets sold and transferred per minute, hour or day, counted by the database with Trunc. A bucket
+# closes once its end is SALES_SETTLE in the past, by then every purchase made in it has committed.
+# Closed buckets never change: they are cached without expiry and every request only counts the
+# buckets that closed since the last one and the open bucket. Deleted tickets stay counted in the
+# bucket they were sold in.
+# ====================================================================================================
+
+GRANULARITIES = {
+    'minute': (TruncMinute, {'second': 0, 'microsecond': 0}),
+    'hour': (TruncHour, {'minute': 0, 'second': 0, 'microsecond': 0}),
+    'day': (TruncDay, {'hour': 0, 'minute': 0, 'second': 0, 'microsecond': 0}),
+}
+SALES_SETTLE = timedelta(seconds=30)
+
+def sales_key(event_id, granularity):
+    return f'stats:event:{event_id}:sales:{granularity}'
+
+def bucket_start(moment, granularity):
+    return timezone.localtime(moment).replace(**GRANULARITIES[granularity][1])
+
+def count_buckets(event_id, granularity, since=None, until=None):
+    """ {bucket start: [sold, transferred]} of the buckets in [since, until), one grouped query per column """
+    trunc = GRANULARITIES[granularity][0]
+    buckets = {}
+    for column, field in enumerate(('order_date', 'transferred_at')):
+        tickets = Ticket.objects.filter(event_id=event_id, **{f'{field}__isnull': False})
+        if since is not None:
+            tickets = tickets.filter(**{f'{field}__gte': since})
+        if until is not None:
+            tickets = tickets.filter(**{f'{field}__lt': until})
+        rows = tickets.annotate(bucket=trunc(field)).values_list('bucket').annotate(count=Count('id')).order_by()
+        for bucket, count in rows:
+            buckets.setdefault(bucket, [0, 0])[column] = count
+    return buckets
+
+def closed_buckets(event_id, granularity, until):
+    """ Sorted (start, sold, transferred) of the buckets closed before `until`, extending the cached ones """
+    key = sales_key(event_id, granularity)
+    closed = cache.get(key)
+    if closed is not None and closed['until'] >= until:
+        return closed['buckets']
+    since = closed['until'] if closed is not None else None
+    counted = count_buckets(event_id, granularity, since, until)
+    buckets = (closed['buckets'] if closed is not None else []) + sorted((start, *counts) for start, counts in counted.items())
+    cache.set(key, {'until': until, 'buckets': buckets}, None)
+    return buckets
+
+def sales_series(event, granularity):
+    """ Sales of the event per bucket with the cumulative fill of its capacity. Buckets without sales or
+    transfers are left out """
+    open_start = bucket_start(timezone.now() - SALES_SETTLE, granularity)
+    buckets = list(closed_buckets(event.id, granularity, open_start))
+    buckets += sorted((start, *counts) for start, counts in count_buckets(event.id, granularity, since=open_start).items())
+
+    series = []
+    sold = transferred = 0
+    for start, bucket_sold, bucket_transferred in buckets:
+        sold += bucket_sold
+        transferred += bucket_transferred
+        series.append({
+            'start': start,
+            'sold': bucket_sold,
+            'transferred': bucket_transferred,
+            'cumulative': sold,
+            'fill': sold / event.capacity if event.capacity else None,
+        })
+    return {
+        'event_id': event.id,
+        'granularity': granularity,
+        'capacity': event.capacity,
+        'sold': sold,
+        'transferred': transferred,
+        'transfer_rate': transferred / sold if sold else 0.0,
+        'buckets': series,
+    }
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import User, Follow, Ticket, FriendSuggestion
+from .friends import load_friend_graphs
+
+import heapq
+from collections import Counter
+
+# ====================================================================================================
+# Friend suggestions
+# Candidates are the friends of a user's friends, the other followers of the clubs the user follows
+# and the other holders of tickets to the same events. They are ranked by a weighted count of
+# mutual friends, shared clubs and shared events, and the top FRIEND_SUGGESTIONS_TOP_K of every user
+# are stored in FriendSuggestion, served with one indexed query. refresh_friend_suggestions
+# recomputes every user in chunks, accepting or removing a friendship refreshes the users it
+# affects through the job queue. Clubs and events with more than MAX_GROUP_SIZE members are left
+# out, everyone is in the big ones so they tell nothing and would make every pair of users a
+# candidate.
+# ====================================================================================================
+
+MUTUAL_FRIEND_WEIGHT = 3.0
+SHARED_EVENT_WEIGHT = 2.0
+SHARED_CLUB_WEIGHT = 1.0
+MAX_GROUP_SIZE = 500
+
+def top_k():
+    return getattr(settings, 'FRIEND_SUGGESTIONS_TOP_K', 20)
+
+def shared_counts(model, group, user_ids):
+    """ {(user id, other user id): groups both are in} for the groups (clubs or events) of at most MAX_GROUP_SIZE members """
+    # Only the groups of the users are counted, not the whole table
+    groups = model.objects.filter(user_id__in=user_ids).values(group)
+    small_groups = (model.objects.filter(**{f'{group}__in': groups}).values(group)
+                    .annotate(members=Count('id')).filter(members__lte=MAX_GROUP_SIZE).values(group))
+    # model.group.<model>.user is the other member of the same group
+    other = f'{group.removesuffix("_id")}__{model._meta.model_name}__user_id'
+    rows = (model.objects.filter(user_id__in=user_ids, **{f'{group}__in': small_groups})
+            .values_list('user_id', other).annotate(shared=Count(group)).order_by())
+    return {(user_id, other_id): shared for user_id, other_id, shared in rows if user_id != other_id}
+
+def rank_suggestions(user_ids):
+    """ {user id: [FriendSuggestion]} of the best candidates of each user, in a constant number of queries """
+    user_ids = set(user_ids)
+    graphs = load_friend_graphs(user_ids)
+    friend_graphs = load_friend_graphs(set().union(*(graph.friends for graph in graphs.values())))
+    clubs = shared_counts(Follow, 'club_id', user_ids)
+    events = shared_counts(Ticket, 'event_id', user_ids)
+
+    candidates = {user_id: {} for user_id in user_ids}
+    for user_id, graph in graphs.items():
+        mutual = Counter(candidate for friend_id in graph.friends for candidate in friend_graphs[friend_id].friends)
+        for candidate, count in mutual.items():
+            candidates[user_id][candidate] = [count, 0, 0]
+    for column, shared in ((1, clubs), (2, events)):
+        for (user_id, candidate), count in shared.items():
+            candidates[user_id].setdefault(candidate, [0, 0, 0])[column] = count
+
+    # Closed accounts and ticket scanners are never suggested
+    everyone = set().union(*(user_candidates.keys() for user_candidates in candidates.values()))
+    allowed = set(User.objects.filter(id__in=everyone, user_type='user').exclude(account_type=User.CLOSED).values_list('id', flat=True))
+
+    suggestions = {}
+    for user_id, user_candidates in candidates.items():
+        graph = graphs[user_id]
+        known = graph.friends | graph.sent | graph.received | {user_id}
+        scored = (
+            (MUTUAL_FRIEND_WEIGHT * mutual + SHARED_CLUB_WEIGHT * clubs + SHARED_EVENT_WEIGHT * events, candidate, mutual, clubs, events)
+            for candidate, (mutual, clubs, events) in user_candidates.items()
+            if candidate in allowed and candidate not in known
+        )
+        suggestions[user_id] = [
+            FriendSuggestion(user_id=user_id, candidate_id=candidate, score=score, mutual_friends=mutual, shared_clubs=clubs, shared_events=events)
+            for score, candidate, mutual, clubs, events in heapq.nlargest(top_k(), scored)
+        ]
+    return suggestions
+
+def refresh_suggestions(user_ids, chunk_size=500):
+    """ Replace the stored suggestions of the users, chunk by chunk. Returns the number of suggestions stored """
+    user_ids = sorted(set(user_ids))
+    stored = 0
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        suggestions = rank_suggestions(chunk)
+        with transaction.atomic():
+            FriendSuggestion.objects.filter(user_id__in=chunk).delete()
+            stored += len(FriendSuggestion.objects.bulk_create([suggestion for rows in suggestions.values() for suggestion in rows]))
+    return stored
+
+def affected_by_friendship(sender_id, receiver_id):
+    """ Users whose suggestions change with the friendship: both users, whose candidates and exclusions
+    change, and their friends, whose mutual friend counts with the other user change """
+    graphs = load_friend_graphs([sender_id, receiver_id])
+    return {sender_id, receiver_id} | graphs[sender_id].friends | graphs[receiver_id].friends
@@ -0,0 +1,120 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from asgiref.sync import sync_to_async
+from ticketsystem.models import User, Club, Event, Ticket
+from ticketsystem.broker import InProcessBroker, get_broker, checkin_channel
+
+import json
+import asyncio
+import threading
+
+published = []
+
+class RecordingBroker(InProcessBroker):
+    """ Stand-in for a multi-worker broker, records what is published and delivers it locally """
+    def publish(self, channel, message):
+        published.append((channel, message))
+        super().publish(channel, message)
+
+class InProcessBrokerTest(TestCase):
+    """ Testing: InProcessBroker
+        Dependencies: None """
+    def test_fan_out(self):
+        async def scenario():
+            broker = InProcessBroker()
+            subscriptions = [broker.subscribe('a') for _ in range(3)]
+            other = broker.subscribe('b')
+            # Published from a request thread
+            thread = threading.Thread(target=broker.publish, args=('a', {'ticket_id': 1}))
+            thread.start()
+            thread.join()
+            messages = [await asyncio.wait_for(subscription.get(), 1) for subscription in subscriptions]
+            self.assertEqual(messages, [{'ticket_id': 1}] * 3)
+            self.assertTrue(other.queue.empty())
+            for subscription in subscriptions + [other]:
+                subscription.close()
+            self.assertEqual(dict(broker.subscriptions), {})
+        asyncio.run(scenario())
+
+    def test_slow_subscriber_loses_oldest_messages(self):
+        async def scenario():
+            broker = InProcessBroker(max_pending=2)
+            subscription = broker.subscribe('a')
+            for ticket_id in range(4):
+                broker.publish('a', {'ticket_id': ticket_id})
+            await asyncio.sleep(0)
+            self.assertEqual([await subscription.get(), await subscription.get()], [{'ticket_id': 2}, {'ticket_id': 3}])
+            self.assertEqual(subscription.dropped, 2)
+        asyncio.run(scenario())
+
+@override_settings(CHECKIN_BROKER='ticketsystem.tests.test_broker.RecordingBroker')
+class CheckinStreamViewTest(TestCase):
+    """ Testing: CheckinStreamView and the check-ins published by ValidateTicketView
+        Dependencies: User, Club, Event, Ticket
+        Url Name: checkin-stream, validate-ticket """
+    def setUp(self):
+        published.clear()
+        self.club_admin = User.objects.create_user(username='clubadmin', email='clubadmin@example.com', password='testpass')
+        self.club = Club.objects.create(name='Test Club', email='testclub@example.com')
+        self.club.club_admins.add(self.club_admin)
+        self.event = Event.objects.create(
+            title='Test Event',
+            description='This is a test event.',
+            price=10.0,
+            date='2021-01-01',
+            time='12:00:00',
+            capacity=100,
+            location='Test Location',
+            club=self.club)
+        self.ticket_scanner = User.objects.create_user(username='ticketscanner', email='ticketscanner@example.com', password='testpass', user_type='ticket_scanner', event=self.event)
+        self.ticket_user = User.objects.create_user(username='ticketuser', email='ticketuser@example.com', password='testpass', first_name='Ticket', last_name='User', student_id='123456')
+        self.ticket = Ticket.objects.create(title='Test Ticket', code='code1', price=10.0, user=self.ticket_user, event=self.event)
+        self.url = reverse('checkin-stream', kwargs={'event_id': self.event.id})
+
+    def test_validation_publishes_checkin(self):
+        client = APIClient()
+        client.force_authenticate(user=self.ticket_scanner)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(reverse('validate-ticket', kwargs={'ticket_id': self.ticket.id}))
+        self.assertEqual(len(published), 1)
+        channel, message = published[0]
+        self.assertEqual(channel, checkin_channel(self.event.id))
+        self.assertEqual(message['ticket_id'], self.ticket.id)
+        self.assertEqual(message['student_id'], '123456')
+        self.assertEqual(message['scanned_by'], self.ticket_scanner.id)
+
+    def test_stream_permission(self):
+        user = User.objects.create_user(username='user', email='user@example.com', password='testpass')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stream_needs_asgi(self):
+        client = APIClient()
+        client.force_authenticate(user=self.club_admin)
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    async def test_stream(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.club_admin).access_token))()
+        response = await self.async_client.get(self.url, {'token': token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        # The subscription is made when the stream starts
+        self.assertIn(b'retry:', await anext(stream))
+        get_broker().publish(checkin_channel(self.event.id), {'ticket_id': self.ticket.id})
+        chunk = await asyncio.wait_for(anext(stream), 1)
+        self.assertTrue(chunk.startswith(b'event: checkin\n'))
+        self.assertEqual(json.loads(chunk.split(b'data: ')[1]), {'ticket_id': self.ticket.id})
+        # The ASGI handler cancels the response when the client disconnects
+        reader = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(dict(get_broker().subscriptions), {})
@@ -0,0 +1,66 @@
+from django.test import TestCase
+from ticketsystem.models import TicketCode
+from ticketsystem.codes import TicketCodePool, random_code, is_valid_ticket_code, canonical_code, ALPHABET
+
+from unittest.mock import patch
+
+class TicketCodeTest(TestCase):
+    """ Testing: ticket code format and check character
+        Dependencies: None """
+    def test_format(self):
+        code = random_code()
+        groups = code.split('-')
+        self.assertEqual([len(group) for group in groups], [6, 6, 6])
+        self.assertTrue(all(char in ALPHABET for char in ''.join(groups)))
+        self.assertTrue(is_valid_ticket_code(code))
+        self.assertTrue(is_valid_ticket_code(code.upper()))
+
+    def test_single_typo_is_caught(self):
+        code = random_code()
+        for position, char in enumerate(code):
+            if char == '-':
+                continue
+            for replacement in ALPHABET:
+                if replacement != char:
+                    self.assertFalse(is_valid_ticket_code(code[:position] + replacement + code[position + 1:]))
+
+    def test_invalid_codes(self):
+        self.assertFalse(is_valid_ticket_code('abc'))
+        self.assertFalse(is_valid_ticket_code('abcdef-ghijkl-mnop?r'))
+
+    def test_canonical_code(self):
+        code = random_code()
+        self.assertEqual(canonical_code(code.upper().replace('-', '')), code)
+        self.assertEqual(canonical_code('legacy1234'), 'legacy1234')
+
+class TicketCodePoolTest(TestCase):
+    """ Testing: TicketCodePool
+        Dependencies: TicketCode """
+    def setUp(self):
+        self.pool = TicketCodePool(batch_size=10)
+
+    def test_codes_are_reserved(self):
+        codes = self.pool.take_many(5)
+        self.assertEqual(len(set(codes)), 5)
+        self.assertEqual(TicketCode.objects.filter(code__in=codes).count(), 5)
+
+    def test_pool_is_refilled_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.pool.take()
+        self.assertEqual(len(self.pool.codes), 10)
+        # The next codes come from memory
+        with self.assertNumQueries(0):
+            codes = self.pool.take_many(10)
+        self.assertNotIn(first, codes)
+        self.assertEqual(TicketCode.objects.count(), 11)
+
+    def test_rolled_back_batch_is_not_pooled(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            self.pool.take()
+        self.assertEqual(len(self.pool.codes), 0)
+
+    def test_collision_mints_new_batch(self):
+        TicketCode.objects.create(code='taken')
+        codes = iter(['taken', 'fresh'])
+        with patch('ticketsystem.codes.random_code', lambda: next(codes)):
+            self.assertEqual(self.pool.mint(1), ['fresh'])
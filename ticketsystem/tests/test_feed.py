@@ -0,0 +1,84 @@
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from ticketsystem.models import User, Club, Event, Follow, FeedEntry
+from ticketsystem.feed import home_feed
+
+import io
+import datetime
+
+@override_settings(JOB_EXECUTOR='inline', FEED_FANOUT_LIMIT=3)
+class HomeFeedTest(TestCase):
+    """ Testing: home feed fan out on write and on read
+        Dependencies: User, Club, Event, Follow, FeedEntry, FollowerRollup """
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='testpass') for n in range(5)]
+        self.club = Club.objects.create(name='Test Club', email='testclub@example.com')
+        self.large_club = Club.objects.create(name='Large Club', email='largeclub@example.com')
+        for user in self.users[:2]:
+            Follow.objects.create(user=user, club=self.club)
+        for user in self.users:
+            Follow.objects.create(user=user, club=self.large_club)
+
+    def publish(self, club, date, time='12:00'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Event.objects.create(title=f'Event {date}', description='Test event.', price=10.0, date=date, time=time,
+                                        location='Test Location', club=club)
+
+    def feed(self, user, position=None, size=10):
+        return [event.id for event in home_feed(user.id, position, size)]
+
+    def test_fan_out_on_publish(self):
+        event = self.publish(self.club, '2030-01-01')
+        self.assertEqual(set(FeedEntry.objects.filter(event=event).values_list('user_id', flat=True)), {user.id for user in self.users[:2]})
+        self.assertEqual(self.feed(self.users[0]), [event.id])
+        self.assertEqual(self.feed(self.users[2]), [])
+
+    @override_settings(JOB_EXECUTOR='database')
+    def test_fan_out_without_a_worker(self):
+        event = self.publish(self.club, '2030-01-01')
+        self.assertEqual(self.feed(self.users[0]), [event.id])
+
+    def test_large_club_fans_out_on_read(self):
+        event = self.publish(self.large_club, '2030-01-02')
+        small = self.publish(self.club, '2030-01-01')
+        # More followers than FEED_FANOUT_LIMIT, nothing is written
+        self.assertFalse(FeedEntry.objects.filter(event=event).exists())
+        self.assertTrue(Club.objects.get(id=self.large_club.id).fan_out_on_read)
+        self.assertEqual(self.feed(self.users[0]), [event.id, small.id])
+        self.assertEqual(self.feed(self.users[4]), [event.id])
+
+    def test_follow_and_unfollow(self):
+        events = [self.publish(self.club, f'2030-01-0{day}') for day in (1, 2)]
+        user = self.users[2]
+        follow = Follow.objects.create(user=user, club=self.club)
+        self.assertEqual(self.feed(user)[:2], [events[1].id, events[0].id])
+        follow.delete()
+        self.assertFalse(FeedEntry.objects.filter(user=user, club=self.club).exists())
+
+    def test_edited_event_moves(self):
+        first = self.publish(self.club, '2030-01-01')
+        second = self.publish(self.club, '2030-01-02')
+        first.date = datetime.date(2030, 1, 3)
+        first.save()
+        self.assertEqual(self.feed(self.users[0]), [first.id, second.id])
+
+    def test_pages_after_position(self):
+        self.publish(self.large_club, '2030-01-01')
+        events = [self.publish(self.club, '2030-01-02') for _ in range(3)]
+        page = home_feed(self.users[0].id, None, 2)
+        last = page[-1]
+        self.assertEqual([event.id for event in page], [events[2].id, events[1].id])
+        rest = self.feed(self.users[0], (last.date, last.time, last.id))
+        self.assertEqual(len(rest), 2)
+        self.assertEqual(rest[0], events[0].id)
+
+    def test_rebuild(self):
+        event = self.publish(self.club, '2030-01-01')
+        FeedEntry.objects.all().delete()
+        with override_settings(FEED_FANOUT_LIMIT=10):
+            Club.objects.filter(id=self.large_club.id).update(fan_out_on_read=True)
+            out = io.StringIO()
+            call_command('rebuild_home_feed', stdout=out)
+        self.assertIn('Wrote 2 feed entries', out.getvalue())
+        self.assertFalse(Club.objects.get(id=self.large_club.id).fan_out_on_read)
+        self.assertEqual(self.feed(self.users[1]), [event.id])
@@ -0,0 +1,155 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework import serializers
+from rest_framework.test import APIClient, APIRequestFactory
+from ticketsystem.models import User, Profile, Friend
+from ticketsystem.serializers.user_serializers import UserSearchResultSerializer
+from ticketsystem.friends import friend_graph, friend_ids, are_friends, common_friend_ids, friendship_status, relationships
+
+class FriendGraphTest(TestCase):
+    """ Testing: friend graph cache
+        Dependencies: User, Friend """
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='testpass') for n in range(4)]
+        Friend.objects.create(sender=self.users[0], receiver=self.users[1], status=True)
+        Friend.objects.create(sender=self.users[2], receiver=self.users[0], status=True)
+        Friend.objects.create(sender=self.users[1], receiver=self.users[2], status=True)
+        Friend.objects.create(sender=self.users[0], receiver=self.users[3])
+
+    def test_graph(self):
+        a, b, c, d = (user.id for user in self.users)
+        graph = friend_graph(a)
+        self.assertEqual(graph.friends, {b, c})
+        self.assertEqual(graph.sent, {d})
+        self.assertEqual(friend_graph(d).received, {a})
+        self.assertEqual(common_friend_ids(a, b), {c})
+        self.assertEqual([friendship_status(a, user_id) for user_id in (b, d)], ['friends', 'pending'])
+        self.assertEqual(friendship_status(d, a), 'accept')
+        self.assertEqual(friendship_status(c, d), 'none')
+
+    def test_cached(self):
+        a, b = self.users[0].id, self.users[1].id
+        friend_ids(a)
+        with self.assertNumQueries(0):
+            self.assertTrue(are_friends(a, b))
+            self.assertEqual(len(friend_ids(a)), 2)
+        # Only the missing graph is loaded
+        with self.assertNumQueries(1):
+            common_friend_ids(a, b)
+
+    def test_invalidated_on_save_and_delete(self):
+        a, d = self.users[0], self.users[3]
+        self.assertFalse(are_friends(d.id, a.id))
+        friend = Friend.objects.get(sender=a, receiver=d)
+        friend.status = True
+        friend.save()
+        self.assertTrue(are_friends(d.id, a.id))
+        self.assertTrue(a.is_friends_with(d))
+        friend.delete()
+        self.assertFalse(are_friends(a.id, d.id))
+        self.assertEqual(friendship_status(d.id, a.id), 'none')
+
+class RelationshipsTest(TestCase):
+    """ Testing: relationship resolver and its use in user lists
+        Dependencies: User, Profile, Friend
+        Url Name: public-usernames, common-friends """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='testpass')
+        names = ['friend', 'pending', 'accept', 'none', 'closed']
+        self.users = {name: User.objects.create_user(username=f'user_{name}', email=f'{name}@example.com', password='testpass') for name in names}
+        for user in [self.viewer, *self.users.values()]:
+            Profile.objects.create(user=user)
+        self.users['closed'].account_type = User.CLOSED
+        self.users['closed'].save()
+        Friend.objects.create(sender=self.viewer, receiver=self.users['friend'], status=True)
+        Friend.objects.create(sender=self.viewer, receiver=self.users['pending'])
+        Friend.objects.create(sender=self.users['accept'], receiver=self.viewer)
+        Friend.objects.create(sender=self.viewer, receiver=self.users['closed'], status=True)
+        self.client.force_authenticate(user=self.viewer)
+
+    def test_relationships(self):
+        users = [self.viewer, *self.users.values()]
+        with self.assertNumQueries(1):
+            resolved = relationships(self.viewer.id, users)
+        self.assertEqual([resolved[user.id] for user in users], ['you', 'friends', 'pending', 'accept', 'none', 'closed'])
+
+    def test_search_results(self):
+        response = self.client.get(reverse('public-usernames'), {'username': 'user_'})
+        self.assertEqual({user['username']: user['friendship_status'] for user in response.data}, {
+            'user_friend': 'friends', 'user_pending': 'pending', 'user_accept': 'accept', 'user_none': 'none', 'user_closed': 'closed',
+        })
+        # Friends matching the query, clubs followed by both, the candidates and friend graph are cached now
+        with self.assertNumQueries(2):
+            self.client.get(reverse('public-usernames'), {'username': 'user_'})
+
+    def test_common_friends(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass')
+        Friend.objects.create(sender=other, receiver=self.users['friend'], status=True)
+        response = self.client.get(reverse('common-friends', kwargs={'user_id1': self.viewer.id, 'username2': 'other'}))
+        self.assertEqual(response.data, [{'username': 'user_friend', 'profile_picture': None, 'friendship_status': 'friends'}])
+
+    def test_without_a_request(self):
+        self.assertEqual([user['friendship_status'] for user in UserSearchResultSerializer(self.users.values(), many=True).data], [None] * 5)
+
+    def test_users_nested_in_a_list(self):
+        class GroupSerializer(serializers.Serializer):
+            users = UserSearchResultSerializer(many=True)
+
+        groups = [{'users': [self.users['friend'], self.users['none']]}, {'users': [self.viewer]}]
+        request = APIRequestFactory().get('/')
+        request.user = self.viewer
+        data = GroupSerializer(groups, many=True, context={'request': request}).data
+        self.assertEqual([[user['friendship_status'] for user in group['users']] for group in data], [['friends', 'none'], ['you']])
+
+class ProfilePageFriendshipTest(TestCase):
+    """ Testing: UserPublicProfileView friendship status and details from the friend graph
+        Dependencies: User, Profile, Friend
+        Url Name: public-users """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='testpass')
+        self.user = User.objects.create_user(username='private', email='private@example.com', password='testpass', account_type=User.PRIVATE)
+        Profile.objects.create(user=self.viewer)
+        Profile.objects.create(user=self.user, course='Law', year=2)
+        self.client.force_authenticate(user=self.viewer)
+        self.url = reverse('public-users', kwargs={'username': 'private'})
+
+    def test_private_profile(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['friendship_status'], 'none')
+        self.assertFalse(response.data['show_details'])
+        self.assertIsNone(response.data['course'])
+        Friend.objects.create(sender=self.user, receiver=self.viewer)
+        self.assertEqual(self.client.get(self.url).data['friendship_status'], 'accept')
+        Friend.objects.filter(sender=self.user).update(status=True)
+        # Queryset updates send no signals
+        cache.clear()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['friendship_status'], 'friends')
+        self.assertTrue(response.data['show_details'])
+        self.assertEqual(response.data['course'], 'Law')
+
+    def test_unfriend_hides_details(self):
+        friend = Friend.objects.create(sender=self.user, receiver=self.viewer, status=True)
+        self.assertTrue(self.client.get(self.url).data['show_details'])
+        # The delete invalidates the cached graphs of both users
+        friend.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['friendship_status'], 'none')
+        self.assertFalse(response.data['show_details'])
+        self.assertIsNone(response.data['course'])
+
+    def test_one_query(self):
+        Friend.objects.create(sender=self.user, receiver=self.viewer, status=True)
+        self.client.get(self.url)
+        # The user with its profile, the friendship behind the status and the details comes from the cache
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertTrue(response.data['show_details'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -0,0 +1,62 @@
+from django.test import TestCase, override_settings
+from ticketsystem.models import Job
+from ticketsystem.jobs import register, enqueue, run_pending, queue_stats
+
+calls = []
+
+def record_failure(value):
+    calls.append(('failed', value))
+
+@register('test_record', on_failure=record_failure)
+def record(value):
+    if value == 'boom':
+        raise ValueError('boom')
+    calls.append(('ran', value))
+
+class JobQueueTest(TestCase):
+    """ Testing: jobs queue
+        Dependencies: Job """
+    def setUp(self):
+        calls.clear()
+
+    def test_worker_runs_job(self):
+        enqueue('test_record', value='a')
+        self.assertEqual(calls, [])
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [('ran', 'a')])
+        self.assertEqual(Job.objects.get().status, 'D')
+
+    @override_settings(JOB_EXECUTOR='inline')
+    def test_inline_executor(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('test_record', value='a')
+        self.assertEqual(calls, [('ran', 'a')])
+        self.assertEqual(Job.objects.get().status, 'D')
+
+    def test_failed_job_is_retried(self):
+        job = enqueue('test_record', value='boom')
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'P')
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('boom', job.last_error)
+        # Not due again until the backoff has passed
+        self.assertEqual(run_pending(), 0)
+
+    def test_failed_job_gives_up(self):
+        job = enqueue('test_record', value='boom')
+        Job.objects.filter(id=job.id).update(max_attempts=1)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'F')
+        self.assertEqual(calls, [('failed', 'boom')])
+
+    def test_queue_stats(self):
+        enqueue('test_record', value='a')
+        enqueue('unknown_job')
+        self.assertEqual(queue_stats()['pending'], 2)
+        run_pending()
+        stats = queue_stats(name='test_record')
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['done_in_window'], 1)
+        self.assertIsNotNone(stats['avg_latency'])
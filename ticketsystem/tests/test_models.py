@@ -1,5 +1,8 @@
 from django.test import TestCase
-from ticketsystem.models import User, Event, Club, Profile, Ticket, TransferRequest, StripeAccount, Friend, Follow
+from ticketsystem.models import User, Event, Club, Profile, Ticket, TransferRequest, StripeAccount, Friend, Follow, EventInventory, SoldOut, FollowerRollup
+from django.core.management import call_command
+
+import io
 
 class UserModelTest(TestCase):
     """ Testing: User Model
@@ -300,4 +303,103 @@ class EventModelTest(TestCase):
             ('V', 'Visit'),
             ('W', 'Workshop'),
             ('X', 'Expo'),
-        ))
\ No newline at end of file
+        ))
+
+class EventInventoryModelTest(TestCase):
+    """ Testing: EventInventory Model
+        Dependencies: Event, Club, User, Ticket """
+    def setUp(self):
+        self.club = Club.objects.create(name='Test Club', description='This is a test club.', email='testclub@example.com', content='Test content.')
+        self.event = Event.objects.create(
+            title='Test Event',
+            description='This is a test event.',
+            price=10.0,
+            date='2022-01-01',
+            time='10:00:00',
+            capacity=2,
+            location='Test Location',
+            club=self.club
+        )
+
+    def test_inventory_created_with_event(self):
+        inventory = EventInventory.objects.get(event=self.event)
+        self.assertEqual(inventory.capacity, 2)
+        self.assertEqual(inventory.sold, 0)
+
+    def test_reserve_until_sold_out(self):
+        EventInventory.objects.reserve(self.event.id)
+        EventInventory.objects.reserve(self.event.id)
+        with self.assertRaises(SoldOut):
+            EventInventory.objects.reserve(self.event.id)
+        self.assertEqual(EventInventory.objects.get(event=self.event).sold, 2)
+        self.event.refresh_from_db()
+        self.assertTrue(self.event.soldout)
+
+    def test_failed_insert_gives_seat_back(self):
+        user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+        Ticket.objects.create(title='Test Ticket', code='testcode1', price=10.0, user=user, event=self.event)
+        with self.assertRaises(Exception):
+            Ticket.objects.create(title='Test Ticket', code='testcode2', price=10.0, user=user, event=self.event)
+        self.assertEqual(EventInventory.objects.get(event=self.event).sold, 1)
+
+    def test_unlimited_capacity(self):
+        self.event.capacity = None
+        self.event.save()
+        for _ in range(5):
+            EventInventory.objects.reserve(self.event.id)
+        self.assertFalse(EventInventory.objects.is_sold_out(self.event.id))
+
+    def test_missing_inventory_is_rebuilt(self):
+        EventInventory.objects.filter(event=self.event).delete()
+        EventInventory.objects.reserve(self.event.id)
+        self.assertEqual(EventInventory.objects.get(event=self.event).sold, 1)
+
+class FollowerRollupModelTest(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Test Club', email='testclub@example.com')
+        self.other_club = Club.objects.create(name='Other Club', email='otherclub@example.com')
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+
+    def cells(self, club):
+        return {(year, course): count for year, course, count in FollowerRollup.objects.filter(club=club, count__gt=0).values_list('year', 'course', 'count')}
+
+    def test_follow_and_unfollow(self):
+        Profile.objects.create(user=self.user, year=2, course='Law')
+        follow = Follow.objects.create(user=self.user, club=self.club)
+        self.assertEqual(self.cells(self.club), {(2, 'Law'): 1})
+        follow.delete()
+        self.assertEqual(self.cells(self.club), {})
+
+    def test_profile_changes_move_followers(self):
+        Follow.objects.create(user=self.user, club=self.club)
+        Follow.objects.create(user=self.user, club=self.other_club)
+        self.assertEqual(self.cells(self.club), {(0, 'none'): 1})
+        profile = Profile.objects.create(user=self.user, year=1, course='Law')
+        self.assertEqual(self.cells(self.club), {(1, 'Law'): 1})
+        profile.year = 3
+        profile.save()
+        self.assertEqual(self.cells(self.club), {(3, 'Law'): 1})
+        self.assertEqual(self.cells(self.other_club), {(3, 'Law'): 1})
+        # Saving other fields leaves the rollup alone
+        profile.description = 'Hello'
+        profile.save(update_fields=['description'])
+        profile.delete()
+        self.assertEqual(self.cells(self.club), {(0, 'none'): 1})
+
+    def test_deleting_user(self):
+        Profile.objects.create(user=self.user, year=4, course='Law')
+        Follow.objects.create(user=self.user, club=self.club)
+        self.user.delete()
+        self.assertEqual(self.cells(self.club), {})
+
+    def test_rebuild_and_check_drift(self):
+        Profile.objects.create(user=self.user, year=5, course='Law')
+        Follow.objects.create(user=self.user, club=self.club)
+        FollowerRollup.objects.filter(club=self.club).update(count=7)
+        with self.assertRaises(SystemExit):
+            call_command('rebuild_follower_rollup', '--check', stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('rebuild_follower_rollup', stdout=io.StringIO())
+        self.assertEqual(self.cells(self.club), {(5, 'Law'): 1})
+        out = io.StringIO()
+        call_command('rebuild_follower_rollup', '--check', stdout=out)
+        self.assertIn('No drift', out.getvalue())
@@ -0,0 +1,36 @@
+from django.test import TestCase, override_settings
+from ticketsystem.signing import sign_ticket, verify_ticket_payload, parse_ticket_qr, event_key, InvalidTicketPayload
+
+class TicketSigningTest(TestCase):
+    """ Testing: signed ticket QR payloads
+        Dependencies: None """
+    def test_round_trip(self):
+        payload = sign_ticket(1234, 56, 'abcdef-ghijkl-mnopqr')
+        self.assertEqual(payload, payload.upper())
+        claims = verify_ticket_payload(payload)
+        self.assertEqual(claims, (1234, 56, 'abcdef-ghijkl-mnopqr'))
+        self.assertEqual(verify_ticket_payload(payload, key=event_key(56)), claims)
+
+    def test_tampered_payload(self):
+        payload = sign_ticket(1234, 56, 'abcdef-ghijkl-mnopqr')
+        # Another ticket id with the same signature
+        forged = payload.replace(':YA:', ':YB:', 1)
+        self.assertNotEqual(forged, payload)
+        with self.assertRaises(InvalidTicketPayload):
+            verify_ticket_payload(forged)
+        with self.assertRaises(InvalidTicketPayload):
+            verify_ticket_payload('T1:1:2:3')
+
+    def test_key_is_per_event(self):
+        payload = sign_ticket(1234, 56, 'abcdef-ghijkl-mnopqr')
+        with self.assertRaises(InvalidTicketPayload):
+            verify_ticket_payload(payload, key=event_key(57))
+
+    def test_signing_key_rotation(self):
+        payload = sign_ticket(1234, 56, 'abcdef-ghijkl-mnopqr')
+        with override_settings(TICKET_SIGNING_KEY='rotated'):
+            with self.assertRaises(InvalidTicketPayload):
+                verify_ticket_payload(payload)
+
+    def test_legacy_url(self):
+        self.assertEqual(parse_ticket_qr('http://localhost:8000/validate-ticket/42/'), (None, 42))
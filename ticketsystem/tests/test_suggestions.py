@@ -0,0 +1,91 @@
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from ticketsystem.models import User, Club, Event, Ticket, Follow, Friend, FriendSuggestion
+from ticketsystem.suggestions import rank_suggestions, refresh_suggestions, shared_counts
+
+import io
+from unittest.mock import patch
+
+class FriendSuggestionsTest(TestCase):
+    """ Testing: friend suggestions ranking and refresh
+        Dependencies: User, Club, Event, Ticket, Follow, Friend, FriendSuggestion """
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='testpass') for n in range(6)]
+        a, b, c, d, e, f = self.users
+        # d is a friend of two of a's friends, e of one
+        for sender, receiver in ((a, b), (a, c), (b, d), (c, d), (c, e)):
+            Friend.objects.create(sender=sender, receiver=receiver, status=True)
+        # f shares a club and an event with a
+        club = Club.objects.create(name='Test Club', email='testclub@example.com')
+        event = Event.objects.create(title='Test Event', description='Test event.', price=10.0, date='2030-01-01',
+                                     time='12:00:00', capacity=None, location='Test Location', club=club)
+        for user in (a, f):
+            Follow.objects.create(user=user, club=club)
+            Ticket.objects.create(title='Test Event', code=f'code{user.id}', price=10.0, user=user, event=event)
+
+    def suggested(self, user):
+        return list(FriendSuggestion.objects.filter(user=user).order_by('-score').values_list('candidate__username', 'mutual_friends', 'shared_clubs', 'shared_events'))
+
+    def test_ranking(self):
+        a = self.users[0]
+        refresh_suggestions([user.id for user in self.users])
+        self.assertEqual(self.suggested(a), [('user3', 2, 0, 0), ('user5', 0, 1, 1), ('user4', 1, 0, 0)])
+        # Friends and the user are never suggested
+        self.assertFalse(FriendSuggestion.objects.filter(user=a, candidate__in=[a, self.users[1], self.users[2]]).exists())
+
+    def test_pending_and_closed_are_excluded(self):
+        a, d, e = self.users[0], self.users[3], self.users[4]
+        Friend.objects.create(sender=a, receiver=d)
+        e.account_type = User.CLOSED
+        e.save()
+        suggestions = rank_suggestions([a.id])[a.id]
+        self.assertEqual([suggestion.candidate_id for suggestion in suggestions], [self.users[5].id])
+
+    @override_settings(FRIEND_SUGGESTIONS_TOP_K=1)
+    def test_top_k(self):
+        refresh_suggestions([self.users[0].id])
+        self.assertEqual(self.suggested(self.users[0]), [('user3', 2, 0, 0)])
+
+    def test_query_count_constant(self):
+        with self.assertNumQueries(5):
+            rank_suggestions([self.users[0].id])
+        with self.assertNumQueries(5):
+            rank_suggestions([user.id for user in self.users])
+
+    @override_settings(JOB_EXECUTOR='inline')
+    def test_refreshed_when_friendship_changes(self):
+        a, b, e = self.users[0], self.users[1], self.users[4]
+        refresh_suggestions([user.id for user in self.users])
+        self.assertNotIn('user4', [username for username, *_ in self.suggested(b)])
+        with self.captureOnCommitCallbacks(execute=True):
+            Friend.objects.create(sender=a, receiver=e, status=True)
+        self.assertNotIn('user4', [username for username, *_ in self.suggested(a)])
+        self.assertNotIn('user0', [username for username, *_ in self.suggested(e)])
+        # The friends of a now have e as a friend of a friend
+        self.assertIn(('user4', 1, 0, 0), self.suggested(b))
+        with self.captureOnCommitCallbacks(execute=True):
+            Friend.objects.filter(sender=a, receiver=e).delete()
+        self.assertNotIn(('user4', 1, 0, 0), self.suggested(b))
+
+    @override_settings(JOB_EXECUTOR='inline')
+    def test_pending_requests_refresh_nothing(self):
+        a, e = self.users[0], self.users[4]
+        with patch('ticketsystem.jobs.refresh_suggestions') as refresh, self.captureOnCommitCallbacks(execute=True):
+            Friend.objects.create(sender=a, receiver=e).delete()
+        refresh.assert_not_called()
+
+    def test_group_sizes_counted_for_the_users_groups(self):
+        a = self.users[0]
+        with self.assertNumQueries(1) as queries:
+            counts = shared_counts(Follow, 'club_id', [a.id])
+        self.assertEqual(counts, {(a.id, self.users[5].id): 1})
+        # The group size subquery is limited to the clubs the users follow
+        self.assertIn('U0."user_id" IN', queries.captured_queries[0]['sql'])
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('refresh_friend_suggestions', stdout=out)
+        self.assertIn('Stored', out.getvalue())
+        self.assertEqual(len(self.suggested(self.users[0])), 3)
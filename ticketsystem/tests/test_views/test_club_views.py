@@ -292,6 +292,7 @@ class CommonClubsViewTest(TestCase):
         Follow.objects.create(user=self.user1, club=self.club1)
         Follow.objects.create(user=self.user2, club=self.club1)
         Follow.objects.create(user=self.user2, club=self.club2)
+        self.client.force_authenticate(user=self.user1)
 
     def test_common_clubs(self):
         response = self.client.get(reverse('common-followed-clubs', kwargs={'user_id1': self.user1.id, 'username2': self.user2.username}))
@@ -303,4 +304,62 @@ class CommonClubsViewTest(TestCase):
         user3 = User.objects.create_user(username='testuser3', email='testuser3@example.com', password='testpass')
         response = self.client.get(reverse('common-followed-clubs', kwargs={'user_id1': self.user1.id, 'username2': user3.username}))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
\ No newline at end of file
+        self.assertEqual(len(response.data), 0)
+
+    def test_query_count_constant(self):
+        url = reverse('common-followed-clubs', kwargs={'user_id1': self.user1.id, 'username2': self.user2.username})
+        # The users, the common clubs, their admins
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        for n in range(3, 13):
+            club = Club.objects.create(name=f'Test Club {n}', description='This is a test club.', email=f'testclub{n}@example.com')
+            Follow.objects.create(user=self.user1, club=club)
+            Follow.objects.create(user=self.user2, club=club)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 11)
+        self.assertEqual(response.data[0]['name'], 'Test Club 1')
+
+    def test_user_does_not_exist(self):
+        response = self.client.get(reverse('common-followed-clubs', kwargs={'user_id1': self.user1.id, 'username2': 'nobody'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('common-followed-clubs', kwargs={'user_id1': 999, 'username2': self.user2.username}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unauthenticated(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('common-followed-clubs', kwargs={'user_id1': self.user1.id, 'username2': self.user2.username}))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class CommonClubCountsViewTest(TestCase):
+    """ Testing: CommonClubCountsView
+        Dependencies: User, Club, Follow
+        Url Name: common-followed-clubs-counts """
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [User.objects.create_user(username=f'testuser{n}', email=f'testuser{n}@example.com', password='testpass') for n in range(4)]
+        self.clubs = [Club.objects.create(name=f'Test Club {n}', description='This is a test club.', email=f'testclub{n}@example.com') for n in range(3)]
+        self.url = reverse('common-followed-clubs-counts', kwargs={'user_id1': self.users[0].id})
+        for user, clubs in zip(self.users, [(0, 1, 2), (0, 1), (2,), ()]):
+            for club in clubs:
+                Follow.objects.create(user=user, club=self.clubs[club])
+        # Not followed by the first user
+        other = Club.objects.create(name='Other Club', description='This is a test club.', email='other@example.com')
+        Follow.objects.create(user=self.users[1], club=other)
+        self.client.force_authenticate(user=self.users[0])
+
+    def test_counts(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'usernames': 'testuser1,testuser2,testuser3,nobody'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'testuser1': 2, 'testuser2': 1, 'testuser3': 0, 'nobody': 0})
+
+    def test_invalid_usernames(self):
+        for usernames in ('', ','.join(f'user{n}' for n in range(101))):
+            response = self.client.get(self.url, {'usernames': usernames})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unauthenticated(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url, {'usernames': 'testuser1'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
@@ -0,0 +1,191 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.core.cache import cache
+from rest_framework.test import APIClient
+from rest_framework import status
+from ticketsystem.models import User, Club, Event, Ticket, Profile, Follow
+
+# STATS ==============================================================================================
+class StatEventsYearViewTest(TestCase):
+    """ Testing: StatEventsYearView
+        Dependencies: User, Club, Event, Ticket, Profile
+        Url Name: stats-event-user-year """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.club_admin = User.objects.create_user(username='clubadmin', email='clubadmin@example.com', password='testpass')
+        self.club = Club.objects.create(name='Test Club', email='testclub@example.com')
+        self.club.club_admins.add(self.club_admin)
+        self.events = [
+            Event.objects.create(title=f'Event {n}', description='Test event.', price=10.0, date='2030-01-01',
+                                 time='12:00:00', capacity=None, location='Test Location', club=self.club)
+            for n in range(3)
+        ]
+        self.url = reverse('stats-event-user-year', kwargs={'club_id': self.club.id})
+        self.client.force_authenticate(user=self.club_admin)
+
+    def add_tickets(self, event, years):
+        offset = User.objects.count()
+        for n, year in enumerate(years, offset):
+            user = User.objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='testpass')
+            if year is not None:
+                Profile.objects.create(user=user, year=year)
+            Ticket.objects.create(title=event.title, code=f'code{n}', price=10.0, user=user, event=event)
+
+    def test_year_breakdown(self):
+        self.add_tickets(self.events[0], [1, 1, 2, 6])
+        # No profile, or a year outside 1 to 6, is not counted
+        self.add_tickets(self.events[1], [3, None, 0])
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([event['event_title'] for event in response.data], ['Event 0', 'Event 1', 'Event 2'])
+        self.assertEqual(response.data[0]['year_data'], {'year1': 2, 'year2': 1, 'year3': 0, 'year4': 0, 'year5': 0, 'year6': 1})
+        self.assertEqual(response.data[1]['year_data']['year3'], 1)
+        self.assertEqual(sum(response.data[1]['year_data'].values()), 1)
+        self.assertEqual(sum(response.data[2]['year_data'].values()), 0)
+
+    def test_query_count_constant(self):
+        self.add_tickets(self.events[0], [1, 2])
+        # Club, admin check, breakdown
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        cache.clear()
+        for event in self.events:
+            self.add_tickets(event, [1, 2, 3, 4, 5])
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        # Cached
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+    def test_invalidated_when_tickets_change(self):
+        self.add_tickets(self.events[0], [1])
+        self.assertEqual(self.client.get(self.url).data[0]['year_data']['year1'], 1)
+        self.add_tickets(self.events[0], [1])
+        self.assertEqual(self.client.get(self.url).data[0]['year_data']['year1'], 2)
+        Ticket.objects.filter(event=self.events[0]).first().delete()
+        self.assertEqual(self.client.get(self.url).data[0]['year_data']['year1'], 1)
+        profile = Profile.objects.get(user__ticket__event=self.events[0])
+        profile.year = 4
+        profile.save()
+        self.assertEqual(self.client.get(self.url).data[0]['year_data']['year4'], 1)
+
+    def test_not_club_admin(self):
+        user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_club_does_not_exist(self):
+        response = self.client.get(reverse('stats-event-user-year', kwargs={'club_id': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class StatClubFollowersViewTest(TestCase):
+    """ Testing: StatClubFollowersView
+        Dependencies: User, Club, Profile, Follow, FollowerRollup
+        Url Name: stats-club-followers """
+    def setUp(self):
+        self.client = APIClient()
+        self.club_admin = User.objects.create_user(username='clubadmin', email='clubadmin@example.com', password='testpass')
+        self.club = Club.objects.create(name='Test Club', email='testclub@example.com')
+        self.club.club_admins.add(self.club_admin)
+        self.url = reverse('stats-club-followers', kwargs={'club_id': self.club.id})
+        self.client.force_authenticate(user=self.club_admin)
+
+    def add_followers(self, profiles):
+        offset = User.objects.count()
+        for n, (year, course) in enumerate(profiles, offset):
+            user = User.objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='testpass')
+            Profile.objects.create(user=user, year=year, course=course)
+            Follow.objects.create(user=user, club=self.club)
+
+    def test_followers_breakdown(self):
+        self.add_followers([(1, 'Law'), (1, 'Maths'), (2, 'Law'), (0, 'none')])
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['club_name'], 'Test Club')
+        self.assertEqual(response.data['year_data'], {'year1': 2, 'year2': 1, 'year3': 0, 'year4': 0, 'year5': 0, 'year6': 0})
+        self.assertEqual(response.data['course_data'], {'Law': 2, 'Maths': 1, 'none': 1})
+
+    def test_query_count_constant(self):
+        self.add_followers([(1, 'Law')])
+        # Club, admin check, rollup
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        self.add_followers([(year, course) for year in range(1, 7) for course in ('Law', 'Maths')])
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+    def test_not_club_admin(self):
+        user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class StatEventSalesViewTest(TestCase):
+    """ Testing: StatEventSalesView
+        Dependencies: User, Club, Event, Ticket
+        Url Name: stats-event-sales """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.club_admin = User.objects.create_user(username='clubadmin', email='clubadmin@example.com', password='testpass')
+        self.club = Club.objects.create(name='Test Club', email='testclub@example.com')
+        self.club.club_admins.add(self.club_admin)
+        self.event = Event.objects.create(title='Test Event', description='Test event.', price=10.0, date='2030-01-01',
+                                          time='12:00:00', capacity=10, location='Test Location', club=self.club)
+        self.url = reverse('stats-event-sales', kwargs={'event_id': self.event.id})
+        self.client.force_authenticate(user=self.club_admin)
+
+    def sell(self, order_date=None, transferred_at=None):
+        n = User.objects.count()
+        user = User.objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='testpass')
+        ticket = Ticket.objects.create(title='Test Event', code=f'code{n}', price=10.0, user=user, event=self.event, transferred_at=transferred_at)
+        if order_date is not None:
+            Ticket.objects.filter(id=ticket.id).update(order_date=order_date)
+
+    def test_hourly_series(self):
+        self.sell('2020-01-01T10:05:00Z')
+        self.sell('2020-01-01T10:40:00Z')
+        self.sell('2020-01-01T12:10:00Z', transferred_at='2020-01-01T13:30:00Z')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['sold'], 3)
+        self.assertEqual(response.data['transferred'], 1)
+        self.assertAlmostEqual(response.data['transfer_rate'], 1 / 3)
+        buckets = [(bucket['start'], bucket['sold'], bucket['transferred'], bucket['cumulative']) for bucket in response.data['buckets']]
+        self.assertEqual(buckets, [
+            ('2020-01-01T10:00:00Z', 2, 0, 2),
+            ('2020-01-01T12:00:00Z', 1, 0, 3),
+            ('2020-01-01T13:00:00Z', 0, 1, 3),
+        ])
+        self.assertAlmostEqual(response.data['buckets'][-1]['fill'], 0.3)
+
+    def test_day_granularity(self):
+        self.sell('2020-01-01T10:05:00Z')
+        self.sell('2020-01-01T23:40:00Z')
+        response = self.client.get(self.url, {'granularity': 'day'})
+        self.assertEqual([(bucket['start'], bucket['sold']) for bucket in response.data['buckets']], [('2020-01-01T00:00:00Z', 2)])
+
+    def test_closed_buckets_are_cached(self):
+        self.sell('2020-01-01T10:05:00Z')
+        # Event, admin check, closed buckets, open bucket
+        with self.assertNumQueries(6):
+            self.client.get(self.url)
+        # Closed buckets never change, only the open bucket is counted again
+        self.sell('2020-01-01T10:10:00Z')
+        self.sell()
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['buckets'][0]['sold'], 1)
+        self.assertEqual(response.data['sold'], 2)
+
+    def test_invalid_granularity(self):
+        response = self.client.get(self.url, {'granularity': 'week'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_not_club_admin(self):
+        user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
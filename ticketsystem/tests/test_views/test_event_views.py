@@ -1,8 +1,17 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
-from rest_framework.test import APIClient
-from rest_framework import status
-from ticketsystem.models import User, Club, Event, Ticket
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework import status, serializers
+from django.db import connection, models
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.tokens import RefreshToken
+from ticketsystem.models import User, Club, Event, Ticket, Profile, Friend, Follow
+from ticketsystem.serializers.event_serializers import EventFriendsGoingSerializer
+
+import os
+import csv
+import json
+import unittest
 
 class EventViewSetTest(TestCase):
     """ Testing: EventViewSet (Default router)
@@ -146,6 +155,291 @@ class EventSoldOutViewTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['sold_out'], False)
 
+    def test_event_capacity_raised(self):
+        self.event.capacity = 2
+        self.event.save()
+        response = self.client.get(reverse('event-soldout', kwargs={'event_id': self.event.id}))
+        self.assertEqual(response.data['sold_out'], False)
+        self.event.refresh_from_db()
+        self.assertFalse(self.event.soldout)
+
     def test_event_does_not_exist(self):
         response = self.client.get(reverse('event-soldout', kwargs={'event_id': 999}))
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+def copy_rows(model, prefix, source, where, overrides, params):
+    """ INSERT ... SELECT copies of the template row of model, the columns in overrides computed from the source """
+    quote = connection.ops.quote_name
+    columns = [field.column for field in model._meta.concrete_fields if not isinstance(field, models.AutoField)]
+    values = [overrides.get(column, f'template.{quote(column)}') for column in columns]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{prefix}INSERT INTO {quote(model._meta.db_table)} ({", ".join(map(quote, columns))}) '
+            f'SELECT {", ".join(values)} FROM {source}, {quote(model._meta.db_table)} AS template WHERE {where}',
+            params,
+        )
+
+def rss():
+    """ Resident set size of this process in bytes """
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+class EventAttendeesExportViewTest(TestCase):
+    """ Testing: EventAttendeesExportView
+        Dependencies: User, Club, Event, Ticket, Profile
+        Url Name: event-attendees-export """
+    def setUp(self):
+        self.client = APIClient()
+        self.club_admin = User.objects.create_user(username='clubadmin', email='clubadmin@example.com', password='testpass')
+        self.club = Club.objects.create(name='Test Club', email='testclub@example.com')
+        self.club.club_admins.add(self.club_admin)
+        self.event = Event.objects.create(title='Test Event', description='Test event.', price=10.0, date='2030-01-01',
+                                          time='12:00:00', capacity=None, location='Test Location', club=self.club)
+        self.client.force_authenticate(user=self.club_admin)
+
+    def url(self, export_format):
+        return reverse('event-attendees-export', kwargs={'event_id': self.event.id, 'export_format': export_format})
+
+    def add_attendees(self, count):
+        """ Copy a template attendee `count` times with INSERT ... SELECT, fast enough for large events and
+        nothing is held in memory. Attendees are user<n> with ticket code<user id> """
+        template = User.objects.create_user(username='template', email='template@example.com', first_name='First')
+        Profile.objects.create(user=template, year=2, course='Law')
+        Ticket.objects.create(title='Test Event', code='template', price=10.0, user=template, event=self.event)
+        numbers = 'WITH RECURSIVE numbers(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM numbers WHERE n + 1 < %s) '
+        users = "source.username LIKE 'user%%' AND template.user_id = %s"
+        copy_rows(User, numbers, 'numbers AS source', 'template.id = %s', {
+            'username': "'user' || source.n",
+            'email': "'user' || source.n || '@example.com'",
+            'student_id': 'CAST(source.n AS TEXT)',
+            'last_name': "'Last' || source.n",
+        }, [count, template.id])
+        copy_rows(Profile, '', f'{User._meta.db_table} AS source', users, {'user_id': 'source.id'}, [template.id])
+        copy_rows(Ticket, '', f'{User._meta.db_table} AS source', users, {
+            'user_id': 'source.id',
+            'code': "'code' || source.id",
+        }, [template.id])
+        template.delete()
+
+    def test_export_csv(self):
+        self.add_attendees(3)
+        Ticket.objects.filter(user__username='user1').update(status='U')
+        response = self.client.get(self.url('csv'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ['code', 'status', 'scanned_at', 'first_name', 'last_name', 'student_id', 'year', 'course'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][1:], ['Active', '', 'First', 'Last0', '0', '2', 'Law'])
+        self.assertEqual(rows[2][1], 'Used')
+
+    def test_export_columns(self):
+        self.add_attendees(3)
+        response = self.client.get(self.url('columns'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        header, *batches = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(header['columns'][:3], ['code', 'status', 'scanned_at'])
+        self.assertEqual(sum(batch['rows'] for batch in batches), 3)
+        self.assertEqual(batches[0]['last_name'], ['Last0', 'Last1', 'Last2'])
+        self.assertEqual(batches[0]['year'], [2, 2, 2])
+
+    def test_export_empty_event(self):
+        response = self.client.get(self.url('csv'))
+        self.assertEqual(b''.join(response.streaming_content), b'code,status,scanned_at,first_name,last_name,student_id,year,course\r\n')
+
+    def test_invalid_format(self):
+        response = self.client.get(self.url('xlsx'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_not_club_admin(self):
+        user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url('csv'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_export_over_asgi(self):
+        await sync_to_async(self.add_attendees)(3)
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.club_admin).access_token))()
+        response = await self.async_client.get(self.url('csv'), headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.splitlines()), 4)
+
+    # Inserts 200k attendees, run with RUN_SLOW_TESTS=1
+    @unittest.skipUnless(os.environ.get('RUN_SLOW_TESTS'), 'Slow test, set RUN_SLOW_TESTS=1 to run it')
+    @unittest.skipUnless(os.path.exists('/proc/self/statm'), 'RSS is read from /proc')
+    def test_export_memory_stays_flat(self):
+        self.add_attendees(200000)
+        for export_format in ('csv', 'columns'):
+            response = self.client.get(self.url(export_format))
+            start = peak = rss()
+            size = lines = 0
+            for chunk in response.streaming_content:
+                size += len(chunk)
+                lines += chunk.count(b'\n')
+                peak = max(peak, rss())
+            if export_format == 'csv':
+                self.assertEqual(lines, 200001)
+            # The export is far larger than the memory it may take
+            self.assertGreater(size, 8 * 1024 * 1024)
+            self.assertLess(peak - start, 4 * 1024 * 1024, export_format)
+
+class FriendsGoingViewTest(TestCase):
+    """ Testing: FriendsGoingView, EventFriendsGoingSerializer friends_going
+        Dependencies: User, Profile, Friend, Club, Event, Ticket
+        Url Name: event-friends-going, events-friends-going, club-events """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+        self.club = Club.objects.create(name='Test Club', email='testclub@example.com')
+        self.events = [
+            Event.objects.create(title=f'Event {n}', description='Test event.', price=10.0, date='2030-01-01',
+                                 time='12:00:00', location='Test Location', club=self.club)
+            for n in range(2)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def add_user(self, username, friendship=None):
+        user = User.objects.create_user(username=username, email=f'{username}@example.com', password='testpass')
+        Profile.objects.create(user=user)
+        # Requests in both directions
+        if friendship == 'sent':
+            Friend.objects.create(sender=self.user, receiver=user, status=True)
+        elif friendship == 'received':
+            Friend.objects.create(sender=user, receiver=self.user, status=True)
+        elif friendship == 'pending':
+            Friend.objects.create(sender=self.user, receiver=user)
+        return user
+
+    def add_ticket(self, user, event, ticket_status='A'):
+        Ticket.objects.create(title=event.title, code=f'{user.username}-{event.id}', price=10.0, user=user, event=event, status=ticket_status)
+
+    def test_friends_going(self):
+        for username, friendship, ticket_status in [('carol', 'sent', 'A'), ('alice', 'received', 'U'), ('bob', 'sent', 'C'),
+                                                    ('dave', 'pending', 'A'), ('erin', None, 'A')]:
+            self.add_ticket(self.add_user(username, friendship), self.events[0], ticket_status)
+        response = self.client.get(reverse('event-friends-going', kwargs={'event_id': self.events[0].id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Friends only, cancelled tickets are not going
+        self.assertEqual([friend['username'] for friend in response.data], ['alice', 'carol'])
+
+    def test_batch(self):
+        alice, bob = self.add_user('alice', 'sent'), self.add_user('bob', 'received')
+        self.add_ticket(alice, self.events[0])
+        self.add_ticket(bob, self.events[0])
+        self.add_ticket(bob, self.events[1])
+        ids = ','.join(str(event.id) for event in self.events)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('events-friends-going'), {'events': ids})
+        self.assertEqual({event_id: [friend['username'] for friend in friends] for event_id, friends in response.data.items()},
+                         {self.events[0].id: ['alice', 'bob'], self.events[1].id: ['bob']})
+
+    def test_invalid_batch(self):
+        for events in ('', 'a,b', ','.join(map(str, range(1, 52)))):
+            response = self.client.get(reverse('events-friends-going'), {'events': events})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_event_does_not_exist(self):
+        response = self.client.get(reverse('event-friends-going', kwargs={'event_id': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_event_serializer_field(self):
+        url = reverse('club-events', kwargs={'club_id': self.club.id})
+        friends = [self.add_user(f'friend{n}', 'sent') for n in range(5)]
+        for friend in friends:
+            self.add_ticket(friend, self.events[0])
+        # Only asked for
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertNotIn('friends_going', response.data[0])
+        # The events, the friends going to all of them
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'friends_going': 'true'})
+        self.assertEqual(response.data[0]['friends_going']['count'], 5)
+        self.assertEqual([friend['username'] for friend in response.data[0]['friends_going']['friends']], ['friend0', 'friend1', 'friend2'])
+        self.assertEqual(response.data[1]['friends_going'], {'count': 0, 'friends': []})
+        for n in range(2, 12):
+            Event.objects.create(title=f'Event {n}', description='Test event.', price=10.0, date='2030-01-01',
+                                 time='12:00:00', location='Test Location', club=self.club)
+        with self.assertNumQueries(2):
+            self.client.get(url, {'friends_going': 'true'})
+
+    def test_events_nested_in_a_list(self):
+        class ClubSerializer(serializers.Serializer):
+            events = EventFriendsGoingSerializer(many=True)
+
+        self.add_ticket(self.add_user('alice', 'sent'), self.events[1])
+        request = APIRequestFactory().get('/')
+        request.user = self.user
+        clubs = [{'events': self.events}, {'events': []}]
+        data = ClubSerializer(clubs, many=True, context={'request': request}).data
+        self.assertEqual([event['friends_going']['count'] for event in data[0]['events']], [0, 1])
+
+@override_settings(JOB_EXECUTOR='inline')
+class EventFeedPaginationTest(TestCase):
+    """ Testing: EventViewSet paginated and followed_clubs pages
+        Dependencies: User, Club, Follow, Event
+        Url Name: event-paginated, event-followed-clubs """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+        self.club = Club.objects.create(name='Test Club', email='testclub@example.com')
+        self.other_club = Club.objects.create(name='Other Club', email='otherclub@example.com')
+        Follow.objects.create(user=self.user, club=self.club)
+        self.client.force_authenticate(user=self.user)
+
+    def add_events(self, schedule, club=None):
+        # Published to the home feeds of the followers on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Event.objects.create(title=f'Event {date} {time}', description='Test event.', price=10.0, date=date, time=time,
+                                     location='Test Location', club=club or self.club)
+                for date, time in schedule
+            ]
+
+    def pages(self, url, params=None):
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([event['id'] for event in response.data['results']])
+            if response.data['next'] is None:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_keyset_pages_with_ties(self):
+        # Events sharing a date, and a date and time
+        events = self.add_events([('2030-01-02', '10:00'), ('2030-01-01', '12:00'), ('2030-01-01', '12:00'), ('2030-01-01', '12:00'),
+                                  ('2030-01-01', '09:00'), ('2030-01-03', '08:00'), ('2030-01-01', '12:00'), ('2029-12-31', '23:00')])
+        expected = sorted(events, key=lambda event: (event.date, event.time, event.id), reverse=True)
+        pages = self.pages(reverse('event-paginated'))
+        self.assertEqual([len(page) for page in pages], [6, 2])
+        self.assertEqual(sum(pages, []), [event.id for event in expected])
+
+    def test_followed_clubs(self):
+        followed = self.add_events([(f'2030-01-{day:02}', '12:00') for day in range(1, 9)])
+        self.add_events([('2030-01-05', '12:00')], club=self.other_club)
+        pages = self.pages(reverse('event-followed-clubs'))
+        self.assertEqual(sum(pages, []), [event.id for event in reversed(followed)])
+
+    def test_deep_pages_cost_the_same(self):
+        self.add_events([(f'2030-01-{day:02}', '12:00') for day in range(1, 29)])
+        url = reverse('event-followed-clubs')
+        # The home feed entries of the page with their events, the events of large followed clubs
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        for _ in range(3):
+            with self.assertNumQueries(2):
+                response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'][0]['date'], '2030-01-10')
+
+    def test_page_number_opt_in(self):
+        self.add_events([(f'2030-01-{day:02}', '12:00') for day in range(1, 9)])
+        response = self.client.get(reverse('event-paginated'), {'page': 2})
+        self.assertEqual(response.data['count'], 8)
+        self.assertEqual([event['date'] for event in response.data['results']], ['2030-01-02', '2030-01-01'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('event-paginated'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
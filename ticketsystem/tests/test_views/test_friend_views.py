@@ -1,8 +1,9 @@
 from django.test import TestCase
 from django.urls import reverse
+from django.core.cache import cache
 from rest_framework.test import APIClient
 from rest_framework import status
-from ticketsystem.models import User, Profile, Friend
+from ticketsystem.models import User, Profile, Friend, FriendSuggestion
 
 class FriendViewSetTest(TestCase):
     """ Testing: FriendViewSet (Default router)
@@ -91,19 +92,69 @@ class UserFriendsTest(TestCase):
     def test_get_accepted_friends(self):
         response = self.client.get(reverse('user-friends', kwargs={'user_id': self.user1.id, 'friendship_status': 'accepted'}))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['username'], 'testuser2')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['username'], 'testuser2')
 
     def test_get_pending_friends(self):
         response = self.client.get(reverse('user-friends', kwargs={'user_id': self.user1.id, 'friendship_status': 'pending'}))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['username'], 'testuser3')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['username'], 'testuser3')
 
     def test_get_invalid_friendship_status(self):
         response = self.client.get(reverse('user-friends', kwargs={'user_id': self.user1.id, 'friendship_status': 'invalid'}))
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+class UserFriendsPaginationTest(TestCase):
+    """ Testing: UserFriendsView pages and search
+        Dependencies: User, Profile, Friend
+        Url Name: user-friends """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+        Profile.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('user-friends', kwargs={'user_id': self.user.id, 'friendship_status': 'accepted'})
+
+    def add_friends(self, count):
+        offset = User.objects.count()
+        for n in range(offset, offset + count):
+            friend = User.objects.create_user(username=f'friend{n}', email=f'friend{n}@example.com', password='testpass', first_name=f'Name{n}')
+            Profile.objects.create(user=friend)
+            # Both directions of the request
+            if n % 2:
+                Friend.objects.create(sender=self.user, receiver=friend, status=True)
+            else:
+                Friend.objects.create(sender=friend, receiver=self.user, status=True)
+
+    def test_pages_newest_first(self):
+        self.add_friends(5)
+        response = self.client.get(self.url, {'page_size': 3})
+        self.assertEqual([friend['username'] for friend in response.data['results']], ['friend5', 'friend4', 'friend3'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([friend['username'] for friend in response.data['results']], ['friend2', 'friend1'])
+        self.assertIsNone(response.data['next'])
+
+    def test_search(self):
+        self.add_friends(12)
+        response = self.client.get(self.url, {'search': 'name1'})
+        self.assertEqual(sorted(friend['first_name'] for friend in response.data['results']), ['Name1', 'Name10', 'Name11', 'Name12'])
+
+    def test_query_count_constant(self):
+        self.add_friends(2)
+        # The page, the friend graph of the authenticated user for the friendship statuses
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        self.add_friends(40)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual({friend['friendship_status'] for friend in response.data['results']}, {'friends'})
+        # The friend graph is cached
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
 class CommonFriendsViewTest(TestCase):
     """ Testing: CommonFriendsView
         Dependencies: User, Profile, Friend
@@ -232,4 +283,33 @@ class ManageFriendshipTest(TestCase):
         Friend.objects.create(sender=self.user1, receiver=self.user2, status=True)  # Accepted friend request
         response = self.client.delete(reverse('manage-friendship', kwargs={'user1': self.user1.id, 'username2': 'testuser2'}))
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(Friend.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(Friend.objects.count(), 0)
+class FriendSuggestionsViewTest(TestCase):
+    """ Testing: FriendSuggestionsView
+        Dependencies: User, Profile, Friend, FriendSuggestion
+        Url Name: friend-suggestions """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.users = [User.objects.create_user(username=f'testuser{n}', email=f'testuser{n}@example.com', password='testpass') for n in range(5)]
+        for user in self.users:
+            Profile.objects.create(user=user)
+        for candidate in self.users[1:]:
+            FriendSuggestion.objects.create(user=self.users[0], candidate=candidate, score=candidate.id, mutual_friends=1)
+        self.client.force_authenticate(user=self.users[0])
+
+    def test_get_suggestions(self):
+        response = self.client.get(reverse('friend-suggestions'), {'limit': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([user['username'] for user in response.data], ['testuser4', 'testuser3', 'testuser2'])
+        self.assertEqual(response.data[0]['mutual_friends'], 1)
+
+    def test_requested_users_are_dropped(self):
+        Friend.objects.create(sender=self.users[0], receiver=self.users[4])
+        response = self.client.get(reverse('friend-suggestions'))
+        self.assertEqual([user['username'] for user in response.data], ['testuser3', 'testuser2', 'testuser1'])
+
+    def test_one_query(self):
+        self.client.get(reverse('friend-suggestions'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('friend-suggestions'))
@@ -0,0 +1,160 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from ticketsystem.models import User, Profile, Club, Event, Ticket, Friend, Follow, TransferRequest
+from ticketsystem.urls import router
+
+from itertools import count
+
+# Url name: the method adding rows to the endpoint's results, it returns the url kwargs and the user to request it as
+LIST_ENDPOINTS = {
+    'user-list': 'add_users',
+    'profile-list': 'add_users',
+    'friend-list': 'add_friends',
+    'ticket-list': 'add_tickets',
+    'club-list': 'add_clubs',
+    'event-list': 'add_events',
+    'follow-list': 'add_follows',
+    'transferrequest-list': 'add_transfer_requests',
+    'user-friends': 'add_user_friends',
+    'transfer-request': 'add_received_transfer_requests',
+    'sent-transfer-requests': 'add_sent_transfer_requests',
+    'scanner-event-tickets': 'add_scanner_tickets',
+    'club-events': 'add_club_events',
+    'user-events': 'add_user_events',
+}
+
+class ListQueryCountTest(TestCase):
+    """ Testing: the number of queries of the list endpoints does not grow with their results
+        Dependencies: User, Profile, Club, Event, Ticket, Friend, Follow, TransferRequest
+        Url Name: the router lists and LIST_ENDPOINTS """
+    SMALL, LARGE = 1, 4
+
+    def setUp(self):
+        self.numbers = count()
+        self.viewer = self.add_user()
+        self.club = Club.objects.create(name='Test Club', description='This is a test club.', email='testclub@example.com')
+        self.event = self.add_event()
+        self.scanner = User.objects.create_user(username='ticketscanner', email='ticketscanner@example.com', password='testpass',
+                                                user_type='ticket_scanner', event=self.event)
+        self.client = APIClient()
+
+    def add_user(self):
+        n = next(self.numbers)
+        user = User.objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='testpass')
+        Profile.objects.create(user=user)
+        return user
+
+    def add_event(self):
+        return Event.objects.create(title='Test Event', description='This is a test event.', price=10.0, date='2030-01-01',
+                                    time='12:00:00', capacity=100, location='Test Location', club=self.club)
+
+    def add_ticket(self, user, event=None):
+        return Ticket.objects.create(title='Test Ticket', code=f'code{next(self.numbers)}', price=10.0, status='A', user=user,
+                                     event=event or self.event, scanned_by=self.scanner)
+
+    def add_users(self, rows):
+        for _ in range(rows):
+            self.add_user()
+        return {}, self.viewer
+
+    def add_friends(self, rows):
+        for _ in range(rows):
+            Friend.objects.create(sender=self.viewer, receiver=self.add_user(), status=True)
+        return {}, self.viewer
+
+    def add_user_friends(self, rows):
+        self.add_friends(rows)
+        return {'user_id': self.viewer.id, 'friendship_status': 'accepted'}, self.viewer
+
+    def add_tickets(self, rows):
+        for _ in range(rows):
+            self.add_ticket(self.viewer, self.add_event())
+        return {}, self.viewer
+
+    def add_clubs(self, rows):
+        for _ in range(rows):
+            n = next(self.numbers)
+            club = Club.objects.create(name=f'Club {n}', description='This is a test club.', email=f'club{n}@example.com')
+            club.club_admins.add(self.add_user())
+        return {}, self.viewer
+
+    def add_events(self, rows):
+        for _ in range(rows):
+            self.add_event()
+        return {}, self.viewer
+
+    def add_club_events(self, rows):
+        self.add_events(rows)
+        return {'club_id': self.club.id}, self.viewer
+
+    def add_user_events(self, rows):
+        # Active and used tickets
+        for _ in range(rows):
+            self.add_ticket(self.viewer, self.add_event())
+            Ticket.objects.filter(id=self.add_ticket(self.viewer, self.add_event()).id).update(status='U')
+        return {'username': self.viewer.username}, self.viewer
+
+    def add_follows(self, rows):
+        for _ in range(rows):
+            Follow.objects.create(user=self.add_user(), club=self.club)
+        return {}, self.viewer
+
+    def add_transfer_requests(self, rows):
+        for _ in range(rows):
+            sender = self.add_user()
+            TransferRequest.objects.create(sender=sender, receiver=self.viewer, ticket=self.add_ticket(sender))
+        return {}, self.viewer
+
+    def add_received_transfer_requests(self, rows):
+        self.add_transfer_requests(rows)
+        return {'user_id': self.viewer.id}, self.viewer
+
+    def add_sent_transfer_requests(self, rows):
+        for _ in range(rows):
+            TransferRequest.objects.create(sender=self.viewer, receiver=self.add_user(), ticket=self.add_ticket(self.viewer, self.add_event()))
+        return {'user_id': self.viewer.id}, self.viewer
+
+    def add_scanner_tickets(self, rows):
+        for _ in range(rows):
+            self.add_ticket(self.add_user())
+        return {}, self.scanner
+
+    def count_queries(self, name, kwargs, user):
+        cache.clear()
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name, kwargs=kwargs))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_router_lists_are_registered(self):
+        for prefix, viewset, basename in router.registry:
+            self.assertIn(f'{basename}-list', LIST_ENDPOINTS)
+
+    def test_queries_do_not_grow_with_results(self):
+        for name, method in LIST_ENDPOINTS.items():
+            # The rows of an endpoint are rolled back, they would fill the pages of the next ones
+            with self.subTest(endpoint=name), transaction.atomic():
+                add = getattr(self, method)
+                small = self.count_queries(name, *add(self.SMALL))
+                large = self.count_queries(name, *add(self.LARGE - self.SMALL))
+                self.assertEqual(large, small)
+                transaction.set_rollback(True)
+
+    def test_event_lists_are_planned(self):
+        for name, method in (('club-events', 'add_club_events'), ('user-events', 'add_user_events')):
+            with self.subTest(endpoint=name):
+                kwargs, user = getattr(self, method)(1)
+                self.client.force_authenticate(user=user)
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(reverse(name, kwargs=kwargs))
+                # The club name and logo are joined, the columns of the club the serializer does not read are not loaded
+                events = [query['sql'] for query in queries if 'FROM "ticketsystem_event"' in query['sql']]
+                self.assertTrue(events)
+                for sql in events:
+                    self.assertIn('"ticketsystem_club"."name"', sql)
+                    self.assertNotIn('"ticketsystem_club"."description"', sql)
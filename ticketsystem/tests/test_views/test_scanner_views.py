@@ -1,10 +1,18 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
-from ticketsystem.models import User, Club, Event, Ticket
+from ticketsystem.models import User, Club, Event, Ticket, DeletedTicket
+from ticketsystem.signing import sign_ticket, event_key, verify_ticket_payload
+from ticketsystem.codes import random_code
+from ticketsystem.manifest import encode_cursor
+from django.core.management import call_command
 
+import io
+import base64
+import warnings
 from datetime import timedelta
+from django.utils import timezone
 
 class CreateTicketScannerViewTest(TestCase):
     """ Testing: CreateTicketScannerView
@@ -185,6 +193,31 @@ class ValidateTicketViewTest(TestCase):
         self.assertEqual(self.ticket.status, 'U')
         self.assertEqual(self.ticket.scanned_by, self.ticket_scanner)
 
+    def test_validate_ticket_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('validate-ticket', kwargs={'ticket_id': self.ticket.id}))
+        self.assertEqual(response.data['first_name'], 'Ticket')
+        self.assertEqual(response.data['student_id'], '123456')
+        self.ticket.refresh_from_db()
+        self.assertIsNotNone(self.ticket.scanned_at)
+
+    def test_validate_ticket_twice(self):
+        other_scanner = User.objects.create_user(username='ticketscanner2', email='ticketscanner2@example.com', password='testpass', user_type='ticket_scanner', event=self.event)
+        self.client.post(reverse('validate-ticket', kwargs={'ticket_id': self.ticket.id}))
+        # The same scanner retrying gets the same answer
+        response = self.client.post(reverse('validate-ticket', kwargs={'ticket_id': self.ticket.id}))
+        self.assertEqual(response.data['detail'], 'Ticket validated successfully')
+        # Another gate scanning at the same moment does not let a second person in
+        self.client.force_authenticate(user=other_scanner)
+        response = self.client.post(reverse('validate-ticket', kwargs={'ticket_id': self.ticket.id}))
+        self.assertEqual(response.data['detail'], 'Ticket already scanned')
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.scanned_by, self.ticket_scanner)
+
+    def test_validate_missing_ticket(self):
+        response = self.client.post(reverse('validate-ticket', kwargs={'ticket_id': self.ticket.id + 100}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_validate_ticket_not_ticket_scanner(self):
         self.client.force_authenticate(user=self.club_admin)
         response = self.client.post(reverse('validate-ticket', kwargs={'ticket_id': self.ticket.id}))
@@ -228,7 +261,265 @@ class ValidateTicketViewTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('Ticket is not active', response.data['detail'])
 
+class ValidateTicketQRViewTest(TestCase):
+    """ Testing: ValidateTicketView with scanned QR data
+        Dependencies: User, Club, Event, Ticket
+        Url Name: validate-ticket-qr, scanner-event-key """
+    def setUp(self):
+        self.client = APIClient()
+        self.club = Club.objects.create(name='Test Club')
+        self.event = Event.objects.create(
+            title='Test Event', 
+            description='This is a test event.', 
+            price=10.0,
+            date='2021-01-01',
+            time='12:00:00',
+            capacity=100,
+            location='Test Location',
+            club=self.club)
+        self.ticket_scanner = User.objects.create_user(username='ticketscanner', email='ticketscanner@example.com', password='testpass', user_type='ticket_scanner', event=self.event)
+        self.ticket_user = User.objects.create_user(username='ticketuser1', email='ticketuser1@example.com', password='testpass', first_name='Ticket', last_name='User', student_id='123456')
+        self.ticket = Ticket.objects.create(title='Test Ticket 1', code='abcdef-ghijkl-mnopqr', price=10.0, status='A', user=self.ticket_user, event=self.event)
+        self.client.force_authenticate(user=self.ticket_scanner)
+
+    def test_validate_signed_qr(self):
+        data = sign_ticket(self.ticket.id, self.event.id, self.ticket.code)
+        response = self.client.post(reverse('validate-ticket-qr'), {'qr': data}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['student_id'], '123456')
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'U')
+
+    def test_validate_legacy_qr(self):
+        data = f'http://localhost:8000/validate-ticket/{self.ticket.id}/'
+        response = self.client.post(reverse('validate-ticket-qr'), {'qr': data}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'U')
+
+    def test_forged_qr_never_reaches_the_database(self):
+        data = sign_ticket(self.ticket.id, self.event.id, self.ticket.code)[:-1] + 'A'
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('validate-ticket-qr'), {'qr': data}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'A')
+
+    def test_qr_from_another_event(self):
+        data = sign_ticket(self.ticket.id, self.event.id + 1, self.ticket.code)
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('validate-ticket-qr'), {'qr': data}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_qr_with_old_code(self):
+        # The ticket was transferred and got a new code
+        data = sign_ticket(self.ticket.id, self.event.id, 'zzzzzz-zzzzzz-zzzzzz')
+        response = self.client.post(reverse('validate-ticket-qr'), {'qr': data}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_typed_code(self):
+        self.ticket.code = random_code()
+        self.ticket.save()
+        response = self.client.post(reverse('validate-ticket-qr'), {'code': self.ticket.code.upper()}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'U')
+
+    def test_typed_legacy_code(self):
+        response = self.client.post(reverse('validate-ticket-qr'), {'code': self.ticket.code}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(ACCEPT_LEGACY_TICKET_CODES=False)
+    def test_typo_never_reaches_the_database(self):
+        code = random_code()
+        typo = code[:-1] + ('0' if code[-1] != '0' else '1')
+        for typed in (typo, self.ticket.code):
+            with self.assertNumQueries(0):
+                response = self.client.post(reverse('validate-ticket-qr'), {'code': typed}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['detail'], 'Invalid ticket code')
+
+    def test_typed_code_does_not_exist(self):
+        response = self.client.post(reverse('validate-ticket-qr'), {'code': random_code()}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_event_key(self):
+        response = self.client.get(reverse('scanner-event-key'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        key = base64.urlsafe_b64decode(response.data['key'])
+        self.assertEqual(key, event_key(self.event.id))
+        data = sign_ticket(self.ticket.id, self.event.id, self.ticket.code)
+        self.assertEqual(verify_ticket_payload(data, key=key).ticket_id, self.ticket.id)
+
+class BatchScanViewTest(TestCase):
+    """ Testing: BatchScanView
+        Dependencies: User, Club, Event, Ticket
+        Url Name: validate-tickets-batch """
+    def setUp(self):
+        self.client = APIClient()
+        self.club = Club.objects.create(name='Test Club')
+        self.event = Event.objects.create(
+            title='Test Event', 
+            description='This is a test event.', 
+            price=10.0,
+            date='2021-01-01',
+            time='12:00:00',
+            capacity=100,
+            location='Test Location',
+            club=self.club)
+        self.other_event = Event.objects.create(
+            title='Another Test Event', 
+            description='This is another test event.', 
+            price=10.0,
+            date='2021-01-02',
+            time='12:00:00',
+            capacity=100,
+            location='Test Location',
+            club=self.club)
+        self.ticket_scanner = User.objects.create_user(username='ticketscanner', email='ticketscanner@example.com', password='testpass', user_type='ticket_scanner', event=self.event)
+        self.other_scanner = User.objects.create_user(username='ticketscanner2', email='ticketscanner2@example.com', password='testpass', user_type='ticket_scanner', event=self.event)
+        self.tickets = []
+        for n in range(4):
+            user = User.objects.create_user(username=f'ticketuser{n}', email=f'ticketuser{n}@example.com', password='testpass')
+            event = self.other_event if n == 3 else self.event
+            self.tickets.append(Ticket.objects.create(title='Test Ticket', code=f'code{n}', price=10.0, user=user, event=event))
+        self.now = timezone.now().replace(microsecond=0)
+        self.client.force_authenticate(user=self.ticket_scanner)
+
+    def scan(self, ticket, minutes_ago, scanner=None):
+        scan = {'ticket_id': ticket.id, 'scanned_at': (self.now - timedelta(minutes=minutes_ago)).isoformat()}
+        if scanner:
+            scan['scanner'] = scanner.id
+        return scan
+
+    def test_batch_scan(self):
+        scans = [
+            self.scan(self.tickets[0], 10),
+            # Two gates scanned the same ticket, the earlier scan wins
+            self.scan(self.tickets[1], 5),
+            self.scan(self.tickets[1], 8, scanner=self.other_scanner),
+            self.scan(self.tickets[3], 10),
+            {'ticket_id': self.tickets[3].id + 100, 'scanned_at': self.now.isoformat()},
+        ]
+        response = self.client.post(reverse('validate-tickets-batch'), {'scans': scans}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        outcomes = [result['outcome'] for result in response.data['results']]
+        self.assertEqual(outcomes, ['validated', 'already_scanned', 'validated', 'forbidden', 'not_found'])
+        ticket = Ticket.objects.get(id=self.tickets[1].id)
+        self.assertEqual(ticket.status, 'U')
+        self.assertEqual(ticket.scanned_by, self.other_scanner)
+        self.assertEqual(ticket.scanned_at, self.now - timedelta(minutes=8))
+        self.assertEqual(Ticket.objects.get(id=self.tickets[3].id).status, 'A')
+
+    def test_earlier_offline_scan_replaces_online_scan(self):
+        self.client.post(reverse('validate-ticket', kwargs={'ticket_id': self.tickets[0].id}))
+        self.client.force_authenticate(user=self.other_scanner)
+        response = self.client.post(reverse('validate-tickets-batch'), {'scans': [self.scan(self.tickets[0], 30)]}, format='json')
+        self.assertEqual(response.data['results'][0]['outcome'], 'validated')
+        self.assertEqual(Ticket.objects.get(id=self.tickets[0].id).scanned_by, self.other_scanner)
+
+    def test_upload_is_idempotent(self):
+        scans = [self.scan(self.tickets[0], 10), self.scan(self.tickets[2], 5)]
+        self.client.post(reverse('validate-tickets-batch'), {'scans': scans}, format='json')
+        response = self.client.post(reverse('validate-tickets-batch'), {'scans': scans}, format='json')
+        self.assertEqual([result['outcome'] for result in response.data['results']], ['validated', 'validated'])
+
+    def test_scanner_from_another_event(self):
+        scanner = User.objects.create_user(username='ticketscanner3', email='ticketscanner3@example.com', password='testpass', user_type='ticket_scanner', event=self.other_event)
+        response = self.client.post(reverse('validate-tickets-batch'), {'scans': [self.scan(self.tickets[0], 10, scanner=scanner)]}, format='json')
+        self.assertEqual(response.data['results'][0]['outcome'], 'forbidden')
+        self.assertEqual(Ticket.objects.get(id=self.tickets[0].id).status, 'A')
+
+    def test_cancelled_ticket(self):
+        Ticket.objects.filter(id=self.tickets[0].id).update(status='C')
+        response = self.client.post(reverse('validate-tickets-batch'), {'scans': [self.scan(self.tickets[0], 10)]}, format='json')
+        self.assertEqual(response.data['results'][0]['outcome'], 'not_active')
+
+    def test_query_count_does_not_grow(self):
+        users = User.objects.bulk_create([User(username=f'bulk{n}', email=f'bulk{n}@example.com') for n in range(50)])
+        tickets = Ticket.objects.bulk_create([Ticket(title='Test Ticket', code=f'bulk{n}', price=10.0, user=user, event=self.event) for n, user in enumerate(users)])
+        scans = [self.scan(ticket, 10, scanner=self.other_scanner) for ticket in tickets]
+        # Scanners, tickets and one UPDATE, plus the savepoint
+        with self.assertNumQueries(5):
+            response = self.client.post(reverse('validate-tickets-batch'), {'scans': scans}, format='json')
+        self.assertEqual(Ticket.objects.filter(event=self.event, status='U').count(), 50)
+
+    def test_invalid_scans(self):
+        response = self.client.post(reverse('validate-tickets-batch'), {'scans': [{'ticket_id': 'x'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class ScanManifestViewTest(TestCase):
+    """ Testing: ScanManifestView
+        Dependencies: User, Club, Event, Ticket, DeletedTicket
+        Url Name: scanner-manifest """
+    def setUp(self):
+        self.client = APIClient()
+        self.club = Club.objects.create(name='Test Club')
+        self.event = Event.objects.create(
+            title='Test Event', 
+            description='This is a test event.', 
+            price=10.0,
+            date='2021-01-01',
+            time='12:00:00',
+            capacity=100,
+            location='Test Location',
+            club=self.club)
+        self.ticket_scanner = User.objects.create_user(username='ticketscanner', email='ticketscanner@example.com', password='testpass', user_type='ticket_scanner', event=self.event)
+        self.tickets = []
+        for n, ticket_status in enumerate(['A', 'U', 'C', 'A']):
+            user = User.objects.create_user(username=f'ticketuser{n}', email=f'ticketuser{n}@example.com', password='testpass', first_name=f'First{n}', last_name=f'Last{n}', student_id=f'10000{n}')
+            self.tickets.append(Ticket.objects.create(title='Test Ticket', code=f'code{n}', price=10.0, status=ticket_status, user=user, event=self.event))
+        # Tickets sold an hour ago
+        Ticket.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        self.client.force_authenticate(user=self.ticket_scanner)
+
+    def test_full_manifest(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('scanner-manifest'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        manifest = response.data
+        self.assertTrue(manifest['full'])
+        self.assertEqual(manifest['count'], 3)
+        first = self.tickets[0].id
+        self.assertEqual(manifest['ids'], [first, 1, 2])
+        self.assertEqual(manifest['status'], 'AUA')
+        self.assertEqual(manifest['student_id'], ['100000', '100001', '100003'])
+        self.assertEqual(manifest['removed'], [])
+
+    def test_delta_manifest(self):
+        cursor = self.client.get(reverse('scanner-manifest')).data['cursor']
+        self.client.post(reverse('validate-ticket', kwargs={'ticket_id': self.tickets[0].id}))
+        self.tickets[3].status = 'R'
+        self.tickets[3].save()
+        deleted_id = self.tickets[1].id
+        self.tickets[1].delete()
+        response = self.client.get(reverse('scanner-manifest'), {'since': cursor})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        delta = response.data
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['ids'], [self.tickets[0].id])
+        self.assertEqual(delta['status'], 'U')
+        self.assertEqual(delta['removed'], sorted([deleted_id, self.tickets[3].id]))
+        self.assertTrue(DeletedTicket.objects.filter(ticket_id=deleted_id, event_id=self.event.id).exists())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('scanner-manifest'), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_cursor_gets_full_manifest(self):
+        self.tickets[1].delete()
+        DeletedTicket.objects.update(deleted_at=timezone.now() - timedelta(days=30))
+        call_command('prune_deleted_tickets', stdout=io.StringIO())
+        self.assertFalse(DeletedTicket.objects.exists())
+        cursor = encode_cursor(timezone.now() - timedelta(days=31))
+        response = self.client.get(reverse('scanner-manifest'), {'since': cursor})
+        self.assertTrue(response.data['full'])
+        self.assertEqual(response.data['count'], 2)
+
 class RetrieveEventTicketsViewTest(TestCase):
+    """ Testing: RetrieveEventTicketsView
+        Dependencies: User, Club, Event, Ticket, DeletedTicket
+        Url Name: scanner-event-tickets """
     def setUp(self):
         self.client = APIClient()
         self.club_admin = User.objects.create_user(username='clubadmin', email='clubadmin@example.com', password='testpass')
@@ -268,4 +559,63 @@ class RetrieveEventTicketsViewTest(TestCase):
     def test_retrieve_event_tickets_no_tickets_found(self):
         self.ticket.delete()
         response = self.client.get(reverse('scanner-event-tickets'))
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def add_tickets(self, count):
+        start = User.objects.count()
+        users = User.objects.bulk_create([User(username=f'bulk{n}', email=f'bulk{n}@example.com') for n in range(start, start + count)])
+        return Ticket.objects.bulk_create([
+            Ticket(title='Test Ticket', code=f'code-{user.username}', price=10.0, status='U', scanned_at=timezone.now(), scanned_by=self.ticket_scanner, user=user, event=self.event)
+            for user in users
+        ])
+
+    def test_retrieve_event_tickets_query_count(self):
+        self.add_tickets(5)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('scanner-event-tickets'))
+        self.assertEqual(len(response.data['used_tickets']), 5)
+        self.add_tickets(30)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('scanner-event-tickets'))
+        self.assertEqual(len(response.data['used_tickets']), 35)
+        self.assertEqual(response.data['used_tickets'][0]['scanned_by'], 'ticketscanner')
+
+    def test_retrieve_event_tickets_pagination(self):
+        self.add_tickets(4)
+        response = self.client.get(reverse('scanner-event-tickets'), {'page_size': 3})
+        self.assertEqual(len(response.data['active_tickets']) + len(response.data['used_tickets']), 3)
+        self.assertIsNone(response.data['previous'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['used_tickets']), 2)
+        self.assertIsNone(response.data['next'])
+
+    def test_retrieve_event_tickets_changed_since(self):
+        Ticket.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        changed_since = self.client.get(reverse('scanner-event-tickets')).data['changed_since']
+        response = self.client.get(reverse('scanner-event-tickets'), {'changed_since': changed_since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['active_tickets'], [])
+        self.client.post(reverse('validate-ticket', kwargs={'ticket_id': self.ticket.id}))
+        response = self.client.get(reverse('scanner-event-tickets'), {'changed_since': changed_since})
+        self.assertEqual([ticket['id'] for ticket in response.data['used_tickets']], [self.ticket.id])
+        self.assertEqual(response.data['deleted_tickets'], [])
+
+    def test_retrieve_event_tickets_invalid_changed_since(self):
+        response = self.client.get(reverse('scanner-event-tickets'), {'changed_since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_event_tickets_expired_changed_since(self):
+        changed_since = encode_cursor(timezone.now() - timedelta(days=31))
+        response = self.client.get(reverse('scanner-event-tickets'), {'changed_since': changed_since})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_retrieve_event_tickets_naive_changed_since(self):
+        Ticket.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        changed_since = timezone.localtime(timezone.now() - timedelta(minutes=30)).replace(tzinfo=None).isoformat()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            response = self.client.get(reverse('scanner-event-tickets'), {'changed_since': changed_since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['active_tickets'], [])
+        response = self.client.get(reverse('scanner-event-tickets'), {'changed_since': '2024-13-45T99:00:00'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
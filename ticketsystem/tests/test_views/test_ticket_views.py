@@ -1,8 +1,11 @@
+from django.db import IntegrityError
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
-from ticketsystem.models import User, Club, Event, Ticket
+from ticketsystem.models import User, Club, Event, Ticket, EventInventory
+from ticketsystem.qr import qr_cache, QRCodeCache, signed_qr_url
+from ticketsystem.codes import code_pool
 
 from unittest.mock import patch
 
@@ -42,6 +45,32 @@ class TicketViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['detail'], 'A ticket already exists for this user')
 
+    def test_create_ticket(self):
+        User.objects.create_user(username='otheruser', email='otheruser@example.com', password='testpass')
+        response = self.client.post(reverse('ticket-list'), {'user': 'otheruser', 'event': self.event.id, 'title': 'Test Ticket 2'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        ticket = Ticket.objects.get(id=response.data['id'])
+        self.assertFalse(ticket.qr_code)
+
+    def test_retrieve_ticket_qr_code_url(self):
+        response = self.client.get(reverse('ticket-detail', kwargs={'pk': self.ticket.id}))
+        self.assertIn(reverse('ticket-qr-code', kwargs={'ticket_id': self.ticket.id, 'image_format': 'png'}) + '?', response.data['qr_code'])
+        self.assertIn('signature=', response.data['qr_code'])
+
+    def test_create_ticket_sold_out(self):
+        self.event.capacity = 1
+        self.event.save()
+        other_user = User.objects.create_user(username='otheruser', email='otheruser@example.com', password='testpass')
+        response = self.client.post(reverse('ticket-list'), {'user': 'otheruser', 'event': self.event.id, 'title': 'Test Ticket 2'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['detail'], 'This event has sold out')
+        self.assertFalse(Ticket.objects.filter(user=other_user).exists())
+        self.assertEqual(EventInventory.objects.get(event=self.event).sold, 1)
+
+    def test_delete_ticket_releases_seat(self):
+        self.ticket.delete()
+        self.assertEqual(EventInventory.objects.get(event=self.event).sold, 0)
+
 class UserTicketsViewTest(APITestCase):
     """ Testing: UserTicketsView
         Dependencies: Ticket, User
@@ -99,4 +128,171 @@ class UserHasTicketViewTest(APITestCase):
     def test_user_has_ticket(self):
         response = self.client.get(reverse('user-has-ticket-for-event', kwargs={'user_id': self.user.id, 'event_id': self.event.id}))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['has_ticket'], True)
\ No newline at end of file
+        self.assertEqual(response.data['has_ticket'], True)
+
+
+class TicketQRCodeViewTest(APITestCase):
+    """ Testing: TicketQRCodeView
+        Dependencies: Ticket, User, Event
+        Url Name: ticket-qr-code """
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+        self.club = Club.objects.create(name='Test Club', description='This is a test club.', email='testclub@example.com')
+        self.event = Event.objects.create(
+            title='Test Event', 
+            description='This is a test event.', 
+            price=10.0,
+            date='2021-01-01',
+            time='12:00:00',
+            capacity=100,
+            location='Test Location',
+            club=self.club)
+        self.ticket = Ticket.objects.create(title='Test Ticket', code='1234567890', price=10.0, status='A', user=self.user, event=self.event)
+        self.client.force_authenticate(user=self.user)
+        qr_cache.clear()
+
+    def test_png(self):
+        response = self.client.get(reverse('ticket-qr-code', kwargs={'ticket_id': self.ticket.id, 'image_format': 'png'}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        self.assertTrue(response['ETag'].startswith('"'))
+
+    def test_svg(self):
+        response = self.client.get(reverse('ticket-qr-code', kwargs={'ticket_id': self.ticket.id, 'image_format': 'svg'}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', response.content)
+
+    def test_not_modified(self):
+        url = reverse('ticket-qr-code', kwargs={'ticket_id': self.ticket.id, 'image_format': 'png'})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_if_none_match_is_parsed(self):
+        url = reverse('ticket-qr-code', kwargs={'ticket_id': self.ticket.id, 'image_format': 'png'})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"other", {etag}')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # A header containing the ETag as a substring is not a match
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"x{etag[1:]}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_signed_url(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('ticket-qr-code', kwargs={'ticket_id': self.ticket.id, 'image_format': 'png'}))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(signed_qr_url(self.ticket.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Cache-Control'].startswith('public'))
+
+    def test_signed_url_tampered_or_expired(self):
+        self.client.force_authenticate(user=None)
+        url = signed_qr_url(self.ticket.id)
+        response = self.client.get(url.replace('png', 'svg', 1))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        with patch('ticketsystem.qr.time.time', return_value=10 ** 11):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_not_owner(self):
+        other_user = User.objects.create_user(username='otheruser', email='otheruser@example.com', password='testpass')
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(reverse('ticket-qr-code', kwargs={'ticket_id': self.ticket.id, 'image_format': 'png'}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_format(self):
+        response = self.client.get(reverse('ticket-qr-code', kwargs={'ticket_id': self.ticket.id, 'image_format': 'gif'}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cache_is_bounded(self):
+        cache = QRCodeCache(max_bytes=10)
+        cache.set('a', b'12345')
+        cache.set('b', b'12345')
+        cache.get('a')
+        cache.set('c', b'12345')
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.size, 10)
+
+class BulkIssueTicketsViewTest(APITestCase):
+    """ Testing: BulkIssueTicketsView
+        Dependencies: Ticket, User, Event, Club, EventInventory
+        Url Name: bulk-issue-tickets """
+    def setUp(self):
+        self.admin = User.objects.create_user(username='clubadmin', email='clubadmin@example.com', password='testpass')
+        self.club = Club.objects.create(name='Test Club', description='This is a test club.', email='testclub@example.com')
+        self.club.club_admins.add(self.admin)
+        self.event = Event.objects.create(
+            title='Test Event', 
+            description='This is a test event.', 
+            price=10.0,
+            date='2021-01-01',
+            time='12:00:00',
+            capacity=3,
+            location='Test Location',
+            club=self.club)
+        self.users = [
+            User.objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='testpass', student_id=f'1000{n}')
+            for n in range(4)
+        ]
+        code_pool.clear()
+        Ticket.objects.create(title='Test Ticket', code='1234567890', price=10.0, user=self.users[0], event=self.event)
+        self.url = reverse('bulk-issue-tickets', kwargs={'event_id': self.event.id})
+        self.client.force_authenticate(user=self.admin)
+
+    def test_bulk_issue(self):
+        response = self.client.post(self.url, {'users': ['user1', '10002'], 'price': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([row['user'] for row in response.data['issued']], ['user1', '10002'])
+        self.assertEqual(response.data['failed'], [])
+        self.assertTrue(Ticket.objects.filter(user=self.users[2], event=self.event, price=0).exists())
+        self.assertEqual(EventInventory.objects.get(event=self.event).sold, 3)
+
+    def test_bulk_issue_failures(self):
+        response = self.client.post(self.url, {'users': ['user0', 'nobody', 'user1', '10001', 'user2', 'user3']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([row['user'] for row in response.data['issued']], ['user1', 'user2'])
+        self.assertEqual(response.data['failed'], [
+            {'user': 'user0', 'detail': 'A ticket already exists for this user'},
+            {'user': 'nobody', 'detail': 'User does not exist'},
+            {'user': '10001', 'detail': 'A ticket already exists for this user'},
+            {'user': 'user3', 'detail': 'This event has sold out'},
+        ])
+        self.assertEqual(EventInventory.objects.get(event=self.event).sold, 3)
+
+    def test_bulk_issue_query_count(self):
+        self.event.capacity = 100
+        self.event.save()
+        more_users = [User(username=f'bulk{n}', email=f'bulk{n}@example.com') for n in range(50)]
+        User.objects.bulk_create(more_users)
+        # Warm pool, minting a batch is a single insert
+        code_pool.refill(code_pool.mint(50))
+        with self.assertNumQueries(10):
+            response = self.client.post(self.url, {'users': [user.username for user in more_users]}, format='json')
+        self.assertEqual(len(response.data['issued']), 50)
+
+    def test_bulk_issue_invalid_price(self):
+        for price in (-1, 'free'):
+            response = self.client.post(self.url, {'users': ['user1'], 'price': price}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['detail'], 'Invalid price')
+        self.assertFalse(Ticket.objects.filter(user=self.users[1]).exists())
+
+    def test_bulk_issue_conflict_releases_codes_and_seats(self):
+        code_pool.refill(code_pool.mint(2))
+        sold = EventInventory.objects.get(event=self.event).sold
+        with patch('ticketsystem.views.ticket_views.Ticket.objects.bulk_create', side_effect=IntegrityError):
+            response = self.client.post(self.url, {'users': ['user1', 'user2']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(len(code_pool.codes), 2)
+        self.assertEqual(EventInventory.objects.get(event=self.event).sold, sold)
+
+    def test_bulk_issue_not_club_admin(self):
+        self.client.force_authenticate(user=self.users[1])
+        response = self.client.post(self.url, {'users': ['user1']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -273,4 +273,17 @@ class AcceptTransferRequestTest(APITestCase):
         self.assertEqual(response.data['detail'], 'Transfer request accepted')
         self.assertTrue(Ticket.objects.filter(user=self.user2, event=self.event).exists())
         self.assertFalse(Ticket.objects.filter(id=self.ticket.id).exists())
-        self.assertFalse(TransferRequest.objects.filter(id=self.transfer_request.id).exists())
\ No newline at end of file
+        self.assertFalse(TransferRequest.objects.filter(id=self.transfer_request.id).exists())
+        # The receiver's ticket keeps the purchase date, the transfer is recorded separately
+        ticket = Ticket.objects.get(user=self.user2, event=self.event)
+        self.assertEqual(ticket.order_date, self.ticket.order_date)
+        self.assertIsNotNone(ticket.transferred_at)
+
+    def test_accept_transfer_request_full_event(self):
+        self.event.capacity = 1
+        self.event.save()
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.post(reverse('accept-transfer-request', kwargs={'request_id': self.transfer_request.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(Ticket.objects.filter(user=self.user2, event=self.event).exists())
+        self.assertEqual(self.event.inventory.sold, 1)
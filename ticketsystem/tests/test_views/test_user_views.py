@@ -1,8 +1,9 @@
 from django.urls import reverse
 from django.test import TestCase
+from django.core.cache import cache
 from rest_framework.test import APIClient
 from rest_framework import status
-from ticketsystem.models import User, Profile
+from ticketsystem.models import User, Profile, Friend, Club, Follow
 from rest_framework.authtoken.models import Token
 
 class UserViewSetTest(TestCase):
@@ -51,6 +52,7 @@ class UserNameViewTest(TestCase):
         Dependencies: User
         Url Name: public-usernames """
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass', user_type='user')
         self.client.force_authenticate(user=self.user)
@@ -67,6 +69,53 @@ class UserNameViewTest(TestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['username'], 'testuser')
 
+    def add_user(self, username, first_name='', last_name=''):
+        return User.objects.create_user(username=username, email=f'{username}@example.com', password='testpass',
+                                        first_name=first_name, last_name=last_name, user_type='user')
+
+    def search(self, query):
+        return [user['username'] for user in self.client.get(reverse('public-usernames'), {'username': query}).data]
+
+    def test_ranking(self):
+        self.add_user('xanna')
+        self.add_user('annabel')
+        self.add_user('bob', first_name='Anna')
+        self.add_user('ann')
+        self.add_user('zed', last_name='Hannah')
+        friend = self.add_user('annie')
+        Friend.objects.create(sender=self.user, receiver=friend, status=True)
+        club = Club.objects.create(name='Test Club', email='testclub@example.com')
+        Follow.objects.create(user=self.user, club=club)
+        Follow.objects.create(user=User.objects.get(username='annabel'), club=club)
+        self.add_user('annb')
+        # The username, prefixes with friends then shared clubs first, name prefixes, substrings
+        self.assertEqual(self.search('Ann'), ['ann', 'annie', 'annabel', 'annb', 'bob', 'xanna', 'zed'])
+
+    def test_substring_follows_renames(self):
+        user = self.add_user('someone', last_name='Smith')
+        self.assertEqual(self.search('mit'), ['someone'])
+        user.last_name = 'Jones'
+        user.save()
+        cache.clear()
+        self.assertEqual(self.search('mit'), [])
+        self.assertEqual(self.search('one'), ['someone'])
+        user.delete()
+        cache.clear()
+        self.assertEqual(self.search('one'), [])
+
+    def test_result_limit(self):
+        for n in range(15):
+            self.add_user(f'member{n:02}')
+        self.assertEqual(self.search('member'), [f'member{n:02}' for n in range(10)])
+
+    def test_candidates_are_cached(self):
+        self.add_user('member')
+        Friend.objects.create(sender=self.user, receiver=self.add_user('friend'), status=True)
+        self.search('mem')
+        # Friends matching the query, clubs followed by both
+        with self.assertNumQueries(2):
+            self.search('mem')
+
 class UserPublicProfileViewTest(TestCase):
     """ Testing: UserPublicProfileView
         Dependencies: User, Profile
@@ -43,10 +43,17 @@ urlpatterns = [
     path('ticket-scanner-users/<int:id>/delete/', TicketScannerUserDeleteView.as_view(), name='ticket-scanner-user-delete'),
     path('ticket-scanner-users/<int:id>/reset-password/', TicketScannerUserPasswordResetView.as_view(), name='ticket-scanner-user-reset-password'),
     path('validate-ticket/<int:ticket_id>/', ValidateTicketView.as_view(), name='validate-ticket'),
+    path('validate-ticket/', ValidateTicketView.as_view(), name='validate-ticket-qr'),
+    path('validate-tickets/batch/', BatchScanView.as_view(), name='validate-tickets-batch'),
+    path('scanner/event-key/', ScannerEventKeyView.as_view(), name='scanner-event-key'),
+    path('scanner/manifest/', ScanManifestView.as_view(), name='scanner-manifest'),
+    path('event/<int:event_id>/checkins/stream/', CheckinStreamView.as_view(), name='checkin-stream'),
     path('scanner/event-tickets/', RetrieveEventTicketsView.as_view(), name='scanner-event-tickets'),
 
     # Tickets
     path('user/<int:user_id>/tickets/', UserTicketsView.as_view(), name='user-tickets'),
+    path('ticket/<int:ticket_id>/qr/<str:image_format>/', TicketQRCodeView.as_view(), name='ticket-qr-code'),
+    path('event/<int:event_id>/bulk-tickets/', BulkIssueTicketsView.as_view(), name='bulk-issue-tickets'),
     path('validate-ticket/<int:ticket_id>/user/<int:user_id>/', ValidateTicketView.as_view(), name='validate-ticket'),
     path('user/<int:user_id>/available-to-transfer-tickets/', AvailableToTransferTicketsView.as_view(), name='available-to-transfer-tickets'),
     path('user/<int:user_id>/has-ticket-for-event/<int:event_id>/', UserHasTicketView.as_view(), name='user-has-ticket-for-event'),
@@ -72,17 +79,22 @@ urlpatterns = [
     path('club/<int:club_id>/events/', ClubEventsView.as_view(), name='club-events'),
     path('user/<str:username>/events/', UserEventsView.as_view(), name='user-events'),
     path('event/<int:event_id>/soldout/', EventSoldOutView.as_view(), name='event-soldout'),
+    path('event/<int:event_id>/attendees/<str:export_format>/', EventAttendeesExportView.as_view(), name='event-attendees-export'),
+    path('event/<int:event_id>/friends-going/', FriendsGoingView.as_view(), name='event-friends-going'),
+    path('events/friends-going/', FriendsGoingView.as_view(), name='events-friends-going'),
 
     # Follows
     path('user/<int:user_id>/follows/<int:club_id>/', UserFollowsClubView.as_view(), name='user-follows-club'),
     path('user/<int:user_id>/follows/', UserFollowsView.as_view(), name='user-follows'),
     path('common-followed-clubs/<int:user_id1>/<str:username2>/', CommonClubsView.as_view(), name='common-followed-clubs'),
+    path('common-followed-clubs/<int:user_id1>/', CommonClubCountsView.as_view(), name='common-followed-clubs-counts'),
     
     # Friends
     path('user/<int:user_id>/friends/<str:friendship_status>/', UserFriends.as_view(), name='user-friends'),
     path('user/<int:user1>/friendship/<str:username2>/', ManageFriendship.as_view(), name='manage-friendship'),
     path('create-friend-request/', CreateFriendRequest.as_view(), name='create-friend-request'),
     path('common-friends/<int:user_id1>/<str:username2>/', CommonFriendsView.as_view(), name='common-friends'),
+    path('friend-suggestions/', FriendSuggestionsView.as_view(), name='friend-suggestions'),
         
     # Stripe
     path('stripe-account/club/<int:club_id>/', StripeAccountClubView.as_view(), name='club-stripe-account'),
@@ -105,4 +117,5 @@ urlpatterns = [
     # Stats
     path('stats/club/<int:club_id>/event-user-year/', StatEventsYearView.as_view(), name='stats-event-user-year'),
     path('stats/club/<int:club_id>/followers/', StatClubFollowersView.as_view(), name='stats-club-followers'),
+    path('stats/event/<int:event_id>/sales/', StatEventSalesView.as_view(), name='stats-event-sales'),
 ]
@@ -2,8 +2,6 @@ from django.conf import settings
 
 import os
 import io
-import random
-import string
 import stripe
 import qrcode
 from datetime import datetime
@@ -46,14 +44,9 @@ def ticketQRCodeGenerator(ticket_id):
     return img_io
 
 def ticketCodeGenerator():
-    # Generate a random string of length 6
-
-    letters = string.ascii_lowercase
-    numbers = string.digits
-    code1 = ''.join(random.choice(letters + numbers) for i in range(6))
-    code2 = ''.join(random.choice(letters + numbers) for i in range(6))
-    code3 = ''.join(random.choice(letters + numbers) for i in range(6))
-    return code1 + '-' + code2 + '-' + code3
+    # Take a reserved code from the pool, see codes.py
+    from .codes import code_pool
+    return code_pool.take()
 
 def get_stripe_accountid(user_email):
         accounts = stripe.Account.list()
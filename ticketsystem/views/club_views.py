@@ -20,6 +20,9 @@ class ClubViewSet(viewsets.ModelViewSet):
     serializer_class = ClubSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        return ClubSerializer.plan(Club.objects.all())
+
 class CreateClubView(APIView):
     permission_classes = [IsAuthenticated]
     # This had its own class because we were assigning a second
@@ -188,17 +191,27 @@ class UserFollowsView(APIView):
         return Response(serializer.data)
 
 class CommonClubsView(APIView):
-    def get(self, request, user_id1, username2, format=None):
-        """ Return a list of common clubs between two users """
-        user1 = get_object_or_404(User, id=user_id1)
-        user2 = get_object_or_404(User, username=username2)
+    permission_classes = [IsAuthenticated]
 
-        # Get clubs of user1
-        user1_clubs = Follow.objects.filter(user=user1).values_list('club', flat=True)
-        # Get clubs of user2 that are also clubs of user1
-        common_clubs = Follow.objects.filter(user=user2, club__in=user1_clubs)
+    def get(self, request, user_id1, username2, format=None):
+        """ Return a list of common clubs between two users, by name """
+        if not User.objects.filter(id=user_id1).exists():
+            return Response({'detail': 'User does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        user2 = get_object_or_404(User.objects.only('id'), username=username2)
 
-        # Extract the club from each follow
-        common_clubs = set(follow.club for follow in common_clubs)
+        # The club admins of every club are serialized, read them in one query
+        common_clubs = Follow.objects.common_clubs(user_id1, user2.id).prefetch_related('club_admins')
         serializer = ClubSerializer(common_clubs, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+class CommonClubCountsView(APIView):
+    permission_classes = [IsAuthenticated]
+    # Usernames of one request, a page of a friend list or of search results
+    MAX_USERNAMES = 100
+
+    def get(self, request, user_id1, format=None):
+        """ Return {username: number of clubs followed by both} for each user of ?usernames=a,b,c, in one query """
+        usernames = list(dict.fromkeys(username for username in request.query_params.get('usernames', '').split(',') if username))
+        if not usernames or len(usernames) > self.MAX_USERNAMES:
+            return Response({'detail': f'Give between 1 and {self.MAX_USERNAMES} usernames'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(Follow.objects.common_club_counts(user_id1, usernames), status=status.HTTP_200_OK)
@@ -2,9 +2,9 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.contrib.auth.models import User
-from ticketsystem.models import Club, Event, Ticket, Profile, Follow
-from ..serializers.stats_serializers import EventYearDataSerializer, ClubFollowersDataSerializer
+from ticketsystem.models import Club, Event, FollowerRollup
+from ..stats import club_event_year_breakdown, sales_series, GRANULARITIES
+from ..serializers.stats_serializers import EventYearDataSerializer, ClubFollowersDataSerializer, EventSalesDataSerializer
 
 from collections import defaultdict
 
@@ -15,41 +15,14 @@ class StatEventsYearView(APIView):
         # Check if the user is a club admin
         try:
             club = Club.objects.get(id=club_id)
-            if request.user != club.admin:
+            if not club.club_admins.filter(id=request.user.id).exists():
                 return Response({'detail': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
         except Club.DoesNotExist:
             return Response({'detail': 'Club does not exist'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Get all the events from the club
-        events = Event.objects.filter(club=club)
-
-        # Initialize the data list
-        data = []
-
-        # For each event, get all the tickets
-        for event in events:
-            tickets = Ticket.objects.filter(event=event)
-
-            # Initialize the year count dictionary
-            year_count = {f'year{year}': 0 for year in range(1, 7)}
-
-            # For each ticket, get the user's year from the Profile table
-            for ticket in tickets:
-                user = ticket.user
-                profile = Profile.objects.get(user=user)
-                year = f'year{profile.year}'
-
-                # Increment the year count
-                year_count[year] += 1
-
-            # Serialize the data
-            event_data = {'event_title': event.title, 'year_data': year_count}
-            serializer = EventYearDataSerializer(data=event_data)
-            if serializer.is_valid():
-                data.append(serializer.validated_data)
-
-        # Return the data
-        return Response(data, status=status.HTTP_200_OK)
+        # Year breakdown of the ticket holders of every event, one grouped query cached per club
+        serializer = EventYearDataSerializer(club_event_year_breakdown(club.id), many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 class StatClubFollowersView(APIView):
     permission_classes = [IsAuthenticated]
@@ -58,36 +31,40 @@ class StatClubFollowersView(APIView):
         # Check if the user is a club admin
         try:
             club = Club.objects.get(id=club_id)
-            if request.user not in club.club_admins.all():
+            if not club.club_admins.filter(id=request.user.id).exists():
                 return Response({'detail': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
         except Club.DoesNotExist:
             return Response({'detail': 'Club does not exist'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Get all the followers of the club
-        follows = Follow.objects.filter(club=club)
-
-        # Initialize the year and course count dictionaries
+        # Follower counts come from the rollup kept by the Follow and Profile signals, one row per year and course
         year_count = {f'year{year}': 0 for year in range(1, 7)}
         course_count = defaultdict(int)
+        for year, course, count in FollowerRollup.objects.filter(club=club, count__gt=0).values_list('year', 'course', 'count'):
+            # Followers without a year set are only counted by course
+            if f'year{year}' in year_count:
+                year_count[f'year{year}'] += count
+            course_count[course] += count
 
-        # For each follower, get the user's year and course from the Profile table
-        for follow in follows:
-            follower = follow.user
-            profile = Profile.objects.get(user=follower)
-            year = f'year{profile.year}'
-            course = profile.course
+        # Serialize the data
+        serializer = ClubFollowersDataSerializer({'club_name': club.name, 'year_data': year_count, 'course_data': course_count})
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-            # Increment the year and course counts
-            year_count[year] += 1
-            course_count[course] += 1
+class StatEventSalesView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        # Serialize the data
-        club_data = {'club_name': club.name, 'year_data': year_count, 'course_data': course_count}
-        serializer = ClubFollowersDataSerializer(data=club_data)
-        if serializer.is_valid():
-            data = serializer.validated_data
-        else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    def get(self, request, event_id, format=None):
+        """ Tickets sold and transferred per minute, hour or day (?granularity=, hour by default) """
+        granularity = request.query_params.get('granularity', 'hour')
+        if granularity not in GRANULARITIES:
+            return Response({'detail': 'Granularity must be minute, hour or day'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Check if the user is an admin of the club of the event
+        try:
+            event = Event.objects.only('id', 'capacity', 'club_id').get(id=event_id)
+            if not Club.objects.filter(id=event.club_id, club_admins=request.user).exists():
+                return Response({'detail': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+        except Event.DoesNotExist:
+            return Response({'detail': 'Event does not exist'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Return the data
-        return Response(data, status=status.HTTP_200_OK)
\ No newline at end of file
+        serializer = EventSalesDataSerializer(sales_series(event, granularity))
+        return Response(serializer.data, status=status.HTTP_200_OK)
@@ -1,20 +1,73 @@
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
 
 from rest_framework import viewsets, status
-from django.db.models import Count
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
-from ..models import Event, User, Follow
-from ..serializers.event_serializers import EventSerializer
-from rest_framework.pagination import PageNumberPagination
+from ..models import Event, EventInventory, User, Follow, Club
+from ..export import EXPORT_FORMATS, iterate_async
+from ..friends import friends_going
+from ..feed import newest_after, home_feed
+from ..serializers.event_serializers import EventSerializer, EventFriendsGoingSerializer
+from ..serializers.friend_serializers import FriendGoingSerializer
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+
+
+import base64
+import datetime
 
 class EventPagination(PageNumberPagination):
     """ Pagination for events """
     page_size = 6
 
+class EventKeysetPagination(BasePagination):
+    """ Keyset pagination for event feeds, newest first. The cursor is the (date, time, id) of the last event
+    of a page and the next page is read from the (date, time, id) index right after it, so a deep page costs
+    the same as the first and events of the same date and time are never skipped or repeated """
+    page_size = 6
+    cursor_query_param = 'cursor'
+
+    def encode_cursor(self, event):
+        position = f'{event.date.isoformat()},{event.time.isoformat()},{event.id}'
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            date, time, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(',')
+            return datetime.date.fromisoformat(date), datetime.time.fromisoformat(time), int(event_id)
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_events(lambda position, size: list(newest_after(queryset, position)[:size]), request)
+
+    def paginate_events(self, read, request):
+        """ A page of read(position, size), up to size events after the (date, time, id) position of the
+        cursor, None on the first page, newest first """
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        page = read(self.decode_cursor(cursor) if cursor else None, self.page_size + 1)
+        self.next_event = page[self.page_size - 1] if len(page) > self.page_size else None
+        return page[:self.page_size]
+
+    def get_next_link(self):
+        if self.next_event is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.next_event))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+def event_serializer_class(request):
+    """ EventSerializer, with the friends going to each event when the request asks for them (?friends_going=true) """
+    return EventFriendsGoingSerializer if request.query_params.get('friends_going') == 'true' else EventSerializer
+
 class EventViewSet(viewsets.ModelViewSet):
     queryset = Event.objects.all()
     model = Event
@@ -22,37 +75,35 @@ class EventViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     pagination_class = EventPagination
 
+    def get_serializer_class(self):
+        return event_serializer_class(self.request)
+
     def get_queryset(self):
-        """ Return events sorted by date """
-        return Event.objects.order_by('-date')
+        """ Return events sorted by date, with the clubs the serializer reads """
+        return EventSerializer.plan(Event.objects.order_by('-date'))
 
     @action(detail=False, methods=['get'])
     def paginated(self, request):
-        """ Return paginated events sorted by date """
-        events = self.get_queryset()
-        page = self.paginate_queryset(events)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(events, many=True)
-        return Response(serializer.data)
+        """ Return paginated events, newest first. By cursor (keyset), ?page= for numbered pages """
+        events = newest_after(EventSerializer.plan(Event.objects.all()))
+        paginator = EventPagination() if 'page' in request.query_params else EventKeysetPagination()
+        page = paginator.paginate_queryset(events, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def followed_clubs(self, request):
-        """ Return events for clubs that the user follows. Paginated and ordered by date """
-        followed_clubs = Follow.objects.filter(user=request.user).values_list('club', flat=True)
-        events = Event.objects.filter(club__in=followed_clubs).order_by('-date')
-
-        page = self.paginate_queryset(events)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(events, many=True)
-        return Response(serializer.data)
-
-
+        """ Return events for clubs that the user follows, newest first. Pages by cursor are read from the
+        user's home feed, ?page= for numbered pages """
+        if 'page' in request.query_params:
+            followed_clubs = Follow.objects.filter(user=request.user).values_list('club', flat=True)
+            paginator = EventPagination()
+            page = paginator.paginate_queryset(newest_after(EventSerializer.plan(Event.objects.filter(club__in=followed_clubs))), request, view=self)
+        else:
+            paginator = EventKeysetPagination()
+            page = paginator.paginate_events(lambda position, size: home_feed(request.user.id, position, size), request)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 class ClubEventsView(APIView):
     """ Optimised: True
@@ -60,9 +111,10 @@ class ClubEventsView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, club_id, format=None):
-        """ Return a list of events that the club hosts """
-        events = Event.objects.filter(club_id=club_id).select_related('club')
-        serializer = EventSerializer(events, many=True, context={'request': request})
+        """ Return a list of events that the club hosts, ?friends_going=true adds the friends going to each """
+        serializer_class = event_serializer_class(request)
+        events = serializer_class.plan(Event.objects.filter(club_id=club_id))
+        serializer = serializer_class(events, many=True, context={'request': request})
         return Response(serializer.data)
 
 class UserEventsView(APIView):
@@ -75,20 +127,66 @@ class UserEventsView(APIView):
         user = get_object_or_404(User, username=username)
 
         # Get active and used events directly
-        events_active = Event.objects.filter(ticket__user=user, ticket__status='A').select_related('club')
-        events_used = Event.objects.filter(ticket__user=user, ticket__status='U').select_related('club')
+        serializer_class = event_serializer_class(request)
+        events_active = serializer_class.plan(Event.objects.filter(ticket__user=user, ticket__status='A'))
+        events_used = serializer_class.plan(Event.objects.filter(ticket__user=user, ticket__status='U'))
 
-        serializer_active = EventSerializer(events_active, many=True, context={'request': request})
-        serializer_used = EventSerializer(events_used, many=True, context={'request': request})
+        serializer_active = serializer_class(events_active, many=True, context={'request': request})
+        serializer_used = serializer_class(events_used, many=True, context={'request': request})
         return Response({'active': serializer_active.data, 'used': serializer_used.data}, status=status.HTTP_200_OK)
 
 class EventSoldOutView(APIView):
     def get(self, request, event_id, format=None):
         """ Return if the event is sold out """
-        try:
-            event = Event.objects.filter(id=event_id).annotate(tickets_sold=Count('ticket')).get()
-        except Event.DoesNotExist:
+        if not Event.objects.filter(id=event_id).exists():
             return Response({'detail': 'Event does not exist'}, status=status.HTTP_404_NOT_FOUND)
 
-        sold_out = event.tickets_sold >= event.capacity
-        return Response({'sold_out': sold_out}, status=status.HTTP_200_OK)
\ No newline at end of file
+        # Read the inventory counter instead of counting the tickets
+        sold_out = EventInventory.objects.is_sold_out(event_id)
+        return Response({'sold_out': sold_out}, status=status.HTTP_200_OK)
+
+class EventAttendeesExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, event_id, export_format, format=None):
+        """ Stream the attendees of an event as csv or columns (JSON lines of column batches), for the club admins.
+        Memory use does not grow with the event, rows are read and sent in batches """
+        if export_format not in EXPORT_FORMATS:
+            return Response({'detail': 'Export format must be csv or columns'}, status=status.HTTP_400_BAD_REQUEST)
+        event = get_object_or_404(Event.objects.only('id', 'club_id'), id=event_id)
+        if not Club.objects.filter(id=event.club_id, club_admins=request.user).exists():
+            return Response({'detail': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        chunks, content_type, extension = EXPORT_FORMATS[export_format]
+        content = chunks(event.id)
+        if isinstance(request._request, ASGIRequest):
+            content = iterate_async(content)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="event-{event.id}-attendees.{extension}"'
+        return response
+
+class FriendsGoingView(APIView):
+    permission_classes = [IsAuthenticated]
+    # Events of one batch request, a page of events
+    MAX_EVENTS = 50
+
+    def get(self, request, event_id=None, format=None):
+        """ Return the friends of the authenticated user holding a ticket for the event, or for each event
+        of ?events=1,2,3 as {event id: friends}. One query whatever the number of events """
+        if event_id is not None:
+            if not Event.objects.filter(id=event_id).exists():
+                return Response({'detail': 'Event does not exist'}, status=status.HTTP_404_NOT_FOUND)
+            going = friends_going(request.user.id, [event_id])
+            return Response(FriendGoingSerializer(going[event_id], many=True, context={'request': request}).data)
+
+        try:
+            event_ids = list(dict.fromkeys(int(event_id) for event_id in request.query_params.get('events', '').split(',') if event_id))
+        except ValueError:
+            return Response({'detail': 'events must be a comma separated list of event ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if not event_ids or len(event_ids) > self.MAX_EVENTS:
+            return Response({'detail': f'Give between 1 and {self.MAX_EVENTS} events'}, status=status.HTTP_400_BAD_REQUEST)
+        going = friends_going(request.user.id, event_ids)
+        return Response({
+            event_id: FriendGoingSerializer(friends, many=True, context={'request': request}).data
+            for event_id, friends in going.items()
+        })
@@ -6,8 +6,11 @@ from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import CursorPagination
 
-from ..models import Friend, User
+from ..models import Friend, User, FriendSuggestion
+from ..friends import friend_graph, common_friend_ids
+from ..suggestions import top_k
 from ..serializers.friend_serializers import *
 
 # ====================================================================================================
@@ -18,27 +21,45 @@ class FriendViewSet(viewsets.ModelViewSet):
     serializer_class = FriendSerializer
     permission_classes = [IsAuthenticated]
 
+class FriendPagination(CursorPagination):
+    """ Cursor pagination for friend lists, newest friendship first """
+    ordering = '-created_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
 class UserFriends(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, user_id, friendship_status, format=None):
-        """ Return a list of friends of the user given the status (True: Friends, False: Pending request) """
+        """ Return a page of friends of the user given the status (True: Friends, False: Pending request),
+        newest first (accepted friendships are dated by their acceptance). ?search= filters by name.
+        One query per page, the friendships are joined with both users and their profiles, the friendship
+        statuses come from the cached friend graph of the authenticated user """
+        search = request.query_params.get('search')
         if friendship_status == 'accepted' or friendship_status == 'True':
-            friends = Friend.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id), status=True)
+            # The friend is the receiver of the requests the user sent and the sender of the others
+            sides = [('sender_id', 'receiver'), ('receiver_id', 'sender')]
+            friends = Friend.objects.filter(status=True)
         elif friendship_status == 'pending' or friendship_status == 'False':
-            friends = Friend.objects.filter(receiver_id=user_id, status=False)
+            sides = [('receiver_id', 'sender')]
+            friends = Friend.objects.filter(status=False)
         else:
             return Response({'detail': 'Invalid friendship status'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Get the ids of the friends
-        friend_ids = [friend.receiver_id if friend.sender_id == user_id else friend.sender_id for friend in friends]
 
-        # Get the users corresponding to the friends
-        users = User.objects.filter(id__in=friend_ids)
-        
-        # Use the new serializer here
+        match = Q()
+        for user_field, friend in sides:
+            side = Q(**{user_field: user_id})
+            if search:
+                side &= Q(**{f'{friend}__first_name__icontains': search}) | Q(**{f'{friend}__last_name__icontains': search}) | Q(**{f'{friend}__username__icontains': search})
+            match |= side
+        friends = FriendStatusSerializer.plan(friends.filter(match), 'sender', 'receiver')
+
+        paginator = FriendPagination()
+        page = paginator.paginate_queryset(friends, request, view=self)
+        users = [friend.receiver if friend.sender_id == user_id else friend.sender for friend in page]
         serializer = FriendStatusSerializer(users, many=True, context={'request': request})
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
 
 class CommonFriendsView(APIView):
     """ Optimised: True """
@@ -48,22 +69,33 @@ class CommonFriendsView(APIView):
         user1 = get_object_or_404(User, id=user_id1)
         user2 = get_object_or_404(User, username=username2)
 
-        user1_friend_ids = list(Friend.objects.filter(Q(sender=user1), status=True).values_list('receiver_id', flat=True)) + \
-                        list(Friend.objects.filter(Q(receiver=user1), status=True).values_list('sender_id', flat=True))
-        user2_friend_ids = list(Friend.objects.filter(Q(sender=user2), status=True).values_list('receiver_id', flat=True)) + \
-                        list(Friend.objects.filter(Q(receiver=user2), status=True).values_list('sender_id', flat=True))
-
-        common_friend_ids = set(user1_friend_ids).intersection(user2_friend_ids)
-
-        common_friend_ids.discard(request.user.id)
-        common_friend_ids.discard(user2.id)
+        # Both friend sets come from the friend graph cache
+        common_ids = common_friend_ids(user1.id, user2.id) - {request.user.id, user2.id}
 
         # Prefetch the Profile objects
-        common_friends = User.objects.filter(id__in=common_friend_ids).select_related('profile')
+        common_friends = User.objects.filter(id__in=common_ids).select_related('profile')
 
         serializer = CommonFriendsSerializer(common_friends, many=True, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+class FriendSuggestionsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, format=None):
+        """ Return the people the authenticated user may know, best first (?limit=, up to FRIEND_SUGGESTIONS_TOP_K).
+        Suggestions are precomputed, one indexed query reads them """
+        try:
+            limit = min(int(request.query_params.get('limit', top_k())), top_k())
+        except ValueError:
+            return Response({'detail': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+        suggestions = FriendSuggestion.objects.filter(user=request.user).select_related('candidate__profile').order_by('-score')[:max(limit, 0)]
+        # Requests made since the suggestions were computed are dropped, the graph is a cache read
+        graph = friend_graph(request.user.id)
+        known = graph.friends | graph.sent | graph.received
+        suggestions = [suggestion for suggestion in suggestions if suggestion.candidate_id not in known]
+        serializer = FriendSuggestionSerializer(suggestions, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 class CreateFriendRequest(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -82,7 +114,8 @@ class CreateFriendRequest(APIView):
         if sender == receiver:
             return Response({'detail': 'Users must be different'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Check if the request already exists (in either direction)
+        # Check if the request already exists (in either direction). Read from the table, not the cached friend
+        # graph: the row is created or accepted below and a stale answer would create a duplicate request
         friend_query = Friend.objects.filter(Q(sender=sender, receiver=receiver) | Q(sender=receiver, receiver=sender))
         if friend_query.exists():
             friend = friend_query.first()
@@ -91,6 +124,7 @@ class CreateFriendRequest(APIView):
             else:
                 # If the inverse request exists, we have to accept the request
                 friend.status = True
+                friend.created_at = timezone.now()  # Update from request creation to acceptance
                 friend.save()
                 return Response({'detail': 'Friend request accepted'}, status=status.HTTP_201_CREATED)
 
@@ -144,7 +178,7 @@ class ManageFriendship(APIView):
         if user2 is None:
             return Response({'detail': 'User does not exist'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Try to get the friendship
+        # Try to get the friendship, from the table as it is accepted below
         friend = Friend.objects.filter(sender_id=user2.id, receiver_id=user1).first()
         if friend is None:
             return Response({'detail': 'Friendship does not exist'}, status=status.HTTP_400_BAD_REQUEST)
@@ -1,18 +1,32 @@
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
 
 from rest_framework import status, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import CursorPagination
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
+import json
+import base64
+import asyncio
 from datetime import timedelta
 from collections import defaultdict
 
-from ..models import User, Event, Ticket
-from ..permissions import IsTicketScannerUser
-from ..serializers.scanner_serializers import TicketScannerCreateSerializer, TicketScannerUserPasswordResetSerializer, TicketScannerUserSerializer, TicketWithUserSerializer
+from ..models import User, Event, Ticket, DeletedTicket
+from ..broker import get_broker, checkin_channel, publish_checkin
+from ..permissions import IsTicketScannerUser, can_scan_event
+from ..authentication import QueryParamJWTAuthentication
+from ..manifest import CURSOR_OVERLAP, build_scan_manifest, encode_cursor, decode_cursor, cursor_expired
+from ..signing import PAYLOAD_VERSION, InvalidTicketPayload, event_key, parse_ticket_qr
+from ..codes import is_valid_ticket_code, canonical_code, accepts_legacy_codes
+from ..serializers.scanner_serializers import TicketScannerCreateSerializer, TicketScannerUserPasswordResetSerializer, TicketScannerUserSerializer, TicketWithUserSerializer, ScanSerializer
 
 # ====================================================================================================
 # Ticket Scanner API
@@ -87,22 +101,76 @@ class TicketScannerUserDeleteView(generics.DestroyAPIView):
             raise PermissionDenied('You do not have permission to delete this user')
         return user
 
+def checkin_message(ticket_id, scanned_at, scanned_by_id, first_name, last_name, student_id):
+    """ The message sent to the check-in stream of the event for a validated ticket """
+    return {
+        'ticket_id': ticket_id,
+        'scanned_at': scanned_at.isoformat(),
+        'scanned_by': scanned_by_id,
+        'first_name': first_name,
+        'last_name': last_name,
+        'student_id': student_id,
+    }
+
 class ValidateTicketView(APIView):
     permission_classes = [IsTicketScannerUser]
 
-    def post(self, request, ticket_id, format=None):
-        """ Validate a ticket. Ticket scanners can only validate tickets for the event they are assigned to """
-        ticket = get_object_or_404(Ticket, id=ticket_id)
-        if not ticket_id:
-            return Response({'detail': 'Ticket ID is required'}, status=status.HTTP_400_BAD_REQUEST)
-        # Check if the authenticated user is a scanner user and if they are associated with the event of the ticket
-        if not request.user.user_type == 'ticket_scanner' or request.user.event_id != ticket.event_id:
+    def post(self, request, ticket_id=None, format=None):
+        """ Validate a ticket. Ticket scanners can only validate tickets for the event they are assigned to.
+        The ticket is given by id in the url, as the scanned QR data in the body ({'qr': ...}) or as the
+        code typed in by hand ({'code': ...}) """
+        if not request.user.user_type == 'ticket_scanner':
             return Response({'detail': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-        if ticket.status == 'U':
-            # If the ticket was scanned less than 2 minutes ago, treat it as successfully validated
-            # Changed this to 10 seconds for testing purposes
+        code = None
+        if ticket_id is None and 'qr' not in request.data and 'code' in request.data:
+            code = str(request.data.get('code') or '').strip()
+            # Typos are caught by the check character before the database, codes issued before it are let through explicitly
+            if not is_valid_ticket_code(code) and not accepts_legacy_codes():
+                return Response({'detail': 'Invalid ticket code'}, status=status.HTTP_400_BAD_REQUEST)
+            code = canonical_code(code)
+            ticket_id = get_object_or_404(Ticket.objects.only('id'), code=code).id
+        if ticket_id is None:
+            data = request.data.get('qr')
+            if not data:
+                return Response({'detail': 'QR data is required'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                claims, ticket_id = parse_ticket_qr(data)
+            except InvalidTicketPayload:
+                return Response({'detail': 'Invalid ticket QR code'}, status=status.HTTP_400_BAD_REQUEST)
+            if claims:
+                # The signature was checked without the database, forged or foreign tickets stop here
+                if not can_scan_event(request.user, claims.event_id):
+                    return Response({'detail': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+                # The code changes when a ticket is transferred, so QR codes of old owners no longer match
+                ticket_id, code = claims.ticket_id, claims.code
+
+        # The common case, an active ticket of the scanner's event, is a single UPDATE ... RETURNING
+        attendee = Ticket.objects.mark_used(ticket_id, request.user.event_id, request.user.id, code=code)
+        if attendee:
+            first_name, last_name, student_id = attendee
+            publish_checkin(request.user.event_id, checkin_message(ticket_id, timezone.now(), request.user.id, *attendee))
+            return Response({
+                'detail': 'Ticket validated successfully', 
+                'first_name': first_name,
+                'last_name': last_name,
+                'student_id': student_id,
+                'ticket_status': 'active',
+                'scanned_ago': 'just now'}, 
+                status=status.HTTP_200_OK)
+
+        # Nothing was updated, find out why
+        tickets = Ticket.objects.select_related('user').filter(id=ticket_id)
+        if code is not None:
+            tickets = tickets.filter(code=code)
+        ticket = get_object_or_404(tickets)
+        # Check if the scanner is associated with the event of the ticket
+        if not can_scan_event(request.user, ticket.event_id):
+            return Response({'detail': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        if ticket.status == 'U' and ticket.scanned_at is not None:
             time_difference = timezone.now() - ticket.scanned_at
-            if time_difference <= timedelta(seconds=2):
+            # A scanner retrying its own scan within 2 seconds still gets the success response,
+            # any other scanner is told the ticket was already used
+            if time_difference <= timedelta(seconds=2) and ticket.scanned_by_id == request.user.id:
                 return Response({
                     'detail': 'Ticket validated successfully', 
                     'first_name': ticket.user.first_name,
@@ -111,55 +179,224 @@ class ValidateTicketView(APIView):
                     'ticket_status': 'active',
                     'scanned_ago': str(int(time_difference.total_seconds())) + ' seconds ago'}, 
                     status=status.HTTP_200_OK)
-            else:
-                return Response({
-                    'detail': 'Ticket already scanned', 
-                    'ticket_status': 'used', 
-                    'scanned_ago': str(int(time_difference.total_seconds() / 60)) + ' minutes ago'}, 
-                    status=status.HTTP_200_OK)
-        elif ticket.status == 'A':
-            ticket.status = 'U'
-            if ticket.scanned_at is None:
-                ticket.scanned_at = timezone.now()
-                ticket.scanned_by = request.user
-            ticket.save()
-            user = ticket.user
             return Response({
-                'detail': 'Ticket validated successfully', 
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'student_id': user.student_id,
-                'ticket_status': 'active',
-                'scanned_ago': 'just now'}, 
+                'detail': 'Ticket already scanned', 
+                'ticket_status': 'used', 
+                'scanned_ago': str(int(time_difference.total_seconds() / 60)) + ' minutes ago'}, 
                 status=status.HTTP_200_OK)
+        if ticket.status == 'U':
+            return Response({'detail': 'Ticket already scanned', 'ticket_status': 'used'}, status=status.HTTP_200_OK)
         return Response({'detail': 'Ticket is not active'}, status=status.HTTP_400_BAD_REQUEST)
 
+class BatchScanView(APIView):
+    permission_classes = [IsTicketScannerUser]
+    max_scans = 5000
+
+    def post(self, request, format=None):
+        """ Apply the scans a scanner buffered while offline, {'scans': [{'ticket_id', 'scanned_at', 'scanner'}]}.
+        The earliest scan of a ticket wins, returns the outcome of every scan in the order sent """
+        scans = request.data.get('scans')
+        if not isinstance(scans, list) or not scans:
+            return Response({'detail': 'A list of scans is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(scans) > self.max_scans:
+            return Response({'detail': f'At most {self.max_scans} scans can be uploaded at once'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = ScanSerializer(data=scans, many=True)
+        serializer.is_valid(raise_exception=True)
+        scans = serializer.validated_data
+        for scan in scans:
+            scan.setdefault('scanner', request.user.id)
+
+        # Scans can come from other scanners of the same event, relayed by this device
+        scanner_ids = {scan['scanner'] for scan in scans} - {request.user.id}
+        allowed_scanners = {request.user.id} if can_scan_event(request.user, request.user.event_id) else set()
+        if scanner_ids and allowed_scanners:
+            allowed_scanners.update(User.objects.filter(
+                id__in=scanner_ids, user_type='ticket_scanner', event_id=request.user.event_id
+            ).values_list('id', flat=True))
+
+        # The earliest scan of each ticket, scans from other devices are kept if they are earlier
+        earliest = {}
+        for scan in scans:
+            if scan['scanner'] in allowed_scanners:
+                current = earliest.get(scan['ticket_id'])
+                if current is None or scan['scanned_at'] < current['scanned_at']:
+                    earliest[scan['ticket_id']] = scan
+
+        with transaction.atomic():
+            tickets = {
+                ticket.id: ticket
+                for ticket in Ticket.objects.select_for_update(of=('self',)).filter(id__in=earliest).select_related('user').only(
+                    'id', 'event_id', 'status', 'scanned_at', 'scanned_by_id', 'user__first_name', 'user__last_name', 'user__student_id'
+                )
+            }
+            # Taken once the rows are locked, a long lock wait would otherwise date the changes before
+            # cursors handed out during the wait, further back than CURSOR_OVERLAP covers
+            now = timezone.now()
+            changed = []
+            for ticket_id, scan in earliest.items():
+                ticket = tickets.get(ticket_id)
+                if ticket is None or not can_scan_event(request.user, ticket.event_id):
+                    continue
+                if ticket.status == 'A' or (ticket.status == 'U' and ticket.scanned_at is not None and scan['scanned_at'] < ticket.scanned_at):
+                    ticket.status = 'U'
+                    ticket.scanned_at = scan['scanned_at']
+                    ticket.scanned_by_id = scan['scanner']
+                    ticket.updated_at = now
+                    changed.append(ticket)
+            # One UPDATE for the whole batch
+            Ticket.objects.bulk_update(changed, ['status', 'scanned_at', 'scanned_by', 'updated_at'], batch_size=500)
+            for ticket in changed:
+                publish_checkin(ticket.event_id, checkin_message(
+                    ticket.id, ticket.scanned_at, ticket.scanned_by_id, ticket.user.first_name, ticket.user.last_name, ticket.user.student_id
+                ))
+
+        results = []
+        for scan in scans:
+            ticket = tickets.get(scan['ticket_id'])
+            result = {'ticket_id': scan['ticket_id'], 'scanned_at': scan['scanned_at']}
+            if scan['scanner'] not in allowed_scanners:
+                result['outcome'] = 'forbidden'
+            elif ticket is None:
+                result['outcome'] = 'not_found'
+            elif not can_scan_event(request.user, ticket.event_id):
+                result['outcome'] = 'forbidden'
+            elif ticket.status != 'U':
+                result['outcome'] = 'not_active'
+            elif earliest[ticket.id] is scan and ticket.scanned_at == scan['scanned_at'] and ticket.scanned_by_id == scan['scanner']:
+                result['outcome'] = 'validated'
+            else:
+                result['outcome'] = 'already_scanned'
+                result['first_scanned_at'] = ticket.scanned_at
+                result['first_scanned_by'] = ticket.scanned_by_id
+            results.append(result)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+class CheckinStreamView(APIView):
+    # EventSource can not send headers, the token can also be passed as ?token=
+    authentication_classes = [JWTAuthentication, QueryParamJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    keepalive = 15
+
+    def get(self, request, event_id, format=None):
+        """ Server-Sent Events stream of the tickets validated for an event, for the club admins and the
+        ticket scanners of the event. Needs the ASGI server, a WSGI worker would be held by every stream """
+        event = get_object_or_404(Event.objects.only('id', 'club_id'), id=event_id)
+        if not can_scan_event(request.user, event.id) and not request.user.club_admins.filter(id=event.club_id).exists():
+            return Response({'detail': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        if not isinstance(request._request, ASGIRequest):
+            return Response({'detail': 'Live check-ins are only served over ASGI'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response = StreamingHttpResponse(self.stream(event.id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop proxies from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, event_id):
+        subscription = get_broker().subscribe(checkin_channel(event_id))
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'event: checkin\ndata: {json.dumps(message)}\n\n'
+        finally:
+            subscription.close()
+
+class ScannerEventKeyView(APIView):
+    permission_classes = [IsTicketScannerUser]
+
+    def get(self, request, format=None):
+        """ Return the QR signing key of the event the ticket scanner user is assigned to, so the scanner
+        can verify ticket QR codes offline """
+        if not request.user.event_id:
+            return Response({'detail': 'No event associated with this user'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'event_id': request.user.event_id,
+            'payload_version': PAYLOAD_VERSION,
+            'key': base64.urlsafe_b64encode(event_key(request.user.event_id)).decode(),
+        }, status=status.HTTP_200_OK)
+
+class ScanManifestView(APIView):
+    permission_classes = [IsTicketScannerUser]
+
+    def get(self, request, format=None):
+        """ Return the compact manifest of the valid tickets for the event of the ticket scanner user.
+        With ?since=<cursor of the previous manifest> only the changes are returned """
+        if not request.user.event_id:
+            return Response({'detail': 'No event associated with this user'}, status=status.HTTP_400_BAD_REQUEST)
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = decode_cursor(since)
+            except (ValueError, OverflowError, OSError):
+                return Response({'detail': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(build_scan_manifest(request.user.event_id, since), status=status.HTTP_200_OK)
+
+class EventTicketsPagination(CursorPagination):
+    """ Cursor pagination for the tickets of an event, stable while tickets are being scanned """
+    ordering = 'id'
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 5000
+
 class RetrieveEventTicketsView(APIView):
     permission_classes = [IsTicketScannerUser]
 
     def get(self, request, format=None):
-        """ Retrieve all the tickets for the event the authenticated ticket scanner user has been assigned to """
+        """ Retrieve the tickets for the event the authenticated ticket scanner user has been assigned to,
+        grouped by status. Paginated with a cursor (next / previous). With ?changed_since=<cursor or ISO time>
+        only the tickets changed since then are returned, with the ids of deleted tickets """
         if not request.user.user_type == 'ticket_scanner':
             return Response({'detail': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         # Check if the user is associated with an event
         if not request.user.event_id:
             return Response({'detail': 'No event associated with this user'}, status=status.HTTP_400_BAD_REQUEST)
-        # Get the tickets for the event
-        tickets = Ticket.objects.filter(event_id=request.user.event_id)
+        changed_since = request.query_params.get('changed_since')
+        if changed_since is not None:
+            try:
+                changed_since = decode_cursor(changed_since) if changed_since.isdigit() else parse_datetime(changed_since)
+            except (ValueError, OverflowError, OSError):
+                changed_since = None
+            if changed_since is None:
+                return Response({'detail': 'Invalid changed_since'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(changed_since):
+                # An ISO time without an offset is in the server's time zone
+                changed_since = timezone.make_aware(changed_since)
+            if cursor_expired(changed_since):
+                # The deleted tickets after it may have been pruned, the list has to be loaded again
+                return Response({'detail': 'changed_since is too old, load the full list'}, status=status.HTTP_410_GONE)
+        now = timezone.now()
+
+        # Get the tickets for the event, with the users in the same query
+        tickets = TicketWithUserSerializer.plan(Ticket.objects.filter(event_id=request.user.event_id))
+        if changed_since is not None:
+            tickets = tickets.filter(updated_at__gte=changed_since)
+        paginator = EventTicketsPagination()
+        page = paginator.paginate_queryset(tickets, request, view=self)
         # If no tickets found, return an error
-        if not tickets:
+        if not page and changed_since is None and paginator.cursor is None:
             return Response({'detail': 'No tickets found for this event'}, status=status.HTTP_404_NOT_FOUND)
-        # Serialize all the tickets at once
-        serialized_tickets = TicketWithUserSerializer(tickets, many=True).data
+        serialized_tickets = TicketWithUserSerializer(page, many=True).data
         # Group the serialized tickets by their status
         tickets_by_status = defaultdict(list)
         for ticket in serialized_tickets:
             tickets_by_status[ticket['status']].append(ticket)
         # Return the tickets grouped by their status
-        return Response({
+        response = {
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
             'active_tickets': tickets_by_status['A'],
             'used_tickets': tickets_by_status['U'],
             'cancelled_tickets': tickets_by_status['C'],
-            'refunded_tickets': tickets_by_status['R']
-        }, status=status.HTTP_200_OK)
-
+            'refunded_tickets': tickets_by_status['R'],
+            # Pass as changed_since to get the next changes
+            'changed_since': encode_cursor(now - CURSOR_OVERLAP),
+        }
+        if changed_since is not None:
+            response['deleted_tickets'] = list(DeletedTicket.objects.filter(
+                event_id=request.user.event_id, deleted_at__gte=changed_since
+            ).values_list('ticket_id', flat=True))
+        return Response(response, status=status.HTTP_200_OK)
@@ -1,13 +1,21 @@
-from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags
 
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import NotAuthenticated
 
-from ..utils import ticketCodeGenerator, ticketQRCodeGenerator
-from ..models import Ticket, User, Event
-from ..serializers.serializers import TicketSerializer
+from ..qr import CONTENT_TYPES, ticket_qr_payload, qr_etag, cached_render_qr, signed_url_remaining
+from ..utils import ticketCodeGenerator
+from ..codes import code_pool
+from ..stats import invalidate_club_stats
+from ..models import Ticket, User, Event, EventInventory, SoldOut
+from ..serializers.serializers import TicketSerializer, BulkIssuePriceSerializer
 
 # ====================================================================================================
 # Tickets API
@@ -29,7 +37,7 @@ class TicketViewSet(viewsets.ModelViewSet):
     
     # Override the create method to replace the username with the user's id
     def create(self, request, *args, **kwargs):
-        """ Create a ticket and generate a QR code """
+        """ Create a ticket """
         username = request.data.get('user')
         event_id = request.data.get('event')
         if not username:
@@ -45,30 +53,134 @@ class TicketViewSet(viewsets.ModelViewSet):
         if Ticket.objects.filter(user=user, event=event).exists():
             return Response({'detail': 'A ticket already exists for this user'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if the event has reached its capacity
-        ticket_count = Ticket.objects.filter(event=event).count()
-        if ticket_count >= event.capacity:
-            event.soldout = True  # Set the soldout attribute to True
-            event.save()  # Save the event
-            return Response({'detail': 'This event has sold out'}, status=status.HTTP_400_BAD_REQUEST)
         request.data['user'] = user.id  # Replace the username with the user's id
         request.data['price'] = event.price  # Set the price to the price of the event
         request.data['code'] = ticketCodeGenerator()  # Generate the ticket code
         request.data['event'] = int(event_id)
-        
-        response = super().create(request, *args, **kwargs)
 
-        # Generate and save the QR code after the Ticket object is created
+        # The seat is taken from the event inventory when the ticket is inserted (see Ticket.save)
+        try:
+            response = super().create(request, *args, **kwargs)
+        except SoldOut:
+            return Response({'detail': 'This event has sold out'}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            # A concurrent purchase for the same user got in first
+            return Response({'detail': 'A ticket already exists for this user'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The QR code is rendered on request by TicketQRCodeView, nothing is stored
         if response.status_code == status.HTTP_201_CREATED:
-            ticket = Ticket.objects.get(id=response.data['id'])
-            try:
-                qr_code_image = ticketQRCodeGenerator(ticket.id)
-                ticket.qr_code.save(f"ticket_{ticket.id}_qr_code.png", ContentFile(qr_code_image.getvalue()))
-                ticket.save()
-                return Response({'detail': 'Ticket created and QR code generated successfully'}, status=status.HTTP_201_CREATED)
-            except Exception as e:
-                print(f"Error generating QR code: {e}")
-                return Response({'detail': 'Error generating QR code'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response({'detail': 'Ticket created successfully', 'id': response.data['id']}, status=status.HTTP_201_CREATED)
+        return response
+
+class BulkIssueTicketsView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_tickets = 1000
+
+    def post(self, request, event_id, format=None):
+        """ Issue tickets for an event to a list of users (usernames or student ids). Club admins only.
+        Runs a fixed number of queries whatever the size of the list and reports the result per user """
+        event = get_object_or_404(Event.objects.select_related('club'), id=event_id)
+        if not event.club.club_admins.filter(id=request.user.id).exists():
+            return Response({'detail': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+        identifiers = request.data.get('users', [])
+        # If we only get one user, we convert it to a list
+        if isinstance(identifiers, str):
+            identifiers = [identifiers]
+        identifiers = list(dict.fromkeys(str(identifier).strip() for identifier in identifiers if str(identifier).strip()))
+        if not identifiers:
+            return Response({'detail': 'A list of users is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(identifiers) > self.max_tickets:
+            return Response({'detail': f'At most {self.max_tickets} tickets can be issued at once'}, status=status.HTTP_400_BAD_REQUEST)
+        price_serializer = BulkIssuePriceSerializer(data={'price': request.data['price']} if 'price' in request.data else {})
+        if not price_serializer.is_valid():
+            return Response({'detail': 'Invalid price', 'errors': price_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        price = float(price_serializer.validated_data.get('price', event.price))
+
+        # Resolve usernames and student ids in one query
+        users = User.objects.filter(Q(username__in=identifiers) | Q(student_id__in=identifiers), user_type='user').values_list('id', 'username', 'student_id')
+        user_ids = {}
+        for user_id, username, student_id in users:
+            user_ids[username] = user_id
+            if student_id:
+                user_ids.setdefault(student_id, user_id)
+
+        # Users that already hold a ticket for the event, in one query
+        holders = set(Ticket.objects.filter(event=event, user_id__in=user_ids.values()).values_list('user_id', flat=True))
+
+        failed = []
+        to_issue = []
+        for identifier in identifiers:
+            user_id = user_ids.get(identifier)
+            if user_id is None:
+                failed.append({'user': identifier, 'detail': 'User does not exist'})
+            elif user_id in holders:
+                failed.append({'user': identifier, 'detail': 'A ticket already exists for this user'})
+            else:
+                holders.add(user_id)
+                to_issue.append((identifier, user_id))
+
+        # Codes are taken before the transaction so minting a new batch never holds the inventory lock
+        codes = code_pool.take_many(len(to_issue))
+        try:
+            with transaction.atomic():
+                # Capacity is accounted once for the whole batch
+                seats = EventInventory.objects.reserve_up_to(event.id, len(to_issue))
+                failed += [{'user': identifier, 'detail': 'This event has sold out'} for identifier, _ in to_issue[seats:]]
+                to_issue = to_issue[:seats]
+                # bulk_create skips Ticket.save, the seats were taken above
+                tickets = Ticket.objects.bulk_create([
+                    Ticket(title=event.title, code=code, price=price, user_id=user_id, event=event)
+                    for (_, user_id), code in zip(to_issue, codes)
+                ])
+            code_pool.refill(codes[seats:])
+            # bulk_create sends no signals either
+            invalidate_club_stats(event.club_id)
+        except IntegrityError:
+            # A ticket was bought for one of the users while issuing. The seats were reserved in the rolled
+            # back transaction, the codes were taken outside of it and go back to the pool
+            code_pool.refill(codes)
+            return Response({'detail': 'Tickets changed while issuing, please try again'}, status=status.HTTP_409_CONFLICT)
+
+        # QR codes are rendered on request by TicketQRCodeView, nothing to render or upload here
+        issued = [{'user': identifier, 'ticket_id': ticket.id} for (identifier, _), ticket in zip(to_issue, tickets)]
+        response_status = status.HTTP_201_CREATED if issued else status.HTTP_400_BAD_REQUEST
+        return Response({'issued': issued, 'failed': failed}, status=response_status)
+
+class TicketQRCodeView(APIView):
+    # Signed URLs are checked in the view, the others need the owner's access token
+    permission_classes = [AllowAny]
+
+    def get(self, request, ticket_id, image_format, format=None):
+        """ Render the ticket QR code as png or svg. Only the owner of the ticket can view it, or anyone with
+        a signed URL (signed_qr_url, given in the ticket's qr_code) while it has not expired.
+        Images are cached in memory and sent with a strong ETag so clients can revalidate """
+        if image_format not in CONTENT_TYPES:
+            return Response({'detail': 'Image format must be png or svg'}, status=status.HTTP_400_BAD_REQUEST)
+        signature = request.query_params.get('signature')
+        if signature is not None:
+            remaining = signed_url_remaining(ticket_id, image_format, request.query_params.get('expires'), signature)
+            if remaining is None:
+                return Response({'detail': 'Invalid or expired signature'}, status=status.HTTP_403_FORBIDDEN)
+        elif not request.user.is_authenticated:
+            raise NotAuthenticated()
+        ticket = get_object_or_404(Ticket.objects.only('id', 'user_id', 'event_id', 'code'), id=ticket_id)
+        if signature is None and ticket.user_id != request.user.id:
+            return Response({'detail': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+        data = ticket_qr_payload(ticket)
+        etag = qr_etag(data, image_format)
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if '*' in if_none_match or etag in if_none_match:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(cached_render_qr(data, image_format), content_type=CONTENT_TYPES[image_format])
+        response['ETag'] = etag
+        if signature is not None:
+            # The signed URL is the credential, a shared cache can serve it to anyone holding it until it expires
+            response['Cache-Control'] = f'public, max-age={min(remaining, 86400)}'
+        else:
+            response['Cache-Control'] = 'private, max-age=86400'
         return response
 
 class UserTicketsView(APIView):
@@ -1,13 +1,13 @@
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
-from django.core.files.base import ContentFile
+from django.utils import timezone
 
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
-from ..utils import ticketCodeGenerator, ticketQRCodeGenerator
+from ..utils import ticketCodeGenerator
 from ..models import TransferRequest, Ticket, User
 from ..serializers.serializers import TicketSerializer
 from ..serializers.transfer_serializers import TransferRequestSerializer
@@ -21,6 +21,9 @@ class TransferRequestViewSet(viewsets.ModelViewSet):
     serializer_class = TransferRequestSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        return TransferRequestSerializer.plan(TransferRequest.objects.all())
+
 class AvailableToTransferTicketsView(APIView):
     def get(self, request, user_id, format=None):
         """ Return a list of tickets that the user can transfer """
@@ -81,7 +84,7 @@ class UserSentTransferRequestsView(APIView):
             return Response({'detail': 'User does not exist'}, status=status.HTTP_404_NOT_FOUND)
 
         # Get all TransferRequest sent by the user
-        sent_transfer_requests = TransferRequest.objects.filter(sender=user)
+        sent_transfer_requests = TransferRequestSerializer.plan(TransferRequest.objects.filter(sender=user))
 
         # Group the transfer requests by status
         pending_transfer_requests = sent_transfer_requests.filter(status='pending')
@@ -104,7 +107,7 @@ class UserTransferRequestView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request, user_id, format=None):
         """ Return a list of the transfer requests that the user has received """
-        transfer_requests = TransferRequest.objects.filter(receiver_id=user_id)
+        transfer_requests = TransferRequestSerializer.plan(TransferRequest.objects.filter(receiver_id=user_id))
         serializer = TransferRequestSerializer(transfer_requests, many=True, context={'request': request})
         return Response(serializer.data,  status=status.HTTP_200_OK)
 
@@ -160,30 +163,24 @@ class AcceptTransferRequest(APIView):
             # Check if the transfer request is valid and can be accepted
             
             if transfer_request.status == 'pending':
-                # Create a new ticket based on the accepted transfer request
-                new_ticket = Ticket.objects.create(
-                    title=transfer_request.ticket.title,
-                    code=ticketCodeGenerator(),
-                    price=transfer_request.ticket.price,  # Include the price here
-                    order_date=transfer_request.ticket.order_date,
-                    status='A',  # Assuming new tickets are always 'Active'
-                    user=transfer_request.receiver,  # Assign the receiver as the user
-                    event=transfer_request.ticket.event
-                )
-                try:
-                    # Get the ticket we just created from user and event
-                    new_ticket_qr = Ticket.objects.get(id=new_ticket.id)
-                    qr_code_image = ticketQRCodeGenerator(new_ticket_qr.id)
-                    new_ticket_qr.qr_code.save(f"ticket_{new_ticket.id}_qr_code.png", ContentFile(qr_code_image.getvalue()))
-                    new_ticket_qr.save()
-                except Exception as e:
-                    print(f"Error generating QR code: {e}")
-                    return Response({'detail': 'Error generating QR code'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                # delete old ticket
-                transfer_request.ticket.delete()
-                # delete transfer request
-                transfer_request.delete()
-
+                old_ticket = transfer_request.ticket
+                # Delete the old ticket before creating the new one so the transfer hands its seat
+                # over in the event inventory and never fails on a full event.
+                # Deleting the ticket also deletes the transfer request (cascade)
+                code = ticketCodeGenerator()
+                with transaction.atomic():
+                    old_ticket.delete()
+                    ticket = Ticket.objects.create(
+                        title=old_ticket.title,
+                        code=code,
+                        price=old_ticket.price,  # Include the price here
+                        status='A',  # Assuming new tickets are always 'Active'
+                        user=transfer_request.receiver,  # Assign the receiver as the user
+                        event_id=old_ticket.event_id,
+                        transferred_at=timezone.now()
+                    )
+                    # auto_now_add ignores the value passed to create, keep the date of the original purchase
+                    Ticket.objects.filter(id=ticket.id).update(order_date=old_ticket.order_date)
                 return Response({'detail': 'Transfer request accepted'}, status=status.HTTP_200_OK)
             else:
                 return Response({'detail': 'Transfer request cannot be accepted'}, status=status.HTTP_400_BAD_REQUEST)
@@ -8,7 +8,8 @@ from django.db.models import Q
 from django.shortcuts import get_object_or_404
 
 from ..models import User, Profile, Friend
-from ..serializers.user_serializers import UserSerializer, ProfileSerializer, UserNameSerializer, ProfilePageSerializer, ProfileUpdateSerializer
+from ..search import search_users
+from ..serializers.user_serializers import UserSerializer, ProfileSerializer, UserSearchResultSerializer, ProfilePageSerializer, ProfileUpdateSerializer
 
 # ====================================================================================================
 # User and Profile API
@@ -54,13 +55,12 @@ class UserNameView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, format=None):
-        """ Return a list of usernames """
-        users = User.objects.filter(user_type='user')
-        username = self.request.query_params.get('username')
-        if username is not None:
-            users = users.filter(username__icontains=username)
-        
-        serializer = UserNameSerializer(users, many=True)
+        """ Return the users best matching ?username= (username or names) for the authenticated user, at most
+        RESULT_LIMIT. The exact username and prefixes first, then friends and clubs followed by both """
+        users = search_users(request.user.id, request.query_params.get('username', ''))
+
+        # Every result gets the relationship of the authenticated user to it, from one friend graph read
+        serializer = UserSearchResultSerializer(users, many=True, context={'request': request})
         return Response(serializer.data)
 
 class UserPublicProfileView(APIView):